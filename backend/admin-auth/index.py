@@ -1,7 +1,7 @@
 import json
 import os
 import jwt
-import psycopg2
+import db
 import hashlib
 from datetime import datetime, timedelta
 
@@ -53,7 +53,7 @@ def handler(event: dict, context) -> dict:
         conn = None
         cur = None
         try:
-            conn = psycopg2.connect(os.environ['DATABASE_URL'])
+            conn = db.connect()
             cur = conn.cursor()
             
             # Хеширование пароля для проверки
@@ -1,7 +1,7 @@
 import json
 import os
 import jwt
-import psycopg2
+import db
 from psycopg2.extras import RealDictCursor
 from datetime import datetime
 import hashlib
@@ -35,8 +35,7 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
+    conn = db.connect()
     
     try:
         # Верификация JWT токена
@@ -0,0 +1,214 @@
+'''
+Пакетные действия администратора над объектами: PATCH action=bulk.
+
+operations - список {op, listing_id, ...}:
+    moderate          status (approved / rejected / pending / awaiting_recheck), comment;
+                      только superadmin, approved - только с активной подпиской,
+                      rejected архивирует объект (как action=moderate)
+    archive           в архив
+    restore           из архива
+    set_subscription  days: 0 - отменить подписку и архивировать, иначе продлить на days дней
+                      от текущего окончания или от сейчас (как subscription admin_set_subscription)
+    set_position      position: позиция в городе; ключи auction_rank всех позиций пакета
+                      считаются разом (ranking.place), порядок в городе не зависит от
+                      порядка обработки строк
+
+Сначала проверяются все операции, затем каждый вид применяется одним запросом
+UPDATE ... FROM (VALUES ...) в одной транзакции, в порядке: подписка, модерация, архив,
+восстановление, позиция - так "продлить и одобрить" работает в одном пакете.
+Ошибочные операции не применяются и возвращаются в results с ok: false, остальные применяются.
+Журнал admin_action_logs пишется одним многострочным INSERT.
+'''
+import json
+
+from psycopg2.extras import execute_values
+
+import ranking
+
+SCHEMA = 't_p39732784_hourly_rentals_platf'
+
+MAX_OPERATIONS = 500
+
+MODERATION_STATUSES = ('approved', 'rejected', 'pending', 'awaiting_recheck')
+
+# Порядок применения видов операций
+ORDER = ('set_subscription', 'moderate', 'archive', 'restore', 'set_position')
+
+DESCRIPTIONS = {
+    'set_subscription': 'Подписка изменена',
+    'moderate': 'Модерация обновлена',
+    'archive': 'Объект перемещён в архив',
+    'restore': 'Объект восстановлен из архива',
+    'set_position': 'Позиция изменена',
+}
+
+
+def _int(value, name: str, minimum: int) -> int:
+    if isinstance(value, bool):
+        raise ValueError(f'{name} должен быть целым числом')
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} должен быть целым числом')
+    if number < minimum:
+        raise ValueError(f'{name} должен быть не меньше {minimum}')
+    return number
+
+
+def _parse(operation, is_superadmin: bool) -> tuple:
+    '''Операция -> (вид, listing_id, значения для VALUES); ошибка - ValueError'''
+    if not isinstance(operation, dict):
+        raise ValueError('Операция должна быть объектом')
+    op = operation.get('op')
+    if op not in ORDER:
+        raise ValueError(f"Неизвестная операция: {op}. Доступны: {', '.join(ORDER)}")
+    listing_id = _int(operation.get('listing_id'), 'listing_id', 1)
+
+    if op == 'moderate':
+        if not is_superadmin:
+            raise ValueError('Недостаточно прав для модерации')
+        status = operation.get('status')
+        if status not in MODERATION_STATUSES:
+            raise ValueError('Неверный статус модерации')
+        return op, listing_id, (status, operation.get('comment') or '')
+    if op == 'set_subscription':
+        return op, listing_id, (_int(operation.get('days'), 'days', 0),)
+    if op == 'set_position':
+        return op, listing_id, (_int(operation.get('position'), 'position', 1),)
+    return op, listing_id, ()
+
+
+def _moderate(cur, admin_id, rows: list) -> list:
+    return execute_values(
+        cur,
+        f"""UPDATE {SCHEMA}.listings l
+            SET moderation_status = v.status,
+                moderation_comment = v.comment,
+                moderated_by = v.admin_id,
+                moderated_at = CURRENT_TIMESTAMP,
+                submitted_for_moderation = FALSE,
+                is_archived = (v.status = 'rejected')
+            FROM (VALUES %s) AS v(id, status, comment, admin_id)
+            WHERE l.id = v.id
+              AND (v.status <> 'approved' OR l.subscription_expires_at > CURRENT_TIMESTAMP)
+            RETURNING l.id, l.moderation_status""",
+        [row + (admin_id,) for row in rows],
+        template='(%s::integer, %s::varchar, %s::text, %s::integer)', page_size=len(rows), fetch=True
+    )
+
+
+def _set_subscription(cur, admin_id, rows: list) -> list:
+    return execute_values(
+        cur,
+        f"""UPDATE {SCHEMA}.listings l
+            SET subscription_expires_at = CASE
+                    WHEN v.days = 0 THEN CURRENT_TIMESTAMP - INTERVAL '1 day'
+                    ELSE GREATEST(COALESCE(l.subscription_expires_at, CURRENT_TIMESTAMP), CURRENT_TIMESTAMP)
+                         + make_interval(days => v.days)
+                END,
+                is_archived = (v.days = 0)
+            FROM (VALUES %s) AS v(id, days)
+            WHERE l.id = v.id
+            RETURNING l.id, l.subscription_expires_at""",
+        rows, template='(%s::integer, %s::integer)', page_size=len(rows), fetch=True
+    )
+
+
+def _set_archived(archived: bool):
+    def apply(cur, admin_id, rows: list) -> list:
+        cur.execute(
+            f"""UPDATE {SCHEMA}.listings SET is_archived = %s
+                WHERE id = ANY(%s)
+                RETURNING id, is_archived""",
+            (archived, [row[0] for row in rows])
+        )
+        return cur.fetchall()
+    return apply
+
+
+def _set_position(cur, admin_id, rows: list) -> list:
+    return ranking.place(cur, {listing_id: position for listing_id, position in rows})
+
+
+APPLY = {
+    'set_subscription': _set_subscription,
+    'moderate': _moderate,
+    'archive': _set_archived(True),
+    'restore': _set_archived(False),
+    'set_position': _set_position,
+}
+
+FAILED = {
+    'moderate': 'Невозможно одобрить объект: подписка не активна',
+}
+
+
+def apply(cur, admin_id: int, operations) -> dict:
+    '''Проверить и применить операции -> {results, applied}; commit делает вызывающий код'''
+    if not isinstance(operations, list) or not operations:
+        raise ValueError('Требуется operations - непустой список операций')
+    if len(operations) > MAX_OPERATIONS:
+        raise ValueError(f'Не больше {MAX_OPERATIONS} операций за раз')
+
+    cur.execute(f"SELECT role FROM {SCHEMA}.admins WHERE id = %s", (admin_id,))
+    admin_row = cur.fetchone()
+    is_superadmin = bool(admin_row) and admin_row['role'] == 'superadmin'
+
+    results = [None] * len(operations)
+    parsed = []
+    seen = set()
+    for index, operation in enumerate(operations):
+        try:
+            op, listing_id, values = _parse(operation, is_superadmin)
+            if (op, listing_id) in seen:
+                raise ValueError('Повторная операция для этого объекта')
+            seen.add((op, listing_id))
+            parsed.append((index, op, listing_id, values))
+        except ValueError as e:
+            results[index] = {'index': index, 'ok': False, 'error': str(e)}
+
+    # Объекты пакета блокируются в порядке id: встречные пакеты не взаимоблокируются
+    ids = sorted({listing_id for _, _, listing_id, _ in parsed})
+    titles = {}
+    if ids:
+        cur.execute(
+            f"SELECT id, title FROM {SCHEMA}.listings WHERE id = ANY(%s) ORDER BY id FOR UPDATE",
+            (ids,)
+        )
+        titles = {row['id']: row['title'] for row in cur.fetchall()}
+
+    logs = []
+    for op in ORDER:
+        batch = []
+        for index, item_op, listing_id, values in parsed:
+            if item_op != op:
+                continue
+            if listing_id not in titles:
+                results[index] = {'index': index, 'ok': False, 'error': 'Объект не найден'}
+                continue
+            batch.append((index, listing_id, values))
+        if not batch:
+            continue
+
+        updated = {row['id']: dict(row) for row in APPLY[op](cur, admin_id, [(listing_id,) + values for _, listing_id, values in batch])}
+        for index, listing_id, values in batch:
+            row = updated.get(listing_id)
+            if row is None:
+                results[index] = {'index': index, 'ok': False, 'error': FAILED.get(op, 'Объект не изменён')}
+                continue
+            results[index] = {'index': index, 'ok': True, 'op': op, **row}
+            logs.append((
+                admin_id, f'bulk_{op}', 'listing', listing_id, titles[listing_id],
+                f'{DESCRIPTIONS[op]} (пакетно)', json.dumps(operations[index], ensure_ascii=False, default=str)
+            ))
+
+    if logs:
+        execute_values(
+            cur,
+            f"""INSERT INTO {SCHEMA}.admin_action_logs
+                (admin_id, action_type, entity_type, entity_id, entity_name, description, metadata)
+                VALUES %s""",
+            logs, page_size=len(logs)
+        )
+
+    return {'results': results, 'applied': len(logs)}
@@ -1,8 +1,57 @@
 import json
 import os
 import jwt
-import psycopg2
+import db
 from psycopg2.extras import RealDictCursor
+import projections
+import pagination
+import listing_write
+import ranking
+import bulk
+
+# Поля списка объектов для fields= / profile= (см. projections.py)
+_BASE_FIELDS = [
+    'id', 'owner_id', 'title', 'city', 'district', 'lat', 'lng',
+    'phone', 'telegram', 'description', 'image_url', 'logo_url',
+    'auction', 'is_archived', 'moderation_status', 'moderation_comment',
+    'created_at', 'updated_at', 'created_by_employee_id',
+    'subscription_expires_at', 'subscription_auto_renew',
+    'type', 'price', 'rating', 'reviews', 'metro', 'metro_walk',
+    'has_parking', 'features', 'min_hours',
+    'square_meters', 'parking_type', 'parking_price_per_hour',
+    'expert_fullness_rating', 'expert_fullness_feedback',
+    'expert_photo_rating', 'expert_photo_feedback', 'short_title',
+    # Сводные поля по номерам и фото, поддерживаются триггерами (V0060)
+    'rooms_count', 'min_room_price', 'max_room_price', 'photos_count', 'primary_photo_url'
+]
+
+LIST_PROJECTIONS = projections.Registry(
+    columns={
+        **{name: f'l.{name}' for name in _BASE_FIELDS},
+        'created_by_employee_name': 'a.name',
+        'owner_name': 'o.full_name',
+        'auction_rank': 'l.auction_rank',
+    },
+    relations=('rooms', 'metro_stations'),
+    joins={
+        'created_by_employee_name': 'LEFT JOIN t_p39732784_hourly_rentals_platf.admins a ON l.created_by_employee_id = a.id',
+        'owner_name': 'LEFT JOIN t_p39732784_hourly_rentals_platf.owners o ON l.owner_id = o.id',
+    },
+    profiles={
+        'full': _BASE_FIELDS + ['rooms', 'metro_stations'],
+        # Прежний ответ вкладки модерации: полный объект + кто создал и чей он
+        'review': _BASE_FIELDS + ['created_by_employee_name', 'owner_name', 'rooms', 'metro_stations'],
+        'moderation': [
+            'id', 'title', 'city', 'district', 'type', 'owner_id', 'owner_name',
+            'moderation_status', 'moderation_comment', 'updated_at', 'created_by_employee_name'
+        ],
+        'card': [
+            'id', 'title', 'city', 'district', 'type', 'price', 'image_url',
+            'auction', 'is_archived', 'moderation_status', 'subscription_expires_at',
+            'rooms_count', 'min_room_price', 'photos_count', 'primary_photo_url'
+        ],
+    }
+)
 
 # Admin listings management
 def verify_token(token: str) -> dict:
@@ -46,7 +95,7 @@ def handler(event: dict, context) -> dict:
         }
     
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        conn = db.connect()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         # GET - получение списка объектов ИЛИ одного объекта
@@ -124,77 +173,45 @@ def handler(event: dict, context) -> dict:
             # Список объектов (без полных данных images)
             show_archived = params.get('archived') == 'true'
             moderation_filter = params.get('moderation')
-            limit_param = params.get('limit', '100')
-            print(f"[DEBUG] limit_param string value: '{limit_param}'")
-            limit = min(int(limit_param), 1000)
-            offset = int(params.get('offset', 0))
-            
-            print(f"[DEBUG] Params: archived={show_archived}, moderation={moderation_filter}, limit={limit} (requested={limit_param}), offset={offset}")
-            
-            if moderation_filter in ('pending', 'awaiting_recheck', 'rejected'):
-                # Фильтр по статусу модерации
-                print(f"[DEBUG] Fetching moderation listings with status: {moderation_filter}")
-                # ⚠️ Явно указываем поля БЕЗ images для экономии памяти
-                query = f"""
-                    SELECT l.id, l.owner_id, l.title, l.city, l.district, l.lat, l.lng,
-                           l.phone, l.telegram, l.description, l.image_url, l.logo_url,
-                           l.auction, l.is_archived, l.moderation_status, l.moderation_comment,
-                           l.created_at, l.updated_at, l.created_by_employee_id,
-                           l.subscription_expires_at, l.subscription_auto_renew,
-                           l.type, l.price, l.rating, l.reviews, l.metro, l.metro_walk,
-                           l.has_parking, l.features, l.min_hours,
-                           l.square_meters, l.parking_type, l.parking_price_per_hour,
-                           l.expert_fullness_rating, l.expert_fullness_feedback,
-                           l.expert_photo_rating, l.expert_photo_feedback, l.short_title,
-                           a.name as created_by_employee_name,
-                           o.full_name as owner_name
-                    FROM t_p39732784_hourly_rentals_platf.listings l
-                    LEFT JOIN t_p39732784_hourly_rentals_platf.admins a ON l.created_by_employee_id = a.id
-                    LEFT JOIN t_p39732784_hourly_rentals_platf.owners o ON l.owner_id = o.id
-                    WHERE l.moderation_status = '{moderation_filter}'
-                    ORDER BY l.updated_at DESC
-                    LIMIT {limit} OFFSET {offset}
-                """
-                print(f"[DEBUG] Query: {query}")
-                cur.execute(query)
-            elif show_archived:
-                print(f"[DEBUG] Fetching archived listings")
-                # ⚠️ Явно указываем поля БЕЗ images для экономии памяти
-                cur.execute(f"""SELECT id, owner_id, title, city, district, lat, lng,
-                           phone, telegram, description, image_url, logo_url,
-                           auction, is_archived, moderation_status, moderation_comment,
-                           created_at, updated_at, created_by_employee_id,
-                           subscription_expires_at, subscription_auto_renew,
-                           type, price, rating, reviews, metro, metro_walk,
-                           has_parking, features, min_hours,
-                           square_meters, parking_type, parking_price_per_hour,
-                           expert_fullness_rating, expert_fullness_feedback,
-                           expert_photo_rating, expert_photo_feedback, short_title
-                    FROM t_p39732784_hourly_rentals_platf.listings 
-                    WHERE is_archived = true 
-                    ORDER BY created_at DESC 
-                    LIMIT {limit} OFFSET {offset}""")
-            else:
-                print(f"[DEBUG] Fetching active listings")
-                # ⚠️ Явно указываем поля БЕЗ images для экономии памяти
-                cur.execute(f"""SELECT id, owner_id, title, city, district, lat, lng,
-                           phone, telegram, description, image_url, logo_url,
-                           auction, is_archived, moderation_status, moderation_comment,
-                           created_at, updated_at, created_by_employee_id,
-                           subscription_expires_at, subscription_auto_renew,
-                           type, price, rating, reviews, metro, metro_walk,
-                           has_parking, features, min_hours,
-                           square_meters, parking_type, parking_price_per_hour,
-                           expert_fullness_rating, expert_fullness_feedback,
-                           expert_photo_rating, expert_photo_feedback, short_title
-                    FROM t_p39732784_hourly_rentals_platf.listings 
-                    WHERE is_archived = false 
-                    ORDER BY auction ASC 
-                    LIMIT {limit} OFFSET {offset}""")
+            # cursor= (пустой - первая страница) включает постраничную выдачу по ключу сортировки,
+            # без него - прежний массив по limit/offset для старых клиентов
+            paginated = 'cursor' in params
+            branch, branch_args = pagination.branch_for(show_archived, moderation_filter)
+            try:
+                if paginated:
+                    limit = pagination.parse_page_size(params.get('limit'))
+                    after = pagination.decode_cursor(branch, params['cursor']) if params['cursor'] else None
+                else:
+                    limit = min(int(params.get('limit', '100')), 1000)
+                    offset = int(params.get('offset', 0))
+                projection = LIST_PROJECTIONS.resolve(params, 'review' if branch == 'moderation' else 'full')
+            except ValueError as e:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            print(f"[DEBUG] Params: branch={branch}, moderation={moderation_filter}, limit={limit}, paginated={paginated}")
             
             try:
-                listings = cur.fetchall()
-                print(f"[DEBUG] Total listings fetched: {len(listings)}, moderation_filter={moderation_filter}")
+                if paginated:
+                    page = pagination.fetch_page(cur, branch, branch_args, projection, after, limit)
+                    page['total'] = pagination.count(cur, branch, branch_args)
+                    listings = page['listings']
+                else:
+                    # ⚠️ Только запрошенные поля, images не выбираются ни в одном профиле
+                    cur.execute(f"""SELECT {projection.select()}
+                        FROM t_p39732784_hourly_rentals_platf.listings l
+                        {projection.joins()}
+                        WHERE {pagination.BRANCHES[branch][0]}
+                        ORDER BY {pagination.order_sql(branch)}
+                        LIMIT %s OFFSET %s""", branch_args + [limit, offset])
+                    listings = cur.fetchall()
+                print(f"[DEBUG] Total listings fetched: {len(listings)}, branch={branch}")
             except Exception as e:
                 print(f"[ERROR] Failed to fetch listings: {str(e)}")
                 cur.close()
@@ -212,7 +229,7 @@ def handler(event: dict, context) -> dict:
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps([]),
+                    'body': json.dumps(page if paginated else [], default=str),
                     'isBase64Encoded': False
                 }
             
@@ -222,9 +239,9 @@ def handler(event: dict, context) -> dict:
             all_rooms = []
             all_metro = []
             
-            if listing_ids:
-                listing_ids_str = ','.join([str(lid) for lid in listing_ids])
-                
+            listing_ids_str = ','.join([str(lid) for lid in listing_ids])
+            
+            if projection.wants('rooms'):
                 print(f"[DEBUG] Fetching rooms for {len(listing_ids)} listings")
                 # ⚠️ НЕ загружаем images для экономии памяти - только считаем количество
                 rooms_query = f"""SELECT id, listing_id, type, price, description, square_meters, features, 
@@ -240,7 +257,8 @@ def handler(event: dict, context) -> dict:
                 cur.execute(rooms_query)
                 all_rooms = cur.fetchall()
                 print(f"[DEBUG] Fetched {len(all_rooms)} rooms")
-                
+            
+            if projection.wants('metro_stations'):
                 # Получаем все станции метро одним запросом
                 print(f"[DEBUG] Fetching metro stations")
                 metro_query = f"""SELECT listing_id, station_name, walk_minutes 
@@ -249,8 +267,6 @@ def handler(event: dict, context) -> dict:
                 cur.execute(metro_query)
                 all_metro = cur.fetchall()
                 print(f"[DEBUG] Fetched {len(all_metro)} metro stations")
-            else:
-                print(f"[DEBUG] No listings to fetch rooms/metro for")
             
             # Группируем по listing_id
             rooms_by_listing = {}
@@ -292,8 +308,10 @@ def handler(event: dict, context) -> dict:
                     }
                     rooms.append(room_dict)
                 
-                listing_dict['rooms'] = rooms
-                listing_dict['metro_stations'] = [dict(m) for m in metro_by_listing.get(listing['id'], [])]
+                if projection.wants('rooms'):
+                    listing_dict['rooms'] = rooms
+                if projection.wants('metro_stations'):
+                    listing_dict['metro_stations'] = [dict(m) for m in metro_by_listing.get(listing['id'], [])]
                 result.append(listing_dict)
             
             print(f"[DEBUG] About to serialize {len(result)} listings")
@@ -301,7 +319,11 @@ def handler(event: dict, context) -> dict:
             conn.close()
             
             try:
-                response_body = json.dumps(result, default=str)
+                if paginated:
+                    page['listings'] = result
+                    response_body = json.dumps(page, default=str)
+                else:
+                    response_body = json.dumps(result, default=str)
                 print(f"[DEBUG] Serialization successful, body length: {len(response_body)}")
             except Exception as e:
                 print(f"[ERROR] Serialization failed: {str(e)}")
@@ -349,27 +371,12 @@ def handler(event: dict, context) -> dict:
             new_listing = cur.fetchone()
             listing_id = new_listing['id']
             
-            # Добавление станций метро
+            # Добавление станций метро и комнат пакетами (см. listing_write.py)
             if 'metro_stations' in body and body['metro_stations']:
-                for station in body['metro_stations']:
-                    cur.execute(
-                        "INSERT INTO t_p39732784_hourly_rentals_platf.metro_stations (listing_id, station_name, walk_minutes) VALUES (%s, %s, %s)",
-                        (listing_id, station['station_name'], station['walk_minutes'])
-                    )
+                listing_write.save_metro_stations(cur, listing_id, body['metro_stations'])
             
-            # Удаление старых комнат и добавление новых
             if 'rooms' in body:
-                cur.execute("DELETE FROM t_p39732784_hourly_rentals_platf.rooms WHERE listing_id = %s", (listing_id,))
-                for room in body['rooms']:
-                    cur.execute("""
-                        INSERT INTO t_p39732784_hourly_rentals_platf.rooms (listing_id, type, price, description, images, 
-                                         square_meters, features, min_hours, payment_methods, cancellation_policy)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (listing_id, room['type'], room['price'], 
-                          room.get('description'), room.get('images', []),
-                          room.get('square_meters', 0), room.get('features', []),
-                          room.get('min_hours', 1), room.get('payment_methods', 'Наличные, банковская карта при заселении'),
-                          room.get('cancellation_policy', 'Бесплатная отмена за 1 час до заселения')))
+                listing_write.save_rooms(cur, listing_id, body['rooms'])
             
             # Логирование действия
             cur.execute("""
@@ -534,26 +541,11 @@ def handler(event: dict, context) -> dict:
             
             # Обновление станций метро
             if 'metro_stations' in body:
-                cur.execute("DELETE FROM t_p39732784_hourly_rentals_platf.metro_stations WHERE listing_id = %s", (listing_id,))
-                for station in body['metro_stations']:
-                    cur.execute(
-                        "INSERT INTO t_p39732784_hourly_rentals_platf.metro_stations (listing_id, station_name, walk_minutes) VALUES (%s, %s, %s)",
-                        (listing_id, station['station_name'], station['walk_minutes'])
-                    )
+                listing_write.save_metro_stations(cur, listing_id, body['metro_stations'])
             
-            # Обновление комнат
+            # Обновление комнат: изменённые строки, id и экспертные оценки сохраняются
             if 'rooms' in body:
-                cur.execute("DELETE FROM t_p39732784_hourly_rentals_platf.rooms WHERE listing_id = %s", (listing_id,))
-                for room in body['rooms']:
-                    cur.execute("""
-                        INSERT INTO t_p39732784_hourly_rentals_platf.rooms (listing_id, type, price, description, images, 
-                                         square_meters, features, min_hours, payment_methods, cancellation_policy)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (listing_id, room['type'], room['price'], 
-                          room.get('description'), room.get('images', []),
-                          room.get('square_meters', 0), room.get('features', []),
-                          room.get('min_hours', 1), room.get('payment_methods', 'Наличные, банковская карта при заселении'),
-                          room.get('cancellation_policy', 'Бесплатная отмена за 1 час до заселения')))
+                listing_write.save_rooms(cur, listing_id, body['rooms'])
             
             conn.commit()
             cur.close()
@@ -769,37 +761,8 @@ def handler(event: dict, context) -> dict:
                         'isBase64Encoded': False
                     }
                 
-                # Обновляем позиции в городе
-                if old_position < new_position:
-                    # Перемещение вниз: сдвигаем вверх объекты между old и new
-                    cur.execute("""
-                        UPDATE t_p39732784_hourly_rentals_platf.listings 
-                        SET auction = auction - 1
-                        WHERE city = %s 
-                          AND auction > %s 
-                          AND auction <= %s
-                          AND id != %s
-                    """, (city, old_position, new_position, listing_id))
-                else:
-                    # Перемещение вверх: сдвигаем вниз объекты между new и old
-                    cur.execute("""
-                        UPDATE t_p39732784_hourly_rentals_platf.listings 
-                        SET auction = auction + 1
-                        WHERE city = %s 
-                          AND auction >= %s 
-                          AND auction < %s
-                          AND id != %s
-                    """, (city, new_position, old_position, listing_id))
-                
-                # Устанавливаем новую позицию
-                cur.execute("""
-                    UPDATE t_p39732784_hourly_rentals_platf.listings 
-                    SET auction = %s
-                    WHERE id = %s
-                    RETURNING id, title, auction
-                """, (new_position, listing_id))
-                
-                result = cur.fetchone()
+                # Пишется только сам объект, номера соседей выравнивает cron-auction-rebalance
+                result = ranking.move(cur, listing_id, city, new_position)
                 conn.commit()
                 
                 return {
@@ -813,6 +776,56 @@ def handler(event: dict, context) -> dict:
                     'isBase64Encoded': False
                 }
             
+            elif action == 'reorder':
+                # Групповая перестановка объектов города (drag-and-drop) одной транзакцией
+                try:
+                    positions = ranking.reorder(cur, body.get('listing_ids'))
+                except ValueError as e:
+                    conn.rollback()
+                    cur.close()
+                    conn.close()
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                        'isBase64Encoded': False
+                    }
+                conn.commit()
+                cur.close()
+                conn.close()
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'success': True, 'positions': positions}),
+                    'isBase64Encoded': False
+                }
+            
+            elif action == 'bulk':
+                # Пакет операций (модерация, архив, подписка, позиция) одной транзакцией, см. bulk.py
+                try:
+                    outcome = bulk.apply(cur, admin.get('admin_id'), body.get('operations'))
+                except ValueError as e:
+                    conn.rollback()
+                    cur.close()
+                    conn.close()
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+                        'isBase64Encoded': False
+                    }
+                conn.commit()
+                cur.close()
+                conn.close()
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'success': True, **outcome}, default=str, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
             else:
                 return {
                     'statusCode': 400,
@@ -0,0 +1,144 @@
+'''
+Списки объектов админки постранично по ключу сортировки (keyset) вместо LIMIT/OFFSET.
+
+Каждая вкладка сортируется по своему ключу и по id, чтобы порядок был однозначным:
+    active     - auction_rank ASC, id ASC (ключ порядка в городе, см. V0059)
+    archived   - created_at DESC, id DESC
+    moderation - updated_at DESC, id DESC (pending / awaiting_recheck / rejected)
+Курсор - ключ последнего объекта страницы, следующая страница читается по составному
+индексу с этого места, поэтому глубокие страницы не дороже первой.
+
+Число объектов во вкладке кэшируется в памяти инстанса: пересчёт, только если изменилась
+версия listings (max catalog_txid объектов и tombstones) и прошло COUNT_TTL_SECONDS.
+catalog_txid меняется при любом изменении строки объекта (trg_listings_mark_changed, V0050),
+в том числе moderation_status и is_archived, от которых зависят вкладки. Транзакция
+с меньшим txid может зафиксироваться позже большей и не поднять max: пока такие
+транзакции не завершены (xmin снимка не больше версии), число не привязывается к версии
+и живёт не дольше COUNT_TTL_SECONDS.
+'''
+import base64
+import json
+import time
+from datetime import datetime
+
+SCHEMA = 't_p39732784_hourly_rentals_platf'
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+COUNT_TTL_SECONDS = 60
+
+MODERATION_STATUSES = ('pending', 'awaiting_recheck', 'rejected')
+
+# Вкладка -> (условие WHERE, ключ сортировки SQL, поле ключа в выдаче, по убыванию, разбор значения из курсора)
+BRANCHES = {
+    'active': ('l.is_archived = false', 'l.auction_rank', 'auction_rank', False, int),
+    'archived': ('l.is_archived = true', 'l.created_at', 'created_at', True, datetime.fromisoformat),
+    'moderation': ('l.moderation_status = %s', 'l.updated_at', 'updated_at', True, datetime.fromisoformat),
+}
+
+# (вкладка, аргументы) -> {'version': ..., 'checked_at': ..., 'count': ...}
+_counts = {}
+
+
+def branch_for(show_archived: bool, moderation_filter: str) -> tuple:
+    '''Вкладка списка по параметрам запроса -> (имя, аргументы условия)'''
+    if moderation_filter in MODERATION_STATUSES:
+        return 'moderation', [moderation_filter]
+    if show_archived:
+        return 'archived', []
+    return 'active', []
+
+
+def order_sql(branch: str) -> str:
+    _, key_sql, _, descending, _ = BRANCHES[branch]
+    direction = 'DESC' if descending else 'ASC'
+    return f'{key_sql} {direction}, l.id {direction}'
+
+
+def parse_page_size(value) -> int:
+    if value in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('Параметр limit должен быть целым числом')
+    if limit < 1:
+        raise ValueError('Параметр limit должен быть больше 0')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def encode_cursor(branch: str, listing: dict) -> str:
+    value = listing[BRANCHES[branch][2]]
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([branch, value, listing['id']])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(branch: str, cursor: str) -> tuple:
+    '''Курсор -> (значение ключа, id); курсор другой вкладки - ошибка'''
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_branch, value, listing_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if cursor_branch != branch:
+            raise ValueError
+        return BRANCHES[branch][4](value), int(listing_id)
+    except Exception:
+        raise ValueError('Некорректный cursor')
+
+
+def fetch_page(cur, branch: str, args: list, projection, after: tuple = None, limit: int = DEFAULT_PAGE_SIZE) -> dict:
+    '''Страница вкладки {listings, next_cursor, has_more}; listings - строки в форме проекции'''
+    where, key_sql, field, descending, _ = BRANCHES[branch]
+    conditions = [where]
+    query_args = list(args)
+    if after is not None:
+        conditions.append(f"({key_sql}, l.id) {'<' if descending else '>'} (%s, %s)")
+        query_args.extend(after)
+
+    extra = (field,)
+    cur.execute(
+        f"""SELECT {projection.select(extra)}
+            FROM {SCHEMA}.listings l
+            {projection.joins()}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY {order_sql(branch)}
+            LIMIT %s""",
+        query_args + [limit + 1]
+    )
+    rows = [dict(row) for row in cur.fetchall()]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(branch, rows[-1]) if has_more else None
+    return {'listings': projection.strip(rows, extra), 'next_cursor': next_cursor, 'has_more': has_more}
+
+
+def _listings_version(cur) -> tuple:
+    '''(версия listings, все ли транзакции до неё завершены)'''
+    cur.execute(
+        f"""SELECT (SELECT COALESCE(MAX(catalog_txid), 0) FROM {SCHEMA}.listings) AS listings_txid,
+                   (SELECT COALESCE(MAX(catalog_txid), 0) FROM {SCHEMA}.listing_tombstones) AS tombstones_txid,
+                   txid_snapshot_xmin(txid_current_snapshot()) AS xmin"""
+    )
+    row = cur.fetchone()
+    version = (row['listings_txid'], row['tombstones_txid'])
+    return version, row['xmin'] > max(version)
+
+
+def count(cur, branch: str, args: list) -> int:
+    '''Число объектов во вкладке: из кэша, если данные не менялись и кэш свежий'''
+    key = (branch, tuple(args))
+    cached = _counts.get(key)
+    now = time.monotonic()
+    if cached and now - cached['checked_at'] < COUNT_TTL_SECONDS:
+        return cached['count']
+
+    version, settled = _listings_version(cur)
+    if settled and cached and cached['version'] == version:
+        cached['checked_at'] = now
+        return cached['count']
+
+    cur.execute(f"SELECT COUNT(*) AS total FROM {SCHEMA}.listings l WHERE {BRANCHES[branch][0]}", args)
+    total = cur.fetchone()['total']
+    _counts[key] = {'version': version if settled else None, 'checked_at': now, 'count': total}
+    return total
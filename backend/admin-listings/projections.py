@@ -0,0 +1,90 @@
+'''
+Реестр проекций объектов: параметры fields= / profile= -> SELECT и форма JSON.
+
+Каждая функция объявляет свои колонки (имя поля в JSON -> SQL-выражение),
+связи (rooms, metro_stations), которые подгружаются отдельными запросами,
+и профили - именованные наборы полей. Незапрошенные связи и JOIN не выполняются.
+Файл одинаковый во всех функциях, которые отдают объекты.
+'''
+
+
+class Projection:
+    '''Выбранные поля: колонки SELECT и подгружаемые связи'''
+
+    def __init__(self, registry, columns: list, relations: set):
+        self.registry = registry
+        self.columns = columns
+        self.relations = relations
+
+    def wants(self, relation: str) -> bool:
+        return relation in self.relations
+
+    def select(self, extra=()) -> str:
+        '''Список колонок SELECT; extra - служебные поля (например, для курсора)'''
+        names = self.columns + [name for name in extra if name not in self.columns]
+        return ', '.join(self.registry.column_sql(name) for name in names)
+
+    def joins(self) -> str:
+        '''JOIN только для запрошенных полей из связанных таблиц'''
+        clauses = []
+        for name in self.columns:
+            clause = self.registry.joins.get(name)
+            if clause and clause not in clauses:
+                clauses.append(clause)
+        return ' '.join(clauses)
+
+    def strip(self, rows: list, extra=()) -> list:
+        '''Убрать служебные поля, которых клиент не запрашивал'''
+        hidden = [name for name in extra if name not in self.columns]
+        for row in rows:
+            for name in hidden:
+                row.pop(name, None)
+        return rows
+
+
+class Registry:
+    '''
+    columns - {поле: SQL-выражение}, relations - имена связей,
+    profiles - {профиль: [поля и связи]}, joins - {поле: JOIN, без которого поле недоступно}.
+    Поля из required (id) выбираются всегда: по ним подгружаются связи.
+    '''
+
+    def __init__(self, columns: dict, relations=(), profiles: dict = None, joins: dict = None, required=('id',)):
+        self.columns = columns
+        self.relations = tuple(relations)
+        self.profiles = profiles or {}
+        self.joins = joins or {}
+        self.required = tuple(required)
+
+    def column_sql(self, name: str) -> str:
+        expr = self.columns[name]
+        if expr.rsplit('.', 1)[-1] == name:
+            return expr
+        return f'{expr} AS "{name}"'
+
+    def profile(self, name: str) -> Projection:
+        return self._projection(self.profiles[name])
+
+    def resolve(self, params: dict, default: str) -> Projection:
+        '''fields=a,b,rooms имеет приоритет над profile=; без обоих - профиль default'''
+        fields = (params.get('fields') or '').strip()
+        if fields:
+            names = [name.strip() for name in fields.split(',') if name.strip()]
+            unknown = [name for name in names if name not in self.columns and name not in self.relations]
+            if unknown:
+                raise ValueError(f"Неизвестные поля: {', '.join(unknown)}")
+            return self._projection(names)
+
+        name = (params.get('profile') or '').strip() or default
+        if name not in self.profiles:
+            raise ValueError(f"Неизвестный profile: {name}. Доступны: {', '.join(self.profiles)}")
+        return self.profile(name)
+
+    def _projection(self, names) -> Projection:
+        columns = list(self.required)
+        for name in names:
+            if name in self.columns and name not in columns:
+                columns.append(name)
+        relations = {name for name in names if name in self.relations}
+        return Projection(self, columns, relations)
+
@@ -0,0 +1,179 @@
+'''
+Позиции объектов в городе по ключу auction_rank (см. V0059).
+
+Перемещение пишет одну строку: новый ключ - середина между соседями на новом месте
+(auction_rank_for в БД), номер auction соседей пересчитывает фоновое выравнивание
+(cron-auction-rebalance). Только когда между соседями не осталось места, ключи города
+разрежаются сразу (auction_respace) - это редкий случай.
+
+Групповая перестановка (drag-and-drop) раздаёт объектам ключи и номера, которые они уже
+занимают, в новом порядке: меняются только переставленные строки, порядок остальных
+объектов города не затрагивается, промежутки не расходуются.
+
+Пакетная расстановка (bulk set_position) считает ключи сразу для всех объектов пакета:
+объекты пакета вынимаются из порядка города и вставляются по возрастанию позиции, ключи
+делят промежутки между оставшимися соседями. Итог не зависит от порядка обработки строк.
+'''
+from psycopg2.extras import execute_values
+
+SCHEMA = 't_p39732784_hourly_rentals_platf'
+
+MAX_REORDER_SIZE = 500
+
+# Шаг ключей после разрежения (как в auction_respace)
+RANK_STEP = 65536
+
+
+def move(cur, listing_id: int, city: str, position: int) -> dict:
+    '''Поставить объект на позицию position в городе -> {id, title, auction}'''
+    cur.execute(f"SELECT {SCHEMA}.auction_rank_for(%s, %s, %s) AS rank", (city, position, listing_id))
+    rank = cur.fetchone()['rank']
+    if rank is None:
+        cur.execute(f"SELECT {SCHEMA}.auction_respace(%s, 0)", (city,))
+        cur.execute(f"SELECT {SCHEMA}.auction_rank_for(%s, %s, %s) AS rank", (city, position, listing_id))
+        rank = cur.fetchone()['rank']
+
+    cur.execute(
+        f"""UPDATE {SCHEMA}.listings
+            SET auction = %s, auction_rank = %s
+            WHERE id = %s
+            RETURNING id, title, auction""",
+        (position, rank, listing_id)
+    )
+    return cur.fetchone()
+
+
+def _spread(rows: list, positions: dict):
+    '''
+    Ключи объектов пакета одного города -> {id: auction_rank}; None - между соседями не хватает места.
+    rows - остальные объекты города (id, auction_rank, is_archived) в порядке auction_rank, id.
+    '''
+    order = [row['auction_rank'] for row in rows if not row['is_archived']]
+    slots = [(rank, None) for rank in order]
+    for listing_id, position in sorted(positions.items(), key=lambda item: (item[1], item[0])):
+        slots.insert(min(position, len(slots) + 1) - 1, (None, listing_id))
+    # За концом города - после последнего объекта, в том числе архивного (как auction_rank_for)
+    tail = max((row['auction_rank'] for row in rows), default=0)
+
+    ranks = {}
+    index = 0
+    while index < len(slots):
+        if slots[index][1] is None:
+            index += 1
+            continue
+        start = index
+        while index < len(slots) and slots[index][1] is not None:
+            index += 1
+        run = [listing_id for _, listing_id in slots[start:index]]
+        prev_rank = slots[start - 1][0] if start > 0 else None
+        next_rank = slots[index][0] if index < len(slots) else None
+
+        if next_rank is None:
+            keys = [tail + RANK_STEP * k for k in range(1, len(run) + 1)]
+        elif prev_rank is None:
+            keys = [next_rank - RANK_STEP * (len(run) + 1 - k) for k in range(1, len(run) + 1)]
+        else:
+            step = (next_rank - prev_rank) // (len(run) + 1)
+            if step < 1:
+                return None
+            keys = [prev_rank + step * k for k in range(1, len(run) + 1)]
+        ranks.update(zip(run, keys))
+    return ranks
+
+
+def place(cur, positions: dict) -> list:
+    '''
+    Поставить объекты на позиции {listing_id: position} одним пакетом -> [{id, auction}].
+    Строки объектов блокирует вызывающий код.
+    '''
+    cur.execute(f"SELECT id, city FROM {SCHEMA}.listings WHERE id = ANY(%s)", (list(positions),))
+    cities = {}
+    for row in cur.fetchall():
+        cities.setdefault(row['city'], {})[row['id']] = positions[row['id']]
+
+    changes = []
+    for city, city_positions in cities.items():
+        ranks = None
+        for _ in range(2):
+            cur.execute(
+                f"""SELECT id, auction_rank, is_archived FROM {SCHEMA}.listings
+                    WHERE city = %s AND NOT (id = ANY(%s))
+                    ORDER BY auction_rank, id""",
+                (city, list(city_positions))
+            )
+            ranks = _spread(cur.fetchall(), city_positions)
+            if ranks is not None:
+                break
+            # Промежутки кончились - ключи города разрежаются, расчёт повторяется
+            cur.execute(f"SELECT {SCHEMA}.auction_respace(%s, 0)", (city,))
+        changes.extend((listing_id, ranks[listing_id], position) for listing_id, position in city_positions.items())
+
+    if changes:
+        # Ключи заданы явно - триггер не пересчитывает их по auction
+        cur.execute("SELECT set_config('hourly_rentals.ranking', 'on', true)")
+        execute_values(
+            cur,
+            f"""UPDATE {SCHEMA}.listings l SET auction_rank = v.auction_rank, auction = v.auction
+                FROM (VALUES %s) AS v(id, auction_rank, auction)
+                WHERE l.id = v.id""",
+            changes, template='(%s::integer, %s::bigint, %s::integer)', page_size=len(changes)
+        )
+        cur.execute("SELECT set_config('hourly_rentals.ranking', 'off', true)")
+
+    return [{'id': listing_id, 'auction': position} for listing_id, _, position in changes]
+
+
+def _parse_ids(listing_ids) -> list:
+    if not isinstance(listing_ids, list) or len(listing_ids) < 2:
+        raise ValueError('Требуется listing_ids - список хотя бы из двух объектов')
+    if len(listing_ids) > MAX_REORDER_SIZE:
+        raise ValueError(f'Не больше {MAX_REORDER_SIZE} объектов за раз')
+    try:
+        ids = [int(listing_id) for listing_id in listing_ids]
+    except (TypeError, ValueError):
+        raise ValueError('listing_ids должен содержать id объектов')
+    if len(set(ids)) != len(ids):
+        raise ValueError('В listing_ids есть повторяющиеся id')
+    return ids
+
+
+def reorder(cur, listing_ids) -> list:
+    '''
+    Переставить объекты одного города в порядке listing_ids -> [{id, auction}].
+    Ошибки запроса - ValueError.
+    '''
+    ids = _parse_ids(listing_ids)
+
+    # Блокировка в порядке id: встречные перестановки не взаимоблокируются
+    cur.execute(
+        f"""SELECT id, city, auction, auction_rank FROM {SCHEMA}.listings
+            WHERE id = ANY(%s) ORDER BY id FOR UPDATE""",
+        (ids,)
+    )
+    rows = {row['id']: row for row in cur.fetchall()}
+    missing = [listing_id for listing_id in ids if listing_id not in rows]
+    if missing:
+        raise ValueError(f"Объекты не найдены: {', '.join(map(str, missing))}")
+    if len({row['city'] for row in rows.values()}) > 1:
+        raise ValueError('Все объекты должны быть из одного города')
+
+    slots = sorted(rows.values(), key=lambda row: (row['auction_rank'], row['id']))
+    changes = []
+    for listing_id, slot in zip(ids, slots):
+        row = rows[listing_id]
+        if (row['auction_rank'], row['auction']) != (slot['auction_rank'], slot['auction']):
+            changes.append((listing_id, slot['auction_rank'], slot['auction']))
+
+    if changes:
+        # Ключи заданы явно - триггер не пересчитывает их по auction
+        cur.execute("SELECT set_config('hourly_rentals.ranking', 'on', true)")
+        execute_values(
+            cur,
+            f"""UPDATE {SCHEMA}.listings l SET auction_rank = v.auction_rank, auction = v.auction
+                FROM (VALUES %s) AS v(id, auction_rank, auction)
+                WHERE l.id = v.id""",
+            changes, template='(%s::integer, %s::bigint, %s::integer)', page_size=len(changes)
+        )
+        cur.execute("SELECT set_config('hourly_rentals.ranking', 'off', true)")
+
+    return [{'id': listing_id, 'auction': slot['auction']} for listing_id, slot in zip(ids, slots)]
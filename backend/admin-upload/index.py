@@ -1,9 +1,12 @@
 import json
 import os
 import jwt
-import boto3
 import base64
-import uuid
+
+from psycopg2.extras import RealDictCursor
+
+import db
+import images
 
 # Photo upload handler
 def verify_token(token: str) -> dict:
@@ -17,6 +20,41 @@ def verify_token(token: str) -> dict:
     except:
         return None
 
+def find_existing(digest: str):
+    '''Уже сохранённое фото с тем же содержимым; без БД - None, фото просто сохранится заново'''
+    try:
+        with db.connection() as conn:
+            return images.find(conn.cursor(cursor_factory=RealDictCursor), digest)
+    except Exception as e:
+        print(f'[UPLOAD] Duplicate lookup failed for {digest}: {e}')
+        return None
+
+def find_known(uploads) -> dict:
+    '''Готовые фото пакета по хешам из запроса - одним запросом до запуска потоков confirm_batch'''
+    if not isinstance(uploads, list):
+        return {}
+    try:
+        with db.connection() as conn:
+            return images.find_many(
+                conn.cursor(cursor_factory=RealDictCursor),
+                [item.get('sha256') for item in uploads if isinstance(item, dict)]
+            )
+    except Exception as e:
+        print(f'[UPLOAD] Batch duplicate lookup failed: {e}')
+        return {}
+
+def save_metadata(stored_items: list):
+    '''Размеры и варианты фото в images; без БД фото всё равно доступно по ссылке'''
+    if not stored_items:
+        return
+    try:
+        with db.connection() as conn:
+            cur = conn.cursor()
+            for stored in stored_items:
+                images.record(cur, stored)
+    except Exception as e:
+        print(f'[UPLOAD] Image metadata not saved for {len(stored_items)} photo(s): {e}')
+
 def handler(event: dict, context) -> dict:
     '''API для загрузки фотографий объектов'''
     print('=== HANDLER CALLED ===')
@@ -73,55 +111,75 @@ def handler(event: dict, context) -> dict:
         body = json.loads(event.get('body', '{}'))
         print(f'Body keys: {list(body.keys())}')
         
-        # Получаем base64 изображение
-        image_base64 = body.get('image')
-        content_type = body.get('contentType', 'image/jpeg')
-        print(f'Content-Type: {content_type}')
-        print(f'Image base64 length: {len(image_base64) if image_base64 else 0}')
+        action = body.get('action')
+        print(f'Action: {action or "base64"}')
         
-        if not image_base64:
-            print('ERROR: No image in request')
+        try:
+            if action == 'presign':
+                # Шаг 1: ссылка для загрузки файла напрямую в хранилище
+                presigned = images.presign(body.get('content_type'), body.get('size'))
+                print(f"Presigned upload: {presigned['key']}")
+                return {
+                    'statusCode': 200,
+                    'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                    'body': json.dumps(presigned),
+                    'isBase64Encoded': False
+                }
+            
+            if action == 'presign_batch':
+                # Пакет: ссылки для всех файлов одним вызовом
+                items = images.presign_batch(body.get('files'))
+                print(f'Presigned batch: {len(items)} file(s)')
+                return {
+                    'statusCode': 200,
+                    'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                    'body': json.dumps({'items': items}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            if action == 'confirm_batch':
+                # Пакет: варианты всех загруженных файлов, параллельно; ошибка одного файла не мешает остальным
+                results = images.confirm_batch(body.get('uploads'), find_known(body.get('uploads')))
+                print(f"Confirmed batch: {sum(item['ok'] for item in results)}/{len(results)} ok")
+                save_metadata([item for item in results if item['ok']])
+                items = [
+                    {'index': item['index'], 'ok': True, **images.describe(item)} if item['ok'] else item
+                    for item in results
+                ]
+                return {
+                    'statusCode': 200,
+                    'headers': {**cors_headers, 'Content-Type': 'application/json'},
+                    'body': json.dumps({'items': items}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            if action == 'confirm':
+                # Шаг 2: файл уже в хранилище - нарезаем варианты thumb/card/full в WebP и JPEG
+                print(f"Confirming upload: {body.get('key')}")
+                stored = images.confirm(body.get('key'), body.get('upload_id'), body.get('parts'), find_existing)
+            else:
+                # Старые клиенты: изображение base64 в теле запроса
+                image_base64 = body.get('image')
+                print(f'Image base64 length: {len(image_base64) if image_base64 else 0}')
+                if not image_base64:
+                    raise images.InvalidImage('Изображение обязательно')
+                stored = images.ingest(base64.b64decode(image_base64), find_existing)
+        except images.InvalidImage as e:
+            print(f'ERROR: {e}')
             return {
                 'statusCode': 400,
                 'headers': {**cors_headers, 'Content-Type': 'application/json'},
-                'body': json.dumps({'error': 'Изображение обязательно'}),
+                'body': json.dumps({'error': str(e)}, ensure_ascii=False),
                 'isBase64Encoded': False
             }
+        print(f"S3 upload complete, CDN URL: {stored['url']}")
         
-        # Декодируем base64
-        print('Decoding base64...')
-        image_data = base64.b64decode(image_base64)
-        print(f'Image size: {len(image_data)} bytes')
-        
-        # Генерируем уникальное имя файла
-        file_extension = content_type.split('/')[-1]
-        file_name = f"listings/{uuid.uuid4()}.{file_extension}"
-        print(f'File name: {file_name}')
-        
-        # Загружаем в S3
-        print('Uploading to S3...')
-        s3 = boto3.client('s3',
-            endpoint_url='https://bucket.poehali.dev',
-            aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
-            aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
-        )
-        
-        s3.put_object(
-            Bucket='files',
-            Key=file_name,
-            Body=image_data,
-            ContentType=content_type
-        )
-        print('S3 upload complete')
-        
-        # Формируем CDN URL
-        cdn_url = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{file_name}"
-        print(f'CDN URL: {cdn_url}')
+        save_metadata([stored])
         
         response = {
             'statusCode': 200,
             'headers': {**cors_headers, 'Content-Type': 'application/json'},
-            'body': json.dumps({'url': cdn_url}),
+            'body': json.dumps(images.describe(stored)),
             'isBase64Encoded': False
         }
         print(f'Response: {response}')
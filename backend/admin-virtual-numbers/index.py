@@ -1,6 +1,6 @@
 import json
 import os
-import psycopg2
+import db
 from psycopg2.extras import RealDictCursor
 
 
@@ -22,7 +22,7 @@ def handler(event: dict, context) -> dict:
         }
     
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        conn = db.connect()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         # GET - список всех номеров
@@ -0,0 +1,102 @@
+'''
+Фоновое выравнивание позиций объектов по городам (см. V0059 и admin-listings/ranking.py).
+
+Перемещение объекта в админке пишет только его строку, поэтому номера auction соседей
+на время расходятся с порядком auction_rank. Функция для каждого города вызывает
+rebalance_auction_city: номера позиций снова совпадают с местом в порядке, а ключи
+разрежаются, если промежутки между соседями почти кончились. Каждый город - отдельная
+короткая транзакция; меняются только строки, у которых что-то отличается.
+
+Настройки (переменные окружения функции):
+    CRON_SECRET - обязателен: запрос должен прийти с X-Authorization: Bearer {CRON_SECRET}
+'''
+import json
+import os
+
+import db
+
+SCHEMA = 't_p39732784_hourly_rentals_platf'
+
+
+def cities(conn) -> list:
+    cur = conn.cursor()
+    cur.execute(f"SELECT DISTINCT city FROM {SCHEMA}.listings WHERE is_archived = false AND city IS NOT NULL")
+    result = [row[0] for row in cur.fetchall()]
+    cur.close()
+    return result
+
+
+def rebalance() -> dict:
+    with db.connection() as conn:
+        names = cities(conn)
+
+    changed = {}
+    for city in names:
+        with db.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"SELECT {SCHEMA}.rebalance_auction_city(%s)", (city,))
+            count = cur.fetchone()[0]
+            cur.close()
+        if count:
+            changed[city] = count
+
+    result = {'success': True, 'cities': len(names), 'changed': changed}
+    print(f'[AUCTION_REBALANCE] {json.dumps(result, ensure_ascii=False)}')
+    return result
+
+
+def handler(event: dict, context) -> dict:
+    '''Выравнивание номеров позиций и ключей порядка объектов по городам'''
+
+    method = event.get('httpMethod', 'POST')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Authorization'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method != 'POST':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+
+    cron_secret = (event.get('headers') or {}).get('X-Authorization', '')
+    expected_secret = os.environ.get('CRON_SECRET', '')
+
+    # Без настроенного секрета функция не запускается
+    if not expected_secret or cron_secret != f'Bearer {expected_secret}':
+        return {
+            'statusCode': 401,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Unauthorized'}),
+            'isBase64Encoded': False
+        }
+
+    try:
+        result = rebalance()
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps(result, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
+    except Exception as e:
+        print(f'ERROR: {type(e).__name__}: {str(e)}')
+        import traceback
+        traceback.print_exc()
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
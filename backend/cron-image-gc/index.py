@@ -0,0 +1,238 @@
+'''
+Сборка мусора в хранилище фото: удаляет объекты listings/, на которые никто не ссылается.
+
+Ссылки собираются потоком (серверный курсор) из listings.image_url, logo_url, rooms.images,
+room_categories.image_urls, listing_photos и images в множество корней ключей:
+listings/<sha256>/card.webp и listings/<uuid>.jpg сводятся к listings/<sha256> и
+listings/<uuid>.jpg. Затем постранично читается список объектов бакета, и объекты без
+ссылок старше GRACE_HOURS удаляются пакетами delete_objects по 1000 ключей.
+Брошенные временные загрузки uploads/ удаляются через STAGING_GRACE_HOURS.
+
+Настройки (переменные окружения функции):
+    S3_ENDPOINT_URL, S3_BUCKET   - как в upload-image; пустой S3_ENDPOINT_URL - стандартный
+                                   адрес AWS, так функцию можно проверить под moto или MinIO
+    IMAGE_GC_GRACE_HOURS         - сколько часов не трогать объекты без ссылок (168)
+    IMAGE_GC_STAGING_GRACE_HOURS - срок жизни временных загрузок (24)
+    CRON_SECRET                  - обязателен: запрос должен прийти с X-Authorization: Bearer {CRON_SECRET}
+
+?dry_run=1 - только посчитать, что было бы удалено.
+'''
+import json
+import os
+import re
+from datetime import datetime, timedelta, timezone
+
+import boto3
+from botocore.config import Config
+
+import db
+
+SCHEMA = 't_p39732784_hourly_rentals_platf'
+
+BUCKET = os.environ.get('S3_BUCKET', 'files')
+ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL', 'https://bucket.poehali.dev') or None
+GRACE_HOURS = float(os.environ.get('IMAGE_GC_GRACE_HOURS', '168'))
+STAGING_GRACE_HOURS = float(os.environ.get('IMAGE_GC_STAGING_GRACE_HOURS', '24'))
+
+PHOTOS_PREFIX = 'listings/'
+STAGING_PREFIX = 'uploads/'
+
+# Максимум ключей в одном delete_objects
+DELETE_BATCH_SIZE = 1000
+REFERENCES_ITERSIZE = 5000
+
+# Корень фото: каталог вариантов listings/<hash>/ или старый одиночный файл listings/<uuid>.<ext>
+ROOT_RE = re.compile(r'(?:^|/)(listings/[^/?#]+)')
+
+REFERENCES_SQL = f"""
+    SELECT unnest({SCHEMA}.listing_image_urls(image_url)) AS url FROM {SCHEMA}.listings
+    UNION ALL SELECT logo_url FROM {SCHEMA}.listings WHERE logo_url IS NOT NULL
+    UNION ALL SELECT unnest(images) FROM {SCHEMA}.rooms
+    UNION ALL SELECT unnest(image_urls) FROM {SCHEMA}.room_categories
+    UNION ALL SELECT photo_url FROM {SCHEMA}.listing_photos
+    UNION ALL SELECT url FROM {SCHEMA}.images
+        WHERE ref_count > 0 OR released_at IS NULL OR released_at >= NOW() - make_interval(secs => %s)
+"""
+
+
+def storage_root(value: str):
+    '''Корень ключа хранилища по ключу объекта или по публичной ссылке'''
+    match = ROOT_RE.search(value or '')
+    return match.group(1) if match else None
+
+
+def storage_client():
+    return boto3.client(
+        's3',
+        endpoint_url=ENDPOINT_URL,
+        config=Config(signature_version='s3v4'),
+        aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+        aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
+    )
+
+
+def forget_released(conn) -> int:
+    '''Удалить из images фото без ссылок дольше срока: их объекты станут мусором'''
+    cur = conn.cursor()
+    cur.execute(
+        f"""DELETE FROM {SCHEMA}.images
+            WHERE ref_count = 0 AND released_at < NOW() - make_interval(secs => %s)""",
+        (GRACE_HOURS * 3600,)
+    )
+    count = cur.rowcount
+    cur.close()
+    return count
+
+
+def load_references(conn) -> set:
+    '''Множество корней всех ключей, на которые есть ссылки в БД'''
+    roots = set()
+    cur = conn.cursor(name='image_gc_references')
+    cur.itersize = REFERENCES_ITERSIZE
+    cur.execute(REFERENCES_SQL, (GRACE_HOURS * 3600,))
+    for (url,) in cur:
+        root = storage_root(url)
+        if root:
+            roots.add(root)
+    cur.close()
+    return roots
+
+
+def _delete(s3, keys: list, dry_run: bool) -> int:
+    if not keys or dry_run:
+        return len(keys)
+    response = s3.delete_objects(
+        Bucket=BUCKET,
+        Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True}
+    )
+    for error in response.get('Errors', []):
+        print(f"[IMAGE_GC] Failed to delete {error.get('Key')}: {error.get('Code')} {error.get('Message')}")
+    return len(keys) - len(response.get('Errors', []))
+
+
+def sweep(s3, prefix: str, is_garbage, dry_run: bool) -> dict:
+    '''Пройти объекты prefix постранично и удалить те, для которых is_garbage(obj) -> {scanned, deleted, bytes}'''
+    stats = {'scanned': 0, 'deleted': 0, 'bytes': 0}
+    batch = []
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=BUCKET, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            stats['scanned'] += 1
+            if not is_garbage(obj):
+                continue
+            batch.append(obj['Key'])
+            stats['bytes'] += obj.get('Size', 0)
+            if len(batch) == DELETE_BATCH_SIZE:
+                stats['deleted'] += _delete(s3, batch, dry_run)
+                batch = []
+    stats['deleted'] += _delete(s3, batch, dry_run)
+    return stats
+
+
+def abort_stale_multipart(s3, cutoff: datetime, dry_run: bool) -> int:
+    '''Прервать незавершённые multipart-загрузки uploads/ старше cutoff'''
+    aborted = 0
+    for page in s3.get_paginator('list_multipart_uploads').paginate(Bucket=BUCKET, Prefix=STAGING_PREFIX):
+        for upload in page.get('Uploads', []):
+            if upload['Initiated'] >= cutoff:
+                continue
+            if not dry_run:
+                s3.abort_multipart_upload(Bucket=BUCKET, Key=upload['Key'], UploadId=upload['UploadId'])
+            aborted += 1
+    return aborted
+
+
+def collect(dry_run: bool = False) -> dict:
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(hours=GRACE_HOURS)
+    staging_cutoff = now - timedelta(hours=STAGING_GRACE_HOURS)
+
+    with db.connection() as conn:
+        forgotten = 0 if dry_run else forget_released(conn)
+        references = load_references(conn)
+
+    # Пустое множество ссылок - скорее ошибка чтения, чем пустой каталог: хранилище не трогаем
+    if not references:
+        raise RuntimeError('Не найдено ни одной ссылки на фото, сборка мусора остановлена')
+
+    s3 = storage_client()
+    photos = sweep(
+        s3, PHOTOS_PREFIX,
+        lambda obj: obj['LastModified'] < cutoff and storage_root(obj['Key']) not in references,
+        dry_run
+    )
+    staging = sweep(s3, STAGING_PREFIX, lambda obj: obj['LastModified'] < staging_cutoff, dry_run)
+    aborted = abort_stale_multipart(s3, staging_cutoff, dry_run)
+
+    result = {
+        'success': True,
+        'dry_run': dry_run,
+        'references': len(references),
+        'forgotten_images': forgotten,
+        'scanned': photos['scanned'],
+        'deleted': photos['deleted'],
+        'deleted_bytes': photos['bytes'],
+        'staging_deleted': staging['deleted'],
+        'multipart_aborted': aborted
+    }
+    print(f'[IMAGE_GC] {json.dumps(result)}')
+    return result
+
+
+def handler(event: dict, context) -> dict:
+    '''Удаление из хранилища фото, на которые не ссылается ни один объект'''
+
+    method = event.get('httpMethod', 'POST')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Authorization'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method != 'POST':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+
+    cron_secret = (event.get('headers') or {}).get('X-Authorization', '')
+    expected_secret = os.environ.get('CRON_SECRET', '')
+
+    # Без настроенного секрета функция не запускается
+    if not expected_secret or cron_secret != f'Bearer {expected_secret}':
+        return {
+            'statusCode': 401,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Unauthorized'}),
+            'isBase64Encoded': False
+        }
+
+    params = event.get('queryStringParameters') or {}
+    dry_run = (params.get('dry_run') or '').lower() in ('1', 'true')
+
+    try:
+        result = collect(dry_run)
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps(result),
+            'isBase64Encoded': False
+        }
+    except Exception as e:
+        print(f'ERROR: {type(e).__name__}: {str(e)}')
+        import traceback
+        traceback.print_exc()
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}, ensure_ascii=False),
+            'isBase64Encoded': False
+        }
@@ -1,7 +1,7 @@
 import json
 import os
 import jwt
-import psycopg2
+import db
 from psycopg2.extras import RealDictCursor
 from datetime import datetime
 
@@ -45,7 +45,7 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn = db.connect()
     cur = conn.cursor(cursor_factory=RealDictCursor)
     
     try:
@@ -0,0 +1,218 @@
+'''
+Пул соединений с PostgreSQL, переживающий тёплые вызовы функции.
+
+Модуль одинаковый во всех функциях backend/*, которые работают с БД:
+пул живёт на уровне модуля, поэтому повторные вызовы того же инстанса
+не тратят время на TCP + TLS + авторизацию в Postgres.
+
+Использование:
+    conn = db.connect()          # drop-in замена psycopg2.connect(DATABASE_URL)
+    ...
+    conn.close()                 # возвращает соединение в пул, а не рвёт его
+
+    with db.connection() as conn:  # commit при успехе, rollback при ошибке
+        ...
+
+Настройки (переменные окружения функции):
+    DB_POOL_MAX_SIZE      - максимум соединений на инстанс (по умолчанию 2)
+    DB_POOL_TIMEOUT       - сколько секунд ждать свободное соединение (5)
+    DB_POOL_PING_AFTER    - через сколько секунд простоя проверять соединение SELECT 1 (30)
+    DB_POOL_MAX_LIFETIME  - через сколько секунд соединение пересоздаётся (1800)
+'''
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '2'))
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '5'))
+PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', '30'))
+MAX_LIFETIME = float(os.environ.get('DB_POOL_MAX_LIFETIME', '1800'))
+
+
+class PoolExhausted(Exception):
+    '''Все соединения пула заняты дольше DB_POOL_TIMEOUT'''
+
+
+class _Pool:
+    '''Простой потокобезопасный пул: свободные соединения + счётчик выданных'''
+
+    def __init__(self, dsn: str, max_size: int):
+        self.dsn = dsn
+        self.max_size = max(1, max_size)
+        self.idle = []  # [(raw_conn, created_at, released_at)]
+        self.in_use = 0
+        self.cond = threading.Condition()
+
+    def _open(self):
+        raw = psycopg2.connect(
+            self.dsn,
+            connect_timeout=5,
+            keepalives=1,
+            keepalives_idle=30,
+            keepalives_interval=10,
+            keepalives_count=3
+        )
+        return raw, time.monotonic()
+
+    def _is_alive(self, raw, created_at: float, released_at: float) -> bool:
+        '''Проверка здоровья соединения перед выдачей'''
+        if raw.closed:
+            return False
+        now = time.monotonic()
+        if now - created_at > MAX_LIFETIME:
+            return False
+        if now - released_at < PING_AFTER:
+            return True
+        try:
+            cur = raw.cursor()
+            cur.execute('SELECT 1')
+            cur.fetchone()
+            cur.close()
+            raw.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    def acquire(self):
+        deadline = time.monotonic() + POOL_TIMEOUT
+        with self.cond:
+            while not self.idle and self.in_use >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhausted(f'Все {self.max_size} соединений с БД заняты')
+                self.cond.wait(remaining)
+            candidate = self.idle.pop() if self.idle else None
+            self.in_use += 1
+
+        try:
+            if candidate:
+                raw, created_at, released_at = candidate
+                if self._is_alive(raw, created_at, released_at):
+                    return raw, created_at
+                _close_quietly(raw)
+            return self._open()
+        except Exception:
+            with self.cond:
+                self.in_use -= 1
+                self.cond.notify()
+            raise
+
+    def release(self, raw, created_at: float):
+        keep = not raw.closed
+        if keep:
+            try:
+                if raw.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    raw.rollback()
+                if raw.autocommit:
+                    raw.autocommit = False
+            except psycopg2.Error:
+                keep = False
+
+        with self.cond:
+            self.in_use -= 1
+            if keep:
+                self.idle.append((raw, created_at, time.monotonic()))
+            self.cond.notify()
+
+        if not keep:
+            _close_quietly(raw)
+
+    def close_all(self):
+        with self.cond:
+            idle, self.idle = self.idle, []
+        for raw, _, _ in idle:
+            _close_quietly(raw)
+
+
+class PooledConnection:
+    '''
+    Обёртка над соединением psycopg2: всё проксируется в настоящее соединение,
+    а close() возвращает его в пул. Если обработчик забыл вызвать close(),
+    соединение вернётся в пул при сборке мусора.
+    '''
+
+    def __init__(self, pool: _Pool, raw, created_at: float):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise psycopg2.InterfaceError('connection already returned to pool')
+        return getattr(raw, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._raw, name, value)
+
+    @property
+    def closed(self) -> int:
+        return 1 if self._raw is None else self._raw.closed
+
+    def close(self):
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            return
+        self._raw = None
+        self._pool.release(raw, self._created_at)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _close_quietly(raw):
+    try:
+        raw.close()
+    except Exception:
+        pass
+
+
+def get_pool() -> _Pool:
+    '''Пул создаётся лениво при первом обращении и живёт, пока жив инстанс'''
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _Pool(os.environ['DATABASE_URL'], POOL_MAX_SIZE)
+    return _pool
+
+
+def connect() -> PooledConnection:
+    '''Взять соединение из пула (или открыть новое, если свободных нет)'''
+    pool = get_pool()
+    raw, created_at = pool.acquire()
+    return PooledConnection(pool, raw, created_at)
+
+
+@contextmanager
+def connection():
+    '''Соединение как контекстный менеджер: commit при успехе, rollback при ошибке'''
+    conn = connect()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def close_all():
+    '''Закрыть свободные соединения пула (например, перед остановкой инстанса)'''
+    if _pool is not None:
+        _pool.close_all()
@@ -1,7 +1,7 @@
 import json
 import os
 from datetime import datetime, timedelta
-import psycopg2
+import db
 from psycopg2.extras import RealDictCursor
 import urllib.request
 import urllib.parse
@@ -79,7 +79,7 @@ def handler(event: dict, context) -> dict:
     
     try:
         
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        conn = db.connect()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         # Получаем реальный номер владельца объекта
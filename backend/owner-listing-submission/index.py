@@ -1,6 +1,7 @@
 import json
 import os
-import psycopg2
+import db
+import listing_write
 from psycopg2.extras import RealDictCursor
 import secrets
 import string
@@ -57,7 +58,7 @@ def handler(event: dict, context) -> dict:
                 'isBase64Encoded': False
             }
         
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        conn = db.connect()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         # Проверяем, существует ли владелец с таким email
@@ -158,34 +159,14 @@ def handler(event: dict, context) -> dict:
         
         print(f"[INFO] Created listing with ID {listing_id}")
         
-        # Добавляем станции метро
+        # Добавляем станции метро и номера пакетами (см. listing_write.py)
         if body.get('metro_stations'):
-            for station in body['metro_stations']:
-                cur.execute("""
-                    INSERT INTO t_p39732784_hourly_rentals_platf.metro_stations 
-                    (listing_id, station_name, walk_minutes)
-                    VALUES (%s, %s, %s)
-                """, (listing_id, station['station_name'], station['walk_minutes']))
+            listing_write.save_metro_stations(cur, listing_id, body['metro_stations'])
         
-        # Добавляем номера
-        for room in body['rooms']:
-            cur.execute("""
-                INSERT INTO t_p39732784_hourly_rentals_platf.rooms 
-                (listing_id, type, price, description, images, square_meters, features, 
-                 min_hours, payment_methods, cancellation_policy)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                listing_id,
-                room['type'],
-                room['price'],
-                room.get('description', ''),
-                room.get('images', []),
-                room.get('square_meters', 0),
-                room.get('features', []),
-                room.get('min_hours', 1),
-                room.get('payment_methods', 'Наличные, банковская карта при заселении'),
-                room.get('cancellation_policy', 'Бесплатная отмена за 1 час до заселения')
-            ))
+        listing_write.save_rooms(
+            cur, listing_id,
+            [{**room, 'description': room.get('description', '')} for room in body['rooms']]
+        )
         
         conn.commit()
         cur.close()
@@ -1,8 +1,35 @@
 import json
 import os
 import jwt
-import psycopg2
+import db
 from psycopg2.extras import RealDictCursor
+import projections
+
+_OWNER_FIELDS = [
+    'id', 'title', 'city', 'district', 'owner_id', 'is_archived', 'auction',
+    'type', 'image_url', 'subscription_expires_at', 'moderation_status',
+    'moderation_comment', 'price', 'square_meters', 'logo_url', 'features',
+    'metro', 'metro_walk', 'has_parking', 'min_hours', 'lat', 'lng',
+    'expert_photo_rating', 'expert_photo_feedback',
+    'expert_fullness_rating', 'expert_fullness_feedback',
+    # Сводные поля по номерам и фото, поддерживаются триггерами (V0060)
+    'rooms_count', 'min_room_price', 'max_room_price', 'photos_count', 'primary_photo_url'
+]
+
+# Поля объектов владельца для fields= / profile= (см. projections.py)
+OWNER_PROJECTIONS = projections.Registry(
+    columns={name: f'l.{name}' for name in _OWNER_FIELDS},
+    relations=('rooms',),
+    profiles={
+        'full': _OWNER_FIELDS + ['rooms'],
+        'card': [
+            'id', 'title', 'city', 'district', 'type', 'price', 'image_url', 'auction',
+            'moderation_status', 'subscription_expires_at',
+            'rooms_count', 'min_room_price', 'photos_count', 'primary_photo_url'
+        ],
+        'moderation': ['id', 'title', 'moderation_status', 'moderation_comment'],
+    }
+)
 
 def verify_token(token: str) -> dict:
     '''Проверка JWT токена администратора'''
@@ -35,32 +62,38 @@ def handler(event: dict, context) -> dict:
     auth_header = event.get('headers', {}).get('X-Authorization', '')
     token = auth_header.replace('Bearer ', '') if auth_header else ''
     
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn = db.connect()
     cur = conn.cursor(cursor_factory=RealDictCursor)
     
     try:
         if method == 'GET':
-            owner_id = event.get('queryStringParameters', {}).get('owner_id')
+            params = event.get('queryStringParameters', {}) or {}
+            owner_id = params.get('owner_id')
             print(f'GET request for owner_id: {owner_id}')
             
             if owner_id:
+                try:
+                    projection = OWNER_PROJECTIONS.resolve(params, 'full')
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': str(e)}),
+                        'isBase64Encoded': False
+                    }
+                
                 # Получить отели конкретного владельца (доступно всем с токеном)
-                cur.execute("""
-                    SELECT id, title, city, district, owner_id, is_archived, auction,
-                           type, image_url, subscription_expires_at, moderation_status,
-                           moderation_comment, price, square_meters, logo_url, features, 
-                           metro, metro_walk, has_parking, min_hours, lat, lng,
-                           expert_photo_rating, expert_photo_feedback,
-                           expert_fullness_rating, expert_fullness_feedback
-                    FROM listings
-                    WHERE owner_id = %s AND is_archived = FALSE
-                    ORDER BY title
+                cur.execute(f"""
+                    SELECT {projection.select()}
+                    FROM listings l
+                    WHERE l.owner_id = %s AND l.is_archived = FALSE
+                    ORDER BY l.title
                 """, (owner_id,))
                 listings = cur.fetchall()
                 print(f'Found {len(listings)} listings for owner {owner_id}')
                 
                 # Загружаем комнаты с экспертными оценками
-                if listings:
+                if listings and projection.wants('rooms'):
                     listing_ids = [l['id'] for l in listings]
                     placeholders = ','.join(['%s'] * len(listing_ids))
                     cur.execute(
@@ -1,6 +1,6 @@
 import json
 import os
-import psycopg2
+import db
 import secrets
 from datetime import datetime, timedelta
 
@@ -32,7 +32,7 @@ def handler(event: dict, context) -> dict:
     body = json.loads(event.get('body', '{}'))
     action = body.get('action')
     
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn = db.connect()
     cur = conn.cursor()
     
     try:
@@ -1,6 +1,6 @@
 import json
 import os
-import psycopg2
+import db
 
 def handler(event: dict, context) -> dict:
     '''API для получения истории транзакций владельца'''
@@ -45,7 +45,7 @@ def handler(event: dict, context) -> dict:
             'body': json.dumps({'error': 'owner_id required'})
         }
     
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn = db.connect()
     cur = conn.cursor()
     
     try:
@@ -3,28 +3,21 @@ API для обновления объекта владельцем с отпр
 """
 import json
 import os
-import psycopg2
+import db
 from psycopg2.extras import RealDictCursor
 from datetime import datetime
 
-def verify_owner_token(token: str):
-    """Проверка токена владельца"""
+def verify_owner_token(cur, token: str):
+    """Проверка токена владельца (на соединении самого запроса)"""
     if not token:
         return None
     
     try:
-        dsn = os.environ.get('DATABASE_URL')
-        conn = psycopg2.connect(dsn)
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
         cur.execute("SELECT * FROM owners WHERE token = %s", (token,))
         owner = cur.fetchone()
-        
-        cur.close()
-        conn.close()
-        
         return dict(owner) if owner else None
     except Exception:
+        cur.connection.rollback()
         return None
 
 def handler(event: dict, context) -> dict:
@@ -46,9 +39,13 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     
+    conn = None
     try:
+        conn = db.connect()
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        
         token = event.get('headers', {}).get('X-Authorization', '').replace('Bearer ', '')
-        owner = verify_owner_token(token)
+        owner = verify_owner_token(cur, token)
         
         if not owner:
             return {
@@ -58,10 +55,6 @@ def handler(event: dict, context) -> dict:
                 'isBase64Encoded': False
             }
         
-        dsn = os.environ.get('DATABASE_URL')
-        conn = psycopg2.connect(dsn)
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
         if method == 'PUT':
             body = json.loads(event.get('body', '{}'))
             listing_id = body.get('listing_id')
@@ -226,4 +219,8 @@ def handler(event: dict, context) -> dict:
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': str(e)}),
             'isBase64Encoded': False
-        }
\ No newline at end of file
+        }
+    finally:
+        # Ранние ответы (например, 401) тоже возвращают соединение в пул
+        if conn:
+            conn.close()
\ No newline at end of file
@@ -1,6 +1,6 @@
 import json
 import os
-import psycopg2
+import db
 import uuid
 import base64
 import urllib.request
@@ -46,7 +46,7 @@ def handler(event: dict, context) -> dict:
         }
     
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        conn = db.connect()
         cur = conn.cursor()
     except Exception as e:
         print(f'Database connection error: {str(e)}')
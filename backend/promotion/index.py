@@ -1,6 +1,6 @@
 import json
 import os
-import psycopg2
+import db
 from psycopg2.extras import RealDictCursor
 from datetime import datetime, timedelta, timezone
 import random
@@ -43,7 +43,7 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn = db.connect()
     cur = conn.cursor(cursor_factory=RealDictCursor)
     
     try:
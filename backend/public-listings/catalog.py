@@ -0,0 +1,314 @@
+'''
+Запросы публичного каталога: фильтры, keyset-пагинация, подгрузка комнат и метро
+'''
+import base64
+import json
+import re
+
+import projections
+
+SCHEMA = 't_p39732784_hourly_rentals_platf'
+
+# Объект виден на сайте, если он не в архиве и одобрен модератором
+PUBLIC_WHERE = "l.is_archived = false AND (l.moderation_status IS NULL OR l.moderation_status = 'approved')"
+
+# Порядок выдачи каталога: город, ключ позиции в городе (auction_rank, см. V0059), id
+AUCTION_KEY = 'l.auction_rank'
+
+# Поля объекта в выдаче каталога: имя в JSON -> SQL
+PROJECTIONS = projections.Registry(
+    columns={
+        'id': 'l.id', 'title': 'l.title', 'short_title': 'l.short_title', 'type': 'l.type', 'city': 'l.city',
+        'district': 'l.district', 'price': 'l.price', 'rating': 'l.rating', 'reviews': 'l.reviews',
+        'auction': 'l.auction',
+        'auction_rank': 'l.auction_rank',
+        # Главное фото в варианте card - одно чтение частичного индекса idx_listing_photos_main;
+        # у фото, загруженных до нарезки вариантов, - исходная ссылка
+        'image_url': f"""(SELECT COALESCE(p.variants->'card'->>'jpeg', p.photo_url) FROM {SCHEMA}.listing_photos p
+            WHERE p.listing_id = l.id AND p.room_id IS NULL AND p.is_main)""",
+        'image_webp': f"""(SELECT p.variants->'card'->>'webp' FROM {SCHEMA}.listing_photos p
+            WHERE p.listing_id = l.id AND p.room_id IS NULL AND p.is_main)""",
+        'logo_url': 'l.logo_url', 'metro': 'l.metro', 'metroWalk': 'l.metro_walk',
+        'hasParking': 'l.has_parking', 'parking_type': 'l.parking_type',
+        'parking_price_per_hour': 'l.parking_price_per_hour',
+        'lat': 'l.lat', 'lng': 'l.lng',
+        'minHours': 'l.min_hours', 'phone': 'l.phone', 'telegram': 'l.telegram',
+        'price_warning_holidays': 'l.price_warning_holidays',
+        'price_warning_daytime': 'l.price_warning_daytime',
+        # Сводные поля по номерам и фото, поддерживаются триггерами (V0060)
+        'rooms_count': 'l.rooms_count', 'min_room_price': 'l.min_room_price',
+        'max_room_price': 'l.max_room_price', 'photos_count': 'l.photos_count',
+    },
+    relations=('rooms', 'metro_stations'),
+    profiles={
+        'full': [
+            'id', 'title', 'short_title', 'type', 'city', 'district', 'price', 'rating', 'reviews', 'auction',
+            'image_url', 'image_webp', 'logo_url', 'metro', 'metroWalk', 'hasParking', 'parking_type',
+            'parking_price_per_hour', 'lat', 'lng', 'minHours', 'phone', 'telegram',
+            'price_warning_holidays', 'price_warning_daytime', 'rooms', 'metro_stations'
+        ],
+        'card': [
+            'id', 'title', 'type', 'city', 'district', 'price', 'rating', 'reviews',
+            'image_url', 'image_webp', 'logo_url', 'metro', 'metroWalk', 'hasParking', 'minHours',
+            'rooms_count', 'min_room_price'
+        ],
+        'map': ['id', 'lat', 'lng', 'price', 'type'],
+    }
+)
+
+DEFAULT_PROFILE = 'full'
+LISTING_COLUMNS = PROJECTIONS.profile(DEFAULT_PROFILE).select()
+
+# Поля позиции в порядке выдачи - нужны для курсора страницы
+CURSOR_FIELDS = ('city', 'auction_rank')
+
+# Маска и номера сверх маски запрошенных удобств по словарю amenities (см. V0054);
+# InitPlan, считаются один раз
+AMENITY_MASK = f"(SELECT COALESCE(bit_or(1::bigint << a.bit), 0) FROM {SCHEMA}.amenities a WHERE a.key = ANY(%s) AND a.bit <= 62)"
+AMENITY_EXTRA = f"(SELECT COALESCE(array_agg(a.bit), '{{}}') FROM {SCHEMA}.amenities a WHERE a.key = ANY(%s) AND a.bit > 62)"
+MAX_AMENITIES = 20
+
+DEFAULT_PAGE_SIZE = 30
+MAX_PAGE_SIZE = 100
+
+PAGINATION_PARAMS = ('limit', 'cursor')
+
+# Поля, в которых ищется подстрока q: (имя в выдаче, SQL)
+TEXT_FILTER_FIELDS = (('title', 'l.title'), ('city', 'l.city'))
+
+
+def _parse_int(params: dict, name: str):
+    value = params.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'Параметр {name} должен быть целым числом')
+
+
+def amenity_key(name: str) -> str:
+    '''Как amenity_key() в БД: "Wi-Fi", "WiFi" и "wifi" - одно удобство'''
+    return re.sub(r'[\s\-_./]+', '', name.strip().lower().replace('ё', 'е'))
+
+
+def parse_filters(params: dict) -> dict:
+    '''Разбор фильтров каталога из query string. Пустые значения игнорируются.'''
+    filters = {}
+
+    city = (params.get('city') or '').strip()
+    if city and city != 'Все города':
+        filters['city'] = city
+
+    listing_type = (params.get('type') or '').strip()
+    if listing_type and listing_type != 'all':
+        filters['type'] = listing_type
+
+    if params.get('parking') in ('true', '1'):
+        filters['parking'] = True
+
+    for name in ('max_hours', 'price_min', 'price_max'):
+        value = _parse_int(params, name)
+        if value is not None:
+            filters[name] = value
+
+    text = (params.get('q') or '').strip()
+    if text:
+        filters['q'] = text
+
+    amenities = sorted({amenity_key(name) for name in (params.get('amenities') or '').split(',')} - {''})
+    if len(amenities) > MAX_AMENITIES:
+        raise ValueError(f'Можно выбрать не больше {MAX_AMENITIES} удобств')
+    if amenities:
+        filters['amenities'] = amenities
+
+    return filters
+
+
+def parse_page_size(params: dict) -> int:
+    limit = _parse_int(params, 'limit')
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    if limit < 1:
+        raise ValueError('Параметр limit должен быть больше 0')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def encode_cursor(listing: dict) -> str:
+    '''Курсор - позиция последнего объекта страницы в порядке (city, auction_rank, id)'''
+    raw = json.dumps([listing['city'], listing['auction_rank'], listing['id']], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        city, rank, listing_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return str(city), int(rank), int(listing_id)
+    except Exception:
+        raise ValueError('Некорректный cursor')
+
+
+def _escape_like(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def build_where(filters: dict) -> tuple:
+    '''
+    WHERE для публичного каталога с учётом фильтров -> (sql, args).
+    Те же фильтры для объектов из снимка - matches_filters ниже, меняются вместе.
+    '''
+    conditions = [PUBLIC_WHERE]
+    args = []
+
+    if 'city' in filters:
+        conditions.append('l.city = %s')
+        args.append(filters['city'])
+    if 'type' in filters:
+        conditions.append('l.type = %s')
+        args.append(filters['type'])
+    if filters.get('parking'):
+        conditions.append('l.has_parking = true')
+    if 'max_hours' in filters:
+        conditions.append('COALESCE(l.min_hours, 1) <= %s')
+        args.append(filters['max_hours'])
+    if 'price_min' in filters:
+        conditions.append('l.price >= %s')
+        args.append(filters['price_min'])
+    if 'price_max' in filters:
+        conditions.append('l.price <= %s')
+        args.append(filters['price_max'])
+    if 'q' in filters:
+        pattern = f"%{_escape_like(filters['q'])}%"
+        conditions.append('(' + ' OR '.join(f'{sql} ILIKE %s' for _, sql in TEXT_FILTER_FIELDS) + ')')
+        args.extend([pattern] * len(TEXT_FILTER_FIELDS))
+    if 'amenities' in filters:
+        # Все удобства должны быть в словаре, иначе объектов с ними заведомо нет
+        keys = filters['amenities']
+        conditions.append(
+            f'(SELECT count(*) FROM {SCHEMA}.amenities a WHERE a.key = ANY(%s)) = %s'
+            f' AND (l.amenity_mask & {AMENITY_MASK}) = {AMENITY_MASK}'
+            f' AND l.amenity_extra @> {AMENITY_EXTRA}'
+        )
+        args.extend([keys, len(keys), keys, keys, keys])
+
+    return ' AND '.join(conditions), args
+
+
+def matches_filters(listing: dict, filters: dict) -> bool:
+    '''
+    build_where для объекта из снимка (поля в формате выдачи), без PUBLIC_WHERE:
+    в снимке только опубликованные объекты. amenities не проверяется - маски в снимке нет.
+    '''
+    if 'city' in filters and listing.get('city') != filters['city']:
+        return False
+    if 'type' in filters and listing.get('type') != filters['type']:
+        return False
+    if filters.get('parking') and not listing.get('hasParking'):
+        return False
+    if 'max_hours' in filters and (listing.get('minHours') or 1) > filters['max_hours']:
+        return False
+    price = listing.get('price')
+    if 'price_min' in filters and (price is None or price < filters['price_min']):
+        return False
+    if 'price_max' in filters and (price is None or price > filters['price_max']):
+        return False
+    if 'q' in filters:
+        needle = filters['q'].lower()
+        if not any(needle in (listing.get(name) or '').lower() for name, _ in TEXT_FILTER_FIELDS):
+            return False
+    return True
+
+
+def fetch_listings(cur, filters: dict, after: tuple = None, limit: int = None, columns: str = LISTING_COLUMNS) -> list:
+    '''Объекты каталога в порядке (city, auction_rank, id), опционально после курсора'''
+    where, args = build_where(filters)
+    if after:
+        where += f' AND (l.city, {AUCTION_KEY}, l.id) > (%s, %s, %s)'
+        args.extend(after)
+
+    query = f"""
+        SELECT {columns}
+        FROM {SCHEMA}.listings l
+        WHERE {where}
+        ORDER BY l.city ASC, {AUCTION_KEY} ASC, l.id ASC
+    """
+    if limit is not None:
+        query += ' LIMIT %s'
+        args.append(limit)
+
+    cur.execute(query, args)
+    return [dict(row) for row in cur.fetchall()]
+
+
+def attach_rooms_and_metro(cur, listings: list, rooms: bool = True, metro: bool = True) -> list:
+    '''Подгружаем комнаты (без images и description) и метро только для переданных объектов'''
+    if not listings or not (rooms or metro):
+        return listings
+
+    listing_ids = [l['id'] for l in listings]
+
+    if rooms:
+        _attach_rooms(cur, listings, listing_ids)
+    if metro:
+        _attach_metro(cur, listings, listing_ids)
+    return listings
+
+
+def _attach_rooms(cur, listings: list, listing_ids: list):
+    cur.execute(
+        f"""SELECT listing_id, id, type, price, square_meters, min_hours, features
+            FROM {SCHEMA}.rooms
+            WHERE listing_id = ANY(%s)
+            ORDER BY listing_id, id""",
+        (listing_ids,)
+    )
+    rooms_by_listing = {}
+    for room in cur.fetchall():
+        room_dict = dict(room)
+        rooms_by_listing.setdefault(room_dict.pop('listing_id'), []).append(room_dict)
+
+    for listing in listings:
+        listing['rooms'] = rooms_by_listing.get(listing['id'], [])
+
+
+def _attach_metro(cur, listings: list, listing_ids: list):
+    cur.execute(
+        f"""SELECT listing_id, station_name, walk_minutes
+            FROM {SCHEMA}.metro_stations
+            WHERE listing_id = ANY(%s)""",
+        (listing_ids,)
+    )
+    metro_by_listing = {}
+    for metro in cur.fetchall():
+        metro_dict = dict(metro)
+        metro_by_listing.setdefault(metro_dict.pop('listing_id'), []).append(metro_dict)
+
+    for listing in listings:
+        listing['metro_stations'] = metro_by_listing.get(listing['id'], [])
+
+
+def fetch_projected(cur, filters: dict, projection) -> list:
+    '''Все подходящие объекты только с запрошенными полями и связями'''
+    listings = fetch_listings(cur, filters, columns=projection.select())
+    return attach_rooms_and_metro(
+        cur, listings, rooms=projection.wants('rooms'), metro=projection.wants('metro_stations')
+    )
+
+
+def fetch_page(cur, filters: dict, after: tuple = None, limit: int = DEFAULT_PAGE_SIZE, projection=None) -> dict:
+    '''Одна страница каталога: берём limit + 1 строк, чтобы понять, есть ли следующая'''
+    projection = projection or PROJECTIONS.profile(DEFAULT_PROFILE)
+    rows = fetch_listings(cur, filters, after=after, limit=limit + 1, columns=projection.select(extra=CURSOR_FIELDS))
+
+    has_more = len(rows) > limit
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1]) if has_more else None
+    projection.strip(page, extra=CURSOR_FIELDS)
+    attach_rooms_and_metro(cur, page, rooms=projection.wants('rooms'), metro=projection.wants('metro_stations'))
+
+    return {
+        'listings': page,
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    }
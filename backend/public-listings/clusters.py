@@ -0,0 +1,166 @@
+'''
+Кластеры маркеров карты по уровням зума (по схеме supercluster).
+
+Иерархия строится один раз на версию каталога из снимка "все города": точки
+проецируются в Web Mercator, на каждом зуме от MAX_ZOOM к MIN_ZOOM кластеры
+предыдущего уровня жадно объединяются в радиусе RADIUS_PX экранных пикселей.
+Каждый уровень разложен по сетке, поэтому запрос по bbox читает только видимые ячейки.
+'''
+import json
+import math
+
+MIN_ZOOM = 0
+MAX_ZOOM = 16
+RADIUS_PX = 60
+TILE_SIZE = 256
+
+# {'version': int, 'levels': {zoom: Level}}
+_index = {}
+
+
+def _project(lat: float, lng: float) -> tuple:
+    '''lat/lng -> x, y в [0, 1] (Web Mercator)'''
+    x = lng / 360 + 0.5
+    sin = math.sin(math.radians(max(min(lat, 85.05112878), -85.05112878)))
+    y = 0.5 - 0.25 * math.log((1 + sin) / (1 - sin)) / math.pi
+    return x, y
+
+
+def _unproject(x: float, y: float) -> tuple:
+    lng = (x - 0.5) * 360
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+    return lat, lng
+
+
+class Level:
+    '''Кластеры одного зума и сетка по ним с ячейкой в радиус кластеризации следующего уровня'''
+
+    def __init__(self, clusters: list, cell: float):
+        self.clusters = clusters
+        self.cell = cell
+        self.grid = {}
+        for i, c in enumerate(clusters):
+            self.grid.setdefault(self._key(c['x'], c['y']), []).append(i)
+
+    def _key(self, x: float, y: float) -> tuple:
+        return int(x // self.cell), int(y // self.cell)
+
+    def neighbours(self, x: float, y: float):
+        cx, cy = self._key(x, y)
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                yield from self.grid.get((gx, gy), ())
+
+    def within(self, x0: float, y0: float, x1: float, y1: float) -> list:
+        (cx0, cy0), (cx1, cy1) = self._key(x0, y0), self._key(x1, y1)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self.clusters):
+            candidates = range(len(self.clusters))
+        else:
+            candidates = (
+                i for gx in range(cx0, cx1 + 1) for gy in range(cy0, cy1 + 1)
+                for i in self.grid.get((gx, gy), ())
+            )
+        return [
+            self.clusters[i] for i in candidates
+            if x0 <= self.clusters[i]['x'] <= x1 and y0 <= self.clusters[i]['y'] <= y1
+        ]
+
+
+def _radius(zoom: int) -> float:
+    return RADIUS_PX / (TILE_SIZE * 2 ** zoom)
+
+
+def _merge_price(pick, a, b):
+    return b if a is None else a if b is None else pick(a, b)
+
+
+def _cluster_level(previous: Level, zoom: int) -> Level:
+    '''Кластеры зума zoom из уровня zoom + 1 (его сетка построена с ячейкой _radius(zoom))'''
+    r = _radius(zoom)
+    merged = [False] * len(previous.clusters)
+    clusters = []
+
+    for i, point in enumerate(previous.clusters):
+        if merged[i]:
+            continue
+        merged[i] = True
+        count = point['count']
+        wx, wy = point['x'] * count, point['y'] * count
+        price_min, price_max = point['price_min'], point['price_max']
+        members = [point]
+
+        for j in previous.neighbours(point['x'], point['y']):
+            other = previous.clusters[j]
+            if merged[j] or (other['x'] - point['x']) ** 2 + (other['y'] - point['y']) ** 2 > r * r:
+                continue
+            merged[j] = True
+            members.append(other)
+            count += other['count']
+            wx += other['x'] * other['count']
+            wy += other['y'] * other['count']
+            price_min = _merge_price(min, price_min, other['price_min'])
+            price_max = _merge_price(max, price_max, other['price_max'])
+
+        if len(members) == 1:
+            clusters.append(point)
+        else:
+            clusters.append({
+                'x': wx / count, 'y': wy / count, 'count': count,
+                'price_min': price_min, 'price_max': price_max
+            })
+
+    return Level(clusters, _radius(max(zoom - 1, MIN_ZOOM)))
+
+
+def build_index(listings: list) -> dict:
+    '''Уровни кластеров для всех зумов: MAX_ZOOM + 1 - отдельные объекты'''
+    points = []
+    for listing in listings:
+        if listing.get('lat') is None or listing.get('lng') is None:
+            continue
+        x, y = _project(float(listing['lat']), float(listing['lng']))
+        points.append({
+            'x': x, 'y': y, 'count': 1, 'id': listing['id'], 'type': listing.get('type'),
+            'price_min': listing.get('price'), 'price_max': listing.get('price')
+        })
+
+    levels = {MAX_ZOOM + 1: Level(points, _radius(MAX_ZOOM))}
+    for zoom in range(MAX_ZOOM, MIN_ZOOM - 1, -1):
+        levels[zoom] = _cluster_level(levels[zoom + 1], zoom)
+    return levels
+
+
+def get_levels(version: int, body: str) -> dict:
+    '''Иерархия кластеров для версии каталога; пересчёт только при смене версии'''
+    if _index.get('version') != version:
+        _index['levels'] = build_index(json.loads(body))
+        _index['version'] = version
+    return _index['levels']
+
+
+def parse_zoom(value: str) -> int:
+    try:
+        zoom = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('Параметр zoom должен быть целым числом')
+    return max(MIN_ZOOM, min(zoom, MAX_ZOOM + 1))
+
+
+def get_clusters(levels: dict, box: tuple, zoom: int) -> list:
+    '''Кластеры зума в bbox (west, south, east, north) -> [{lat, lng, count, price_min, price_max[, id, type]}]'''
+    west, south, east, north = box
+    x0, y1 = _project(south, west)
+    x1, y0 = _project(north, east)
+
+    result = []
+    for c in levels[zoom].within(x0, y0, x1, y1):
+        lat, lng = _unproject(c['x'], c['y'])
+        item = {
+            'lat': round(lat, 6), 'lng': round(lng, 6), 'count': c['count'],
+            'price_min': c['price_min'], 'price_max': c['price_max']
+        }
+        if c['count'] == 1 and 'id' in c:
+            item['id'] = c['id']
+            item['type'] = c['type']
+        result.append(item)
+    return result
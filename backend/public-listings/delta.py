@@ -0,0 +1,81 @@
+'''
+Дельта-синхронизация каталога: объекты, изменившиеся после версии клиента.
+
+Версия - xmin снимка транзакций на момент чтения. Всё, что закоммитится позже,
+получит catalog_txid >= этой версии, поэтому ничего не теряется; повторно
+присланные объекты клиент просто перезаписывает у себя.
+'''
+from datetime import datetime, timezone
+
+import catalog
+
+SCHEMA = catalog.SCHEMA
+
+# Если изменений больше - клиенту выгоднее скачать каталог целиком
+MAX_DELTA_SIZE = 1000
+
+
+def parse_since(value: str) -> tuple:
+    '''
+    since: версия (целое число) или дата ISO 8601 -> ('txid', int) | ('time', datetime в UTC).
+    Дата без смещения считается UTC; catalog_changed_at и deleted_at - TIMESTAMPTZ (V0050).
+    '''
+    value = (value or '').strip()
+    if value.isdigit():
+        return 'txid', int(value)
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError('Параметр since должен быть версией каталога или датой ISO 8601')
+    if moment.tzinfo is None:
+        return 'time', moment.replace(tzinfo=timezone.utc)
+    return 'time', moment.astimezone(timezone.utc)
+
+
+def fetch_changes(cur, since: tuple) -> dict:
+    '''
+    {version, changed, removed, full}
+    changed - опубликованные объекты (в формате каталога) с изменениями после since,
+    removed - id объектов, снятых с публикации (архив, отклонение) или удалённых.
+    full = True - изменений слишком много, нужно загрузить каталог заново.
+    '''
+    cur.execute("SELECT txid_snapshot_xmin(txid_current_snapshot()) AS version")
+    version = cur.fetchone()['version']
+
+    kind, value = since
+    column = 'catalog_txid' if kind == 'txid' else 'catalog_changed_at'
+    tombstone_column = 'catalog_txid' if kind == 'txid' else 'deleted_at'
+
+    cur.execute(
+        f"""SELECT l.id, ({catalog.PUBLIC_WHERE}) AS is_public
+            FROM {SCHEMA}.listings l
+            WHERE l.{column} >= %s
+            LIMIT %s""",
+        (value, MAX_DELTA_SIZE + 1)
+    )
+    touched = cur.fetchall()
+    if len(touched) > MAX_DELTA_SIZE:
+        return {'version': version, 'changed': [], 'removed': [], 'full': True}
+
+    public_ids = [row['id'] for row in touched if row['is_public']]
+    removed = [row['id'] for row in touched if not row['is_public']]
+
+    cur.execute(
+        f"""SELECT listing_id FROM {SCHEMA}.listing_tombstones t
+            WHERE t.{tombstone_column} >= %s""",
+        (value,)
+    )
+    removed.extend(row['listing_id'] for row in cur.fetchall())
+
+    changed = []
+    if public_ids:
+        cur.execute(
+            f"""SELECT {catalog.LISTING_COLUMNS}
+                FROM {SCHEMA}.listings l
+                WHERE l.id = ANY(%s)
+                ORDER BY l.city ASC, {catalog.AUCTION_KEY} ASC, l.id ASC""",
+            (public_ids,)
+        )
+        changed = catalog.attach_rooms_and_metro(cur, [dict(row) for row in cur.fetchall()])
+
+    return {'version': version, 'changed': changed, 'removed': sorted(set(removed)), 'full': False}
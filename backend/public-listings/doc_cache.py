@@ -0,0 +1,28 @@
+'''
+LRU-кэш готовых JSON-документов в памяти инстанса.
+Запись годна, пока её версия совпадает с версией, прочитанной из БД.
+'''
+from collections import OrderedDict
+
+
+class VersionedCache:
+    def __init__(self, size: int):
+        self.size = size
+        # key -> {'version': int, 'body': str}
+        self._entries = OrderedDict()
+
+    def get(self, key, version):
+        entry = self._entries.get(key)
+        if entry and entry['version'] == version:
+            self._entries.move_to_end(key)
+            return entry['body']
+        return None
+
+    def put(self, key, version, body: str):
+        self._entries[key] = {'version': version, 'body': body}
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def discard(self, key):
+        self._entries.pop(key, None)
@@ -0,0 +1,137 @@
+'''
+Фасеты каталога для фильтров: число объектов по городам, типам, парковке
+и корзинам цены - одним проходом GROUPING SETS.
+
+Счётчик каждого фасета учитывает все фильтры, кроме своего (count FILTER по
+остальным условиям): выбрав Москву, пользователь всё ещё видит, сколько объектов
+в других городах. Результат кэшируется в памяти по ключу фильтров и версии каталога.
+'''
+import json
+
+import catalog
+from doc_cache import VersionedCache
+
+SCHEMA = catalog.SCHEMA
+CACHE_SIZE = 200
+
+# Границы корзин гистограммы цен: [0, 1000), [1000, 1500), ..., [10000, ∞)
+PRICE_EDGES = [1000, 1500, 2000, 2500, 3000, 4000, 5000, 7000, 10000]
+
+FACETS = ('city', 'type', 'parking', 'price')
+
+_cache = VersionedCache(CACHE_SIZE)
+
+
+def cache_key(filters: dict) -> str:
+    return json.dumps(filters, sort_keys=True, ensure_ascii=False)
+
+
+def _conditions(filters: dict) -> dict:
+    '''Условия фасетных фильтров: фасет -> (sql, args)'''
+    conditions = {}
+    if 'city' in filters:
+        conditions['city'] = ('l.city = %s', [filters['city']])
+    if 'type' in filters:
+        conditions['type'] = ('l.type = %s', [filters['type']])
+    if filters.get('parking'):
+        conditions['parking'] = ('l.has_parking = true', [])
+    price_sql, price_args = [], []
+    if 'price_min' in filters:
+        price_sql.append('l.price >= %s')
+        price_args.append(filters['price_min'])
+    if 'price_max' in filters:
+        price_sql.append('l.price <= %s')
+        price_args.append(filters['price_max'])
+    if price_sql:
+        conditions['price'] = (' AND '.join(price_sql), price_args)
+    return conditions
+
+
+def _filter_except(conditions: dict, facet: str = None) -> tuple:
+    '''FILTER по условиям всех фасетов, кроме facet -> (sql, args); без условий - пустая строка'''
+    parts = [(sql, args) for name, (sql, args) in conditions.items() if name != facet]
+    if not parts:
+        return '', []
+    return (
+        ' FILTER (WHERE ' + ' AND '.join(f'({sql})' for sql, _ in parts) + ')',
+        [arg for _, args in parts for arg in args]
+    )
+
+
+def _bucket_label(bucket: int) -> dict:
+    '''Корзина width_bucket: 0 - ниже первой границы, len(PRICE_EDGES) - от последней и выше'''
+    return {
+        'from': PRICE_EDGES[bucket - 1] if bucket >= 1 else 0,
+        'to': PRICE_EDGES[bucket] if bucket < len(PRICE_EDGES) else None,
+    }
+
+
+def compute(cur, filters: dict) -> dict:
+    '''{total, city, type, parking, price: {min, max, histogram}} для состояния фильтров'''
+    conditions = _conditions(filters)
+    base_filters = {k: v for k, v in filters.items() if k in ('max_hours', 'q', 'amenities')}
+    where, where_args = catalog.build_where(base_filters)
+
+    select_args = []
+    counts = []
+    for facet in FACETS + (None,):
+        clause, args = _filter_except(conditions, facet)
+        counts.append(f'count(*){clause} AS n_{facet or "all"}')
+        select_args.extend(args)
+
+    # Диапазон цен для слайдера - по всем фильтрам, кроме ценового
+    price_clause, price_args = _filter_except(conditions, 'price')
+    select_args.extend(price_args + price_args)
+
+    cur.execute(
+        f"""SELECT l.city, l.type, l.has_parking,
+                   width_bucket(l.price, %s::int[]) AS price_bucket,
+                   GROUPING(l.city) AS g_city, GROUPING(l.type) AS g_type,
+                   GROUPING(l.has_parking) AS g_parking,
+                   GROUPING(width_bucket(l.price, %s::int[])) AS g_price,
+                   {', '.join(counts)},
+                   min(l.price){price_clause} AS price_min,
+                   max(l.price){price_clause} AS price_max
+            FROM {SCHEMA}.listings l
+            WHERE {where}
+            GROUP BY GROUPING SETS (
+                (l.city), (l.type), (l.has_parking), (width_bucket(l.price, %s::int[])), ()
+            )""",
+        [PRICE_EDGES, PRICE_EDGES] + select_args + where_args + [PRICE_EDGES]
+    )
+
+    result = {'total': 0, 'city': [], 'type': [], 'parking': {'true': 0, 'false': 0}, 'price': {'min': None, 'max': None}}
+    histogram = {}
+    for row in cur.fetchall():
+        if not row['g_city']:
+            if row['city'] and row['n_city']:
+                result['city'].append({'value': row['city'], 'count': row['n_city']})
+        elif not row['g_type']:
+            if row['type'] and row['n_type']:
+                result['type'].append({'value': row['type'], 'count': row['n_type']})
+        elif not row['g_parking']:
+            result['parking']['true' if row['has_parking'] else 'false'] += row['n_parking']
+        elif not row['g_price']:
+            if row['price_bucket'] is not None and row['n_price']:
+                histogram[row['price_bucket']] = row['n_price']
+        else:
+            result['total'] = row['n_all']
+            result['price'] = {'min': row['price_min'], 'max': row['price_max']}
+
+    result['city'].sort(key=lambda item: (-item['count'], item['value']))
+    result['type'].sort(key=lambda item: (-item['count'], item['value']))
+    result['price']['histogram'] = [
+        {**_bucket_label(bucket), 'count': histogram.get(bucket, 0)}
+        for bucket in range(0, len(PRICE_EDGES) + 1)
+    ]
+    return result
+
+
+def get_facets(cur, filters: dict, version: int) -> str:
+    '''JSON фасетов из кэша (если версия каталога не менялась) или посчитанный заново'''
+    key = cache_key(filters)
+    body = _cache.get(key, version)
+    if body is None:
+        body = json.dumps(compute(cur, filters), default=str)
+        _cache.put(key, version, body)
+    return body
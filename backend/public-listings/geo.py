@@ -0,0 +1,107 @@
+'''
+Геозапросы для карты: объекты в прямоугольнике экрана или в радиусе от точки.
+
+Поиск идёт по GiST-индексу на point(lng, lat) опубликованных объектов,
+отдаётся только то, что нужно маркеру: id, title, lat, lng, price, type.
+'''
+import math
+
+import catalog
+
+SCHEMA = catalog.SCHEMA
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+MAX_RADIUS_KM = 200
+MAX_GEO_RESULTS = 2000
+
+GEO_PARAMS = ('bbox', 'radius_km')
+
+GEO_COLUMNS = 'l.id, l.title, l.lat::float8 AS lat, l.lng::float8 AS lng, l.price, l.type'
+
+# Выражение должно совпадать с выражением индекса idx_listings_public_geo
+GEO_POINT = 'point(l.lng::float8, l.lat::float8)'
+
+
+def _parse_float(params: dict, name: str) -> float:
+    try:
+        value = float(params.get(name))
+    except (TypeError, ValueError):
+        raise ValueError(f'Параметр {name} должен быть числом')
+    if not math.isfinite(value):
+        raise ValueError(f'Параметр {name} должен быть числом')
+    return value
+
+
+def _check_point(lat: float, lng: float):
+    if not -90 <= lat <= 90 or not -180 <= lng <= 180:
+        raise ValueError('Координаты вне допустимого диапазона')
+
+
+def parse_geo(params: dict) -> dict:
+    '''
+    bbox=west,south,east,north (порядок GeoJSON) или lat=&lng=&radius_km=
+    -> {'box': (west, south, east, north), 'center': (lat, lng) | None, 'radius_km': float | None}
+    '''
+    if params.get('bbox'):
+        try:
+            west, south, east, north = [float(part) for part in params['bbox'].split(',')]
+        except ValueError:
+            raise ValueError('bbox должен быть в формате west,south,east,north')
+        if not all(math.isfinite(v) for v in (west, south, east, north)):
+            raise ValueError('bbox должен быть в формате west,south,east,north')
+        _check_point(south, west)
+        _check_point(north, east)
+        if west > east or south > north:
+            raise ValueError('bbox: west должен быть не больше east, south - не больше north')
+        return {'box': (west, south, east, north), 'center': None, 'radius_km': None}
+
+    lat = _parse_float(params, 'lat')
+    lng = _parse_float(params, 'lng')
+    radius_km = _parse_float(params, 'radius_km')
+    _check_point(lat, lng)
+    if not 0 < radius_km <= MAX_RADIUS_KM:
+        raise ValueError(f'radius_km должен быть от 0 до {MAX_RADIUS_KM}')
+
+    # Описанный вокруг круга прямоугольник - для индекса, точное расстояние считаем ниже
+    dlat = radius_km / KM_PER_DEGREE
+    dlng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+    box = (max(lng - dlng, -180), max(lat - dlat, -90), min(lng + dlng, 180), min(lat + dlat, 90))
+    return {'box': box, 'center': (lat, lng), 'radius_km': radius_km}
+
+
+def distance_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    '''Расстояние по большому кругу (haversine)'''
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def fetch_markers(cur, geo: dict, filters: dict) -> dict:
+    '''Маркеры в области -> {listings, truncated}; фильтры каталога применяются как обычно'''
+    where, args = catalog.build_where(filters)
+    west, south, east, north = geo['box']
+
+    cur.execute(
+        f"""SELECT {GEO_COLUMNS}
+            FROM {SCHEMA}.listings l
+            WHERE {where}
+              AND l.lat IS NOT NULL AND l.lng IS NOT NULL
+              AND {GEO_POINT} <@ box(point(%s, %s), point(%s, %s))
+            LIMIT %s""",
+        args + [west, south, east, north, MAX_GEO_RESULTS + 1]
+    )
+    rows = [dict(row) for row in cur.fetchall()]
+    truncated = len(rows) > MAX_GEO_RESULTS
+    rows = rows[:MAX_GEO_RESULTS]
+
+    if geo['center']:
+        lat, lng = geo['center']
+        for row in rows:
+            row['distance_km'] = round(distance_km(lat, lng, row['lat'], row['lng']), 3)
+        rows = [row for row in rows if row['distance_km'] <= geo['radius_km']]
+        rows.sort(key=lambda row: row['distance_km'])
+
+    return {'listings': rows, 'truncated': truncated}
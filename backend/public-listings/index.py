@@ -1,28 +1,107 @@
 import json
 import os
-import psycopg2
+import db
+import catalog
+import snapshots
+import delta
+import rooms
+import listing_details
+import geo
+import clusters
+import search
+import suggest
+import facets
 from psycopg2.extras import RealDictCursor
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
 
-def get_room_details(listing_id: str, room_index: str) -> dict:
-    '''Получить детали конкретного номера с фотографиями'''
+# Политики кэширования по типам ответов
+CACHE_CATALOG = 'public, max-age=60, stale-while-revalidate=300, stale-if-error=86400'
+CACHE_CATALOG_PAGE = 'public, max-age=30, stale-while-revalidate=120'
+CACHE_ROOM = 'public, max-age=300, stale-while-revalidate=3600'
+CACHE_LISTING = 'public, max-age=120, stale-while-revalidate=3600'
+CACHE_DELTA = 'public, max-age=15'
+CACHE_MAP = 'public, max-age=60, stale-while-revalidate=300'
+CACHE_SUGGEST = 'public, max-age=60, stale-while-revalidate=600'
+
+def get_header(event: dict, name: str) -> str:
+    '''Заголовок запроса без учёта регистра'''
+    headers = event.get('headers') or {}
+    lowered = name.lower()
+    for key, value in headers.items():
+        if key.lower() == lowered:
+            return value
+    return None
+
+def client_etags(event: dict) -> list:
+    '''Список ETag из If-None-Match (слабые W/ сравниваем как сильные)'''
+    if_none_match = get_header(event, 'If-None-Match')
+    if not if_none_match:
+        return []
+    return [tag.strip().replace('W/', '', 1) for tag in if_none_match.split(',') if tag.strip()]
+
+def cache_headers(cache_control: str, version: int, updated_at) -> dict:
+    '''CORS + Cache-Control + ETag / Last-Modified по версии каталога'''
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag, Last-Modified',
+        'Cache-Control': cache_control,
+        'ETag': snapshots.make_etag(version)
+    }
+    if updated_at:
+        headers['Last-Modified'] = format_datetime(updated_at.replace(tzinfo=timezone.utc), usegmt=True)
+    return headers
+
+def is_not_modified(event: dict, headers: dict) -> bool:
+    '''Проверка If-None-Match (приоритетно) или If-Modified-Since'''
+    candidates = client_etags(event)
+    if candidates:
+        return '*' in candidates or headers['ETag'] in candidates
+    
+    if_modified_since = get_header(event, 'If-Modified-Since')
+    if if_modified_since and 'Last-Modified' in headers:
+        try:
+            return parsedate_to_datetime(headers['Last-Modified']) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def not_modified(headers: dict) -> dict:
+    return {
+        'statusCode': 304,
+        'headers': headers,
+        'body': '',
+        'isBase64Encoded': False
+    }
+
+def get_room_details(event: dict, room_id: str = None, listing_id: str = None, room_index: str = None) -> dict:
+    '''Детали номера с фотографиями: по room_id или по listing_id + room_index (совместимость)'''
+    try:
+        room_id = int(room_id) if room_id is not None else None
+        listing_id = int(listing_id) if listing_id is not None else None
+        room_index = int(room_index) if room_index is not None else None
+        if room_index is not None and room_index < 0:
+            raise ValueError
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'room_id, listing_id и room_index должны быть целыми числами'}),
+            'isBase64Encoded': False
+        }
+    
+    conn = None
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        conn = db.connect()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
-        # Получаем все комнаты для этого объекта
-        cur.execute(
-            """SELECT type, price, square_meters, min_hours, features, images, description
-               FROM t_p39732784_hourly_rentals_platf.rooms 
-               WHERE listing_id = %s
-               ORDER BY id""",
-            (listing_id,)
-        )
-        rooms = cur.fetchall()
+        resolved = rooms.resolve_room(cur, room_id=room_id, listing_id=listing_id, room_index=room_index)
+        body = rooms.get_room_body(cur, *resolved) if resolved else None
         
         cur.close()
         conn.close()
         
-        if not rooms or int(room_index) >= len(rooms):
+        if body is None:
             return {
                 'statusCode': 404,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -30,16 +109,332 @@ def get_room_details(listing_id: str, room_index: str) -> dict:
                 'isBase64Encoded': False
             }
         
-        room = dict(rooms[int(room_index)])
+        headers = {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'ETag',
+            'Cache-Control': CACHE_ROOM,
+            'ETag': rooms.make_etag(*resolved)
+        }
+        if headers['ETag'] in client_etags(event):
+            return not_modified(headers)
+        
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', **headers},
+            'body': body,
+            'isBase64Encoded': False
+        }
+        
+    except Exception as e:
+        if conn:
+            conn.close()
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+
+def get_listing(event: dict, listing_id: str) -> dict:
+    '''Карточка опубликованного объекта: комнаты с фотографиями и метро'''
+    try:
+        listing_id = int(listing_id)
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'id должен быть целым числом'}),
+            'isBase64Encoded': False
+        }
+    
+    conn = None
+    try:
+        conn = db.connect()
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        
+        version = listing_details.listing_version(cur, listing_id)
+        headers = {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'ETag',
+            'Cache-Control': CACHE_LISTING,
+            'ETag': listing_details.make_etag(listing_id, version)
+        }
+        
+        # Совпавший ETag - 304 без чтения комнат и метро
+        if version is not None and headers['ETag'] in client_etags(event):
+            cur.close()
+            conn.close()
+            return not_modified(headers)
+        
+        body = listing_details.get_listing_body(cur, listing_id, version) if version is not None else None
+        
+        cur.close()
+        conn.close()
+        
+        if body is None:
+            return {
+                'statusCode': 404,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Объект не найден'}),
+                'isBase64Encoded': False
+            }
         
         return {
             'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', **headers},
+            'body': body,
+            'isBase64Encoded': False
+        }
+        
+    except Exception as e:
+        if conn:
+            conn.close()
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+
+def get_map_markers(event: dict, params: dict) -> dict:
+    '''Маркеры карты в bbox или радиусе: {listings: [{id, title, lat, lng, price, type}], truncated}'''
+    try:
+        area = geo.parse_geo(params)
+        filters = catalog.parse_filters(params)
+    except ValueError as e:
+        return {
+            'statusCode': 400,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps(room, default=str),
+            'body': json.dumps({'error': str(e)}),
             'isBase64Encoded': False
         }
+    
+    conn = None
+    try:
+        conn = db.connect()
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        
+        version, updated_at = snapshots.catalog_version(cur, filters.get('city'))
+        headers = cache_headers(CACHE_MAP, version, updated_at)
+        if is_not_modified(event, headers):
+            cur.close()
+            conn.close()
+            return not_modified(headers)
+        
+        result = geo.fetch_markers(cur, area, filters)
         
+        cur.close()
+        conn.close()
+        
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', **headers},
+            'body': json.dumps(result, default=str),
+            'isBase64Encoded': False
+        }
     except Exception as e:
+        if conn:
+            conn.close()
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+
+def get_map_clusters(event: dict, params: dict) -> dict:
+    '''Кластеры карты для bbox и zoom из предрассчитанной по снимку каталога иерархии'''
+    try:
+        if not params.get('bbox'):
+            raise ValueError('Для кластеров нужен bbox=west,south,east,north')
+        area = geo.parse_geo(params)
+        zoom = clusters.parse_zoom(params.get('zoom'))
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    
+    try:
+        snapshot = snapshots.get_catalog(etags=client_etags(event))
+        headers = cache_headers(CACHE_MAP, snapshot['version'], snapshot['updated_at'])
+        if snapshot['body'] is None:
+            return not_modified(headers)
+        
+        levels = clusters.get_levels(snapshot['version'], snapshot['body'])
+        result = {'zoom': zoom, 'clusters': clusters.get_clusters(levels, area['box'], zoom)}
+        
+        if snapshot['stale']:
+            headers['Warning'] = '110 - "Response is Stale"'
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', **headers},
+            'body': json.dumps(result, default=str),
+            'isBase64Encoded': False
+        }
+    except Exception as e:
+        return {
+            'statusCode': 503 if isinstance(e, snapshots.SnapshotUnavailable) else 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+
+def search_listings(params: dict) -> dict:
+    '''Поиск с учётом опечаток: страница {listings, next_cursor, has_more} по релевантности'''
+    try:
+        text = search.parse_query(params.get('search'))
+        filters = catalog.parse_filters(params)
+        limit = catalog.parse_page_size(params)
+        offset, version = search.decode_offset(params['cursor']) if params.get('cursor') else (0, None)
+        projection = catalog.PROJECTIONS.resolve(params, catalog.DEFAULT_PROFILE)
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    
+    try:
+        result = search.find(text, filters, projection, offset=offset, limit=limit, version=version)
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Cache-Control': CACHE_CATALOG_PAGE},
+            'body': json.dumps(result, default=str),
+            'isBase64Encoded': False
+        }
+    except search.StaleCursor as e:
+        return {
+            'statusCode': 409,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    except Exception as e:
+        return {
+            'statusCode': 503 if isinstance(e, snapshots.SnapshotUnavailable) else 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+
+def get_suggestions(params: dict) -> dict:
+    '''Автодополнение городов, районов и метро: {suggestions: [{kind, name, city, count}]}'''
+    try:
+        request = suggest.parse_request(params)
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    
+    conn = None
+    try:
+        conn = db.connect()
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        suggest.refresh(cur)
+        cur.close()
+        conn.close()
+    except Exception as e:
+        if conn:
+            conn.close()
+        # Словарь уже загружен - отвечаем по нему, пока БД недоступна
+        if not suggest.is_loaded():
+            return {
+                'statusCode': 500,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': str(e)}),
+                'isBase64Encoded': False
+            }
+        print(f'[SUGGEST] Refresh failed, serving previous dictionary: {e}')
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Cache-Control': CACHE_SUGGEST},
+        'body': json.dumps({'suggestions': suggest.suggest(**request)}),
+        'isBase64Encoded': False
+    }
+
+def get_facets(event: dict, params: dict) -> dict:
+    '''Фасеты фильтров: {total, city, type, parking, price: {min, max, histogram}}'''
+    try:
+        filters = catalog.parse_filters(params)
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    
+    conn = None
+    try:
+        conn = db.connect()
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        
+        # Фасеты по городам охватывают весь каталог - версия по всем городам
+        version, updated_at = snapshots.catalog_version(cur)
+        headers = cache_headers(CACHE_CATALOG, version, updated_at)
+        if is_not_modified(event, headers):
+            cur.close()
+            conn.close()
+            return not_modified(headers)
+        
+        body = facets.get_facets(cur, filters, version)
+        
+        cur.close()
+        conn.close()
+        
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', **headers},
+            'body': body,
+            'isBase64Encoded': False
+        }
+    except Exception as e:
+        if conn:
+            conn.close()
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+
+def get_catalog_changes(since_param: str) -> dict:
+    '''Изменения каталога после since: {version, changed, removed, full}'''
+    try:
+        since = delta.parse_since(since_param)
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    
+    conn = None
+    try:
+        conn = db.connect()
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        result = delta.fetch_changes(cur, since)
+        cur.close()
+        conn.close()
+        
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Cache-Control': CACHE_DELTA},
+            'body': json.dumps(result, default=str),
+            'isBase64Encoded': False
+        }
+    except Exception as e:
+        if conn:
+            conn.close()
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -48,7 +443,20 @@ def get_room_details(listing_id: str, room_index: str) -> dict:
         }
 
 def handler(event: dict, context) -> dict:
-    '''Публичный API для получения списка активных объектов и деталей номеров'''
+    '''
+    Публичный API для получения списка активных объектов и деталей номеров.
+    GET ?city=&type=&parking=true&max_hours=&price_min=&price_max=&q=&amenities=Wi-Fi,Сейф - фильтры каталога
+    GET ...&limit=&cursor= - постраничная выдача {listings, next_cursor, has_more}
+    GET ...&profile=card|map|full или &fields=id,title,rooms - только нужные поля и связи
+    GET ?search=&limit=&cursor= - поиск по названию, городу, району и метро (с опечатками)
+    GET ?suggest=<префикс>&kind=city|district|metro&city= - автодополнение
+    GET ?facets=1&<фильтры> - счётчики по городам, типам, парковке и гистограмма цен
+    GET ?since=<версия или дата> - изменения каталога {version, changed, removed, full}
+    GET ?bbox=west,south,east,north или ?lat=&lng=&radius_km= - маркеры карты (+ фильтры каталога)
+    GET ?bbox=...&zoom= - кластеры маркеров {zoom, clusters: [{lat, lng, count, price_min, price_max}]}
+    GET ?id= - карточка объекта с комнатами, фотографиями и метро
+    GET ?room_id= - детали номера (GET ?listing_id=&room_index= - прежний вариант)
+    '''
     method = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
@@ -57,7 +465,7 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match, If-Modified-Since'
             },
             'body': '',
             'isBase64Encoded': False
@@ -71,104 +479,117 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     
-    # Получение деталей конкретного номера
     params = event.get('queryStringParameters', {}) or {}
     listing_id = params.get('listing_id')
     room_index = params.get('room_index')
     
+    # Карточка одного объекта
+    if params.get('id'):
+        return get_listing(event, params['id'])
+    
+    # Получение деталей конкретного номера
+    if params.get('room_id'):
+        return get_room_details(event, room_id=params['room_id'])
+    
     if listing_id and room_index is not None:
-        return get_room_details(listing_id, room_index)
+        return get_room_details(event, listing_id=listing_id, room_index=room_index)
+    
+    # Карта: кластеры для зума
+    if params.get('zoom'):
+        return get_map_clusters(event, params)
+    
+    # Карта: только объекты в видимой области, минимальный набор полей
+    if any(params.get(name) for name in geo.GEO_PARAMS):
+        return get_map_markers(event, params)
     
+    # Дельта-синхронизация: только изменения после версии клиента
+    if params.get('since'):
+        return get_catalog_changes(params['since'])
+    
+    # Фасеты для фильтров без загрузки самих объектов
+    if params.get('facets') in ('true', '1'):
+        return get_facets(event, params)
+    
+    # Автодополнение для строки поиска
+    if params.get('suggest') is not None:
+        return get_suggestions(params)
+    
+    # Поиск: ранжированная постраничная выдача
+    if params.get('search') is not None:
+        return search_listings(params)
+    
+    conn = None
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Получаем все активные объекты одним запросом (БЕЗ тяжелых полей features, image_url оптимизируем)
-        cur.execute("""
-            SELECT 
-                l.id, l.title, l.type, l.city, l.district, l.price, l.rating, l.reviews, 
-                l.auction, 
-                CASE 
-                    WHEN l.image_url LIKE '[%' THEN (l.image_url::json->>0)
-                    ELSE l.image_url
-                END as image_url,
-                l.logo_url, l.metro, l.metro_walk as "metroWalk", 
-                l.has_parking as "hasParking", l.parking_type, l.parking_price_per_hour,
-                l.lat, l.lng, 
-                l.min_hours as "minHours", l.phone, l.telegram,
-                l.price_warning_holidays, l.price_warning_daytime
-            FROM t_p39732784_hourly_rentals_platf.listings l
-            WHERE l.is_archived = false 
-            AND (l.moderation_status IS NULL OR l.moderation_status = 'approved')
-            ORDER BY l.city ASC, l.auction ASC, l.id ASC
-        """)
-        listings = cur.fetchall()
-        
-        if not listings:
-            cur.close()
-            conn.close()
+        filters = catalog.parse_filters(params)
+        paginated = any(params.get(name) for name in catalog.PAGINATION_PARAMS)
+        limit = catalog.parse_page_size(params) if paginated else None
+        after = catalog.decode_cursor(params['cursor']) if params.get('cursor') else None
+        projection = catalog.PROJECTIONS.resolve(params, catalog.DEFAULT_PROFILE)
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
+    
+    # Снимки хранят полный профиль; fields= / profile= с другим набором полей идут в БД
+    full_shape = not params.get('fields') and params.get('profile', catalog.DEFAULT_PROFILE) in ('', catalog.DEFAULT_PROFILE)
+    
+    # Каталог города или всех городов без дополнительных фильтров - готовый снимок
+    if not paginated and set(filters) <= {'city'} and full_shape:
+        try:
+            snapshot = snapshots.get_catalog(filters.get('city'), etags=client_etags(event))
+        except Exception as e:
             return {
-                'statusCode': 200,
+                'statusCode': 503 if isinstance(e, snapshots.SnapshotUnavailable) else 500,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps([]),
+                'body': json.dumps({'error': str(e)}),
                 'isBase64Encoded': False
             }
         
-        # Получаем все комнаты одним запросом (БЕЗ images и description для оптимизации)
-        listing_ids = [l['id'] for l in listings]
-        placeholders = ','.join(['%s'] * len(listing_ids))
-        cur.execute(
-            f"""SELECT listing_id, type, price, square_meters, min_hours, features
-                FROM t_p39732784_hourly_rentals_platf.rooms 
-                WHERE listing_id IN ({placeholders})""",
-            listing_ids
-        )
-        all_rooms = cur.fetchall()
-        
-        # Получаем все станции метро одним запросом
-        cur.execute(
-            f"""SELECT listing_id, station_name, walk_minutes 
-                FROM t_p39732784_hourly_rentals_platf.metro_stations 
-                WHERE listing_id IN ({placeholders})""",
-            listing_ids
-        )
-        all_metro = cur.fetchall()
-        
-        # Группируем по listing_id
-        rooms_by_listing = {}
-        for room in all_rooms:
-            room_dict = dict(room)
-            lid = room_dict.pop('listing_id')
-            if lid not in rooms_by_listing:
-                rooms_by_listing[lid] = []
-            rooms_by_listing[lid].append(room_dict)
-        
-        metro_by_listing = {}
-        for metro in all_metro:
-            metro_dict = dict(metro)
-            lid = metro_dict.pop('listing_id')
-            if lid not in metro_by_listing:
-                metro_by_listing[lid] = []
-            metro_by_listing[lid].append(metro_dict)
-        
-        # Присваиваем данные каждому объекту
-        result = []
-        for listing in listings:
-            listing_dict = dict(listing)
-            listing_dict['rooms'] = rooms_by_listing.get(listing_dict['id'], [])
-            listing_dict['metro_stations'] = metro_by_listing.get(listing_dict['id'], [])
-            result.append(listing_dict)
+        headers = cache_headers(CACHE_CATALOG, snapshot['version'], snapshot['updated_at'])
+        if snapshot['body'] is None or is_not_modified(event, headers):
+            return not_modified(headers)
+        if snapshot['stale']:
+            headers['Warning'] = '110 - "Response is Stale"'
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', **headers},
+            'body': snapshot['body'],
+            'isBase64Encoded': False
+        }
+    
+    try:
+        conn = db.connect()
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        
+        # Версия каталога читается до выборки: 304 без обращения к listings / rooms / metro
+        version, updated_at = snapshots.catalog_version(cur, filters.get('city'))
+        headers = cache_headers(CACHE_CATALOG_PAGE if paginated else CACHE_CATALOG, version, updated_at)
+        if is_not_modified(event, headers):
+            cur.close()
+            conn.close()
+            return not_modified(headers)
+        
+        if paginated:
+            # Страница каталога: фильтры + keyset-пагинация по (city, auction_rank, id),
+            # комнаты и метро подгружаются только для объектов этой страницы
+            result = catalog.fetch_page(cur, filters, after=after, limit=limit, projection=projection)
+        else:
+            # Без limit/cursor - прежний формат: массив всех подходящих объектов
+            result = catalog.fetch_projected(cur, filters, projection)
         
         cur.close()
         conn.close()
         
         return {
             'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'headers': {'Content-Type': 'application/json', **headers},
             'body': json.dumps(result, default=str),
             'isBase64Encoded': False
         }
-        
+    
     except Exception as e:
         if conn:
             conn.close()
@@ -177,4 +598,4 @@ def handler(event: dict, context) -> dict:
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': str(e)}),
             'isBase64Encoded': False
-        }
\ No newline at end of file
+        }
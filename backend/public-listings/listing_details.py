@@ -0,0 +1,115 @@
+'''
+Карточка одного опубликованного объекта: объект, комнаты с фотографиями и метро.
+Фотографии с размерами и вариантами thumb/card/full берутся из listing_photos в порядке position.
+
+Документы кэшируются в памяти инстанса по id объекта и сверяются с listings.catalog_txid,
+который триггеры меняют при любой записи в объект, его комнаты или метро.
+Повторный запрос карточки - одно чтение listings по первичному ключу.
+'''
+import json
+
+import catalog
+from doc_cache import VersionedCache
+
+SCHEMA = catalog.SCHEMA
+CACHE_SIZE = 300
+
+DETAIL_COLUMNS = """
+    l.id, l.title, l.short_title, l.type, l.city, l.district, l.description,
+    l.price, l.rating, l.reviews, l.image_url, l.logo_url,
+    l.metro, l.metro_walk as "metroWalk",
+    l.has_parking as "hasParking", l.parking_type, l.parking_price_per_hour,
+    l.lat, l.lng, l.features, l.square_meters,
+    l.min_hours as "minHours", l.phone, l.telegram,
+    l.price_warning_holidays, l.price_warning_daytime
+"""
+
+ROOM_COLUMNS = """
+    id, type, price, description, square_meters, features, min_hours,
+    payment_methods, cancellation_policy, images
+"""
+
+PHOTO_COLUMNS = 'room_id, photo_url AS url, is_main, width, height, variants'
+
+_cache = VersionedCache(CACHE_SIZE)
+
+
+def make_etag(listing_id: int, version: int) -> str:
+    return f'"l{listing_id}-{version}"'
+
+
+def listing_version(cur, listing_id: int):
+    '''Версия опубликованного объекта или None, если объекта нет на сайте'''
+    cur.execute(
+        f"""SELECT l.catalog_txid AS version
+            FROM {SCHEMA}.listings l
+            WHERE l.id = %s AND {catalog.PUBLIC_WHERE}""",
+        (listing_id,)
+    )
+    row = cur.fetchone()
+    if not row:
+        _cache.discard(listing_id)
+        return None
+    return row['version']
+
+
+def build_listing(cur, listing_id: int) -> dict:
+    cur.execute(
+        f"""SELECT {DETAIL_COLUMNS}
+            FROM {SCHEMA}.listings l
+            WHERE l.id = %s AND {catalog.PUBLIC_WHERE}""",
+        (listing_id,)
+    )
+    row = cur.fetchone()
+    if not row:
+        return None
+    listing = dict(row)
+
+    cur.execute(
+        f"""SELECT {ROOM_COLUMNS}
+            FROM {SCHEMA}.rooms
+            WHERE listing_id = %s
+            ORDER BY id""",
+        (listing_id,)
+    )
+    listing['rooms'] = [dict(r) for r in cur.fetchall()]
+
+    cur.execute(
+        f"""SELECT {PHOTO_COLUMNS}
+            FROM {SCHEMA}.listing_photos
+            WHERE listing_id = %s
+            ORDER BY room_id NULLS FIRST, position, id""",
+        (listing_id,)
+    )
+    photos = {}
+    for photo in cur.fetchall():
+        photo = dict(photo)
+        photos.setdefault(photo.pop('room_id'), []).append(photo)
+    listing['photos'] = photos.get(None, [])
+    for room in listing['rooms']:
+        room['photos'] = photos.get(room['id'], [])
+
+    cur.execute(
+        f"""SELECT station_name, walk_minutes
+            FROM {SCHEMA}.metro_stations
+            WHERE listing_id = %s""",
+        (listing_id,)
+    )
+    listing['metro_stations'] = [dict(m) for m in cur.fetchall()]
+    return listing
+
+
+def get_listing_body(cur, listing_id: int, version: int) -> str:
+    '''JSON карточки из кэша или собранный заново (четыре запроса по listing_id)'''
+    body = _cache.get(listing_id, version)
+    if body is not None:
+        return body
+
+    listing = build_listing(cur, listing_id)
+    if listing is None:
+        _cache.discard(listing_id)
+        return None
+
+    body = json.dumps(listing, default=str)
+    _cache.put(listing_id, version, body)
+    return body
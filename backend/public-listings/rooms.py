@@ -0,0 +1,75 @@
+'''
+Детали номера по стабильному id с кэшем документов в памяти инстанса.
+
+Кэш проверяется по listings.catalog_txid: триггеры на rooms помечают им объект
+при любой записи в его комнаты, поэтому сверка - одно индексное чтение без images.
+Номер отдаётся, только если его объект опубликован (catalog.PUBLIC_WHERE): сверка идёт
+перед каждым чтением кэша, поэтому снятый с публикации объект сразу даёт 404.
+'''
+import json
+
+import catalog
+from doc_cache import VersionedCache
+
+SCHEMA = catalog.SCHEMA
+CACHE_SIZE = 500
+
+ROOM_COLUMNS = 'r.id, r.listing_id, r.type, r.price, r.square_meters, r.min_hours, r.features, r.images, r.description'
+
+_cache = VersionedCache(CACHE_SIZE)
+
+
+def make_etag(room_id: int, version: int) -> str:
+    return f'"r{room_id}-{version}"'
+
+
+def resolve_room(cur, room_id: int = None, listing_id: int = None, room_index: int = None) -> tuple:
+    '''
+    id номера и версия опубликованного объекта -> (room_id, version) или None.
+    room_index - совместимый псевдоним: порядковый номер комнаты объекта по id,
+    берётся из индекса (listing_id, id) без чтения самих строк.
+    '''
+    if room_id is not None:
+        cur.execute(
+            f"""SELECT r.id, l.catalog_txid AS version
+                FROM {SCHEMA}.rooms r
+                JOIN {SCHEMA}.listings l ON l.id = r.listing_id
+                WHERE r.id = %s AND {catalog.PUBLIC_WHERE}""",
+            (room_id,)
+        )
+    else:
+        cur.execute(
+            f"""SELECT r.id, l.catalog_txid AS version
+                FROM {SCHEMA}.listings l
+                CROSS JOIN LATERAL (
+                    SELECT id FROM {SCHEMA}.rooms
+                    WHERE listing_id = l.id
+                    ORDER BY id
+                    OFFSET %s LIMIT 1
+                ) r
+                WHERE l.id = %s AND {catalog.PUBLIC_WHERE}""",
+            (room_index, listing_id)
+        )
+    row = cur.fetchone()
+    if not row:
+        if room_id is not None:
+            _cache.discard(room_id)
+        return None
+    return row['id'], row['version']
+
+
+def get_room_body(cur, room_id: int, version: int) -> str:
+    '''JSON номера из кэша или из БД (одна строка rooms по первичному ключу)'''
+    body = _cache.get(room_id, version)
+    if body is not None:
+        return body
+
+    cur.execute(f"SELECT {ROOM_COLUMNS} FROM {SCHEMA}.rooms r WHERE r.id = %s", (room_id,))
+    row = cur.fetchone()
+    if not row:
+        _cache.discard(room_id)
+        return None
+
+    body = json.dumps(dict(row), default=str)
+    _cache.put(room_id, version, body)
+    return body
@@ -0,0 +1,229 @@
+'''
+Поиск объектов по названию, городу, району и метро с учётом опечаток.
+
+Основной путь - Postgres: полнотекстовый индекс по listings.search_text (морфология)
+плюс триграммы pg_trgm (опечатки), ранжирование ts_rank + word_similarity.
+Если pg_trgm не установлено или БД недоступна - инвертированный индекс в памяти
+по снимку каталога: токен -> объекты, опечатки через триграммы словаря.
+Курсор поиска в памяти привязан к версии снимка: после обновления каталога
+листать дальше нельзя (StaleCursor), поиск начинается заново.
+'''
+import base64
+import json
+import re
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+import db
+import catalog
+import snapshots
+
+SCHEMA = catalog.SCHEMA
+TS_CONFIG = 'russian'
+MIN_QUERY_LENGTH = 2
+MAX_QUERY_LENGTH = 100
+
+# Порог триграммного сходства для совпадения токена с опечаткой
+FUZZY_THRESHOLD = 0.4
+
+# Вес совпадения по полю для поиска в памяти - те же поля, что в search_text (V0053)
+FIELD_WEIGHTS = {'title': 3.0, 'short_title': 3.0, 'city': 2.0, 'district': 2.0, 'metro': 1.5, 'station_name': 1.5}
+
+TOKEN_RE = re.compile(r'\w+')
+
+_state = {'trigram': None}
+
+# {'version': int, 'index': MemoryIndex}
+_memory_index = {}
+
+
+class StaleCursor(Exception):
+    '''Курсор выдан по другой версии каталога'''
+
+
+def parse_query(value: str) -> str:
+    text = ' '.join((value or '').split())
+    if len(text) < MIN_QUERY_LENGTH:
+        raise ValueError(f'Поисковый запрос должен быть не короче {MIN_QUERY_LENGTH} символов')
+    return text[:MAX_QUERY_LENGTH]
+
+
+def encode_offset(offset: int, version: int = None) -> str:
+    raw = json.dumps({'o': offset, 'v': version})
+    return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii').rstrip('=')
+
+
+def decode_offset(cursor: str) -> tuple:
+    '''Курсор -> (смещение, версия снимка или None для поиска в Postgres)'''
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        offset = int(data['o'])
+        version = data.get('v')
+        if version is not None:
+            version = int(version)
+    except Exception:
+        raise ValueError('Некорректный cursor')
+    if offset < 0:
+        raise ValueError('Некорректный cursor')
+    return offset, version
+
+
+def _page(rows: list, offset: int, limit: int, version: int = None) -> dict:
+    has_more = len(rows) > limit
+    return {
+        'listings': rows[:limit],
+        'next_cursor': encode_offset(offset + limit, version) if has_more else None,
+        'has_more': has_more
+    }
+
+
+def trigram_available(cur) -> bool:
+    if _state['trigram'] is None:
+        cur.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') AS installed")
+        _state['trigram'] = cur.fetchone()['installed']
+    return _state['trigram']
+
+
+def _search_postgres(cur, text: str, filters: dict, projection, offset: int, limit: int) -> dict:
+    where, args = catalog.build_where(filters)
+    document = f"to_tsvector('{TS_CONFIG}', COALESCE(l.search_text, ''))"
+    query = f"plainto_tsquery('{TS_CONFIG}', %s)"
+    cur.execute(
+        f"""SELECT {projection.select()},
+                   ts_rank({document}, {query}) * 2
+                   + word_similarity(lower(%s), lower(l.search_text)) AS search_rank
+            FROM {SCHEMA}.listings l
+            WHERE {where}
+              AND ({document} @@ {query}
+                   OR lower(%s) <%% lower(l.search_text))
+            ORDER BY search_rank DESC, l.id ASC
+            OFFSET %s LIMIT %s""",
+        [text, text] + args + [text, text, offset, limit + 1]
+    )
+    rows = []
+    for row in cur.fetchall():
+        row = dict(row)
+        row.pop('search_rank')
+        rows.append(row)
+
+    result = _page(rows, offset, limit)
+    catalog.attach_rooms_and_metro(
+        cur, result['listings'], rooms=projection.wants('rooms'), metro=projection.wants('metro_stations')
+    )
+    return result
+
+
+def tokenize(text: str) -> list:
+    return TOKEN_RE.findall((text or '').lower().replace('ё', 'е'))
+
+
+def trigrams(token: str) -> set:
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class MemoryIndex:
+    '''Инвертированный индекс по объектам снимка каталога'''
+
+    def __init__(self, listings: list):
+        self.listings = {}
+        # token -> {listing_id: вес}
+        self.postings = {}
+        # trigram -> {token}
+        self.vocabulary = {}
+
+        for listing in listings:
+            self.listings[listing['id']] = listing
+            fields = [(listing.get(name), weight) for name, weight in FIELD_WEIGHTS.items() if name != 'station_name']
+            fields += [(m.get('station_name'), FIELD_WEIGHTS['station_name']) for m in listing.get('metro_stations') or []]
+            for value, weight in fields:
+                for token in tokenize(value):
+                    postings = self.postings.setdefault(token, {})
+                    postings[listing['id']] = max(postings.get(listing['id'], 0), weight)
+
+        for token in self.postings:
+            for gram in trigrams(token):
+                self.vocabulary.setdefault(gram, set()).add(token)
+
+    def _matches(self, query_token: str) -> dict:
+        '''Токены словаря, подходящие к токену запроса -> {token: качество совпадения}'''
+        grams = trigrams(query_token)
+        candidates = set()
+        for gram in grams:
+            candidates |= self.vocabulary.get(gram, set())
+
+        matches = {}
+        for token in candidates:
+            if token == query_token:
+                matches[token] = 1.0
+            elif token.startswith(query_token):
+                matches[token] = 0.8
+            else:
+                other = trigrams(token)
+                similarity = len(grams & other) / len(grams | other)
+                if similarity >= FUZZY_THRESHOLD:
+                    matches[token] = similarity * 0.7
+        return matches
+
+    def search(self, text: str) -> list:
+        '''id объектов, совпавших со всеми словами запроса, по убыванию релевантности'''
+        scores = None
+        for query_token in tokenize(text):
+            token_scores = {}
+            for token, quality in self._matches(query_token).items():
+                for listing_id, weight in self.postings[token].items():
+                    token_scores[listing_id] = max(token_scores.get(listing_id, 0), quality * weight)
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {lid: scores[lid] + s for lid, s in token_scores.items() if lid in scores}
+            if not scores:
+                return []
+        return sorted((scores or {}), key=lambda lid: (-scores[lid], lid))
+
+
+def _search_memory(text: str, filters: dict, projection, offset: int, limit: int, version: int = None) -> dict:
+    if 'amenities' in filters:
+        # Маски удобств в снимке нет - без БД фильтр не выполнить, отдавать лишнее нельзя
+        raise snapshots.SnapshotUnavailable('Фильтр по удобствам временно недоступен')
+    snapshot = snapshots.get_catalog()
+    if offset and version != snapshot['version']:
+        raise StaleCursor('Каталог обновился, начните поиск заново')
+    if _memory_index.get('version') != snapshot['version']:
+        _memory_index['index'] = MemoryIndex(json.loads(snapshot['body']))
+        _memory_index['version'] = snapshot['version']
+    index = _memory_index['index']
+
+    keys = set(projection.columns) | projection.relations
+    found = [index.listings[lid] for lid in index.search(text)]
+    found = [listing for listing in found if catalog.matches_filters(listing, filters)]
+    rows = [{k: v for k, v in listing.items() if k in keys} for listing in found[offset:offset + limit + 1]]
+    return _page(rows, offset, limit, snapshot['version'])
+
+
+def find(text: str, filters: dict, projection, offset: int = 0, limit: int = catalog.DEFAULT_PAGE_SIZE,
+         version: int = None) -> dict:
+    '''
+    Страница результатов поиска {listings, next_cursor, has_more}.
+    version - версия снимка из курсора (см. decode_offset).
+    '''
+    conn = None
+    try:
+        conn = db.connect()
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        if trigram_available(cur):
+            try:
+                return _search_postgres(cur, text, filters, projection, offset, limit)
+            except psycopg2.ProgrammingError as e:
+                # Расширение или индекс пропали - до перезапуска инстанса ищем в памяти
+                print(f'[SEARCH] Postgres search failed, switching to memory index: {e}')
+                conn.rollback()
+                _state['trigram'] = False
+    except (psycopg2.OperationalError, psycopg2.InterfaceError, db.PoolExhausted) as e:
+        print(f'[SEARCH] Database unavailable, searching snapshot in memory: {e}')
+    finally:
+        if conn:
+            conn.close()
+
+    return _search_memory(text, filters, projection, offset, limit, version)
@@ -0,0 +1,201 @@
+'''
+Снимки публичного каталога: готовый JSON по каждому городу в catalog_snapshots.
+
+Триггеры на listings / rooms / metro_stations увеличивают generation города,
+снимок пересобирается при первом чтении после изменения. Каталог "все города"
+склеивается из снимков городов (порядок city, auction_rank, id сохраняется).
+Последние удачные снимки держим в памяти инстанса и отдаём их, если Postgres недоступен.
+
+Версия каталога: для города - его generation, для всех городов - сумма generation.
+Обе величины только растут, из них строятся ETag и Last-Modified.
+'''
+import json
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+import db
+import catalog
+
+SCHEMA = catalog.SCHEMA
+ALL_CITIES = '*'
+
+# city -> {'generation': int, 'body': str, 'updated_at': datetime}
+# ALL_CITIES -> {'generation': int, 'body': str, 'updated_at': datetime}
+_memory = {}
+
+
+class SnapshotUnavailable(Exception):
+    '''Нет ни свежего снимка из БД, ни сохранённого в памяти'''
+
+
+def make_etag(version: int) -> str:
+    return f'"v{version}"'
+
+
+def _remember(city: str, generation: int, body: str, updated_at):
+    _memory[city] = {'generation': generation, 'body': body, 'updated_at': updated_at}
+
+
+def _snapshot(body, version: int, updated_at, is_stale: bool = False) -> dict:
+    return {'body': body, 'version': version, 'updated_at': updated_at, 'stale': is_stale}
+
+
+def build_city(cur, city: str) -> tuple:
+    '''Собрать снимок города теми же запросами, что и обычная выдача -> (body, count)'''
+    listings = catalog.attach_rooms_and_metro(cur, catalog.fetch_listings(cur, {'city': city}))
+    return json.dumps(listings, default=str), len(listings)
+
+
+def catalog_version(cur, city: str = None) -> tuple:
+    '''Текущая версия каталога города (или всех городов) -> (version, updated_at)'''
+    if city:
+        cur.execute(
+            f"SELECT generation AS version, updated_at FROM {SCHEMA}.catalog_snapshots WHERE city = %s",
+            (city,)
+        )
+    else:
+        cur.execute(
+            f"""SELECT COALESCE(SUM(generation), 0) AS version, MAX(updated_at) AS updated_at
+                FROM {SCHEMA}.catalog_snapshots"""
+        )
+    row = cur.fetchone()
+    return (row['version'], row['updated_at']) if row else (0, None)
+
+
+def _rebuild_city(conn, cur, row: dict) -> dict:
+    '''
+    Пересборка снимка. generation прочитан до сборки, поэтому изменения,
+    закоммиченные во время сборки, снова сделают снимок устаревшим.
+    Если снимок уже пересобирает другой инстанс - отдаём предыдущую версию.
+    '''
+    city = row['city']
+    cur.execute(
+        "SELECT pg_try_advisory_xact_lock(hashtext(%s)) AS locked",
+        (f'catalog_snapshot:{city}',)
+    )
+    if not cur.fetchone()['locked']:
+        known = _memory.get(city)
+        if known and known['generation'] == row['built_generation']:
+            return _snapshot(known['body'], row['built_generation'], row['updated_at'])
+        cur.execute(f"SELECT body FROM {SCHEMA}.catalog_snapshots WHERE city = %s", (city,))
+        stale_body = cur.fetchone()['body']
+        if stale_body is not None:
+            return _snapshot(stale_body, row['built_generation'], row['updated_at'])
+
+    body, count = build_city(cur, city)
+    cur.execute(
+        f"""UPDATE {SCHEMA}.catalog_snapshots
+            SET body = %s, built_generation = %s, listings_count = %s, built_at = CURRENT_TIMESTAMP
+            WHERE city = %s AND built_generation < %s""",
+        (body, row['generation'], count, city, row['generation'])
+    )
+    conn.commit()
+    _remember(city, row['generation'], body, row['updated_at'])
+    return _snapshot(body, row['generation'], row['updated_at'])
+
+
+def _city_snapshot(conn, cur, row: dict, body: str = None) -> dict:
+    '''Снимок по строке catalog_snapshots; body догружается, только если его нет в памяти'''
+    city = row['city']
+    if row['generation'] != row['built_generation']:
+        return _rebuild_city(conn, cur, row)
+
+    known = _memory.get(city)
+    if body is None and known and known['generation'] == row['generation']:
+        body = known['body']
+    if body is None:
+        cur.execute(f"SELECT body FROM {SCHEMA}.catalog_snapshots WHERE city = %s", (city,))
+        body = cur.fetchone()['body']
+    _remember(city, row['generation'], body, row['updated_at'])
+    return _snapshot(body, row['generation'], row['updated_at'])
+
+
+def _load_city(conn, cur, city: str, etags=()) -> dict:
+    cur.execute(
+        f"""SELECT city, generation, built_generation, updated_at
+            FROM {SCHEMA}.catalog_snapshots
+            WHERE city = %s""",
+        (city,)
+    )
+    row = cur.fetchone()
+    if not row:
+        # Строка появляется триггером при первой записи, значит объектов в городе нет
+        return _snapshot('[]', 0, None)
+
+    row = dict(row)
+    if row['generation'] == row['built_generation'] and make_etag(row['generation']) in etags:
+        return _snapshot(None, row['generation'], row['updated_at'])
+    return _city_snapshot(conn, cur, row)
+
+
+def _load_all(conn, cur, etags=()) -> dict:
+    cur.execute(
+        f"""SELECT city, generation, built_generation, updated_at
+            FROM {SCHEMA}.catalog_snapshots
+            ORDER BY city ASC"""
+    )
+    rows = [dict(r) for r in cur.fetchall()]
+    version = sum(r['generation'] for r in rows)
+    updated_at = max((r['updated_at'] for r in rows if r['updated_at']), default=None)
+
+    all_fresh = all(r['generation'] == r['built_generation'] for r in rows)
+    if all_fresh:
+        if make_etag(version) in etags:
+            return _snapshot(None, version, updated_at)
+        known = _memory.get(ALL_CITIES)
+        if known and known['generation'] == version:
+            return _snapshot(known['body'], version, updated_at)
+
+    # Тела догружаем одним запросом только для свежих городов, которых нет в памяти
+    missing = [
+        r['city'] for r in rows
+        if r['generation'] == r['built_generation']
+        and (_memory.get(r['city']) or {}).get('generation') != r['generation']
+    ]
+    bodies = {}
+    if missing:
+        cur.execute(
+            f"SELECT city, body FROM {SCHEMA}.catalog_snapshots WHERE city = ANY(%s)",
+            (missing,)
+        )
+        bodies = {r['city']: r['body'] for r in cur.fetchall()}
+
+    parts = []
+    served_version = 0
+    for row in rows:
+        snapshot = _city_snapshot(conn, cur, row, bodies.get(row['city']))
+        served_version += snapshot['version']
+        if snapshot['body'] and snapshot['body'] != '[]':
+            parts.append(snapshot['body'][1:-1])
+
+    combined = '[' + ','.join(parts) + ']'
+    _remember(ALL_CITIES, served_version, combined, updated_at)
+    return _snapshot(combined, served_version, updated_at)
+
+
+def get_catalog(city: str = None, etags=()) -> dict:
+    '''
+    Каталог города (или всех городов) -> {body, version, updated_at, stale}.
+    body = None, если один из etags клиента совпал с текущей версией (ответ 304).
+    stale = True, если БД недоступна и отдан последний удачный снимок из памяти.
+    '''
+    scope = city or ALL_CITIES
+    conn = None
+    try:
+        conn = db.connect()
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        if scope == ALL_CITIES:
+            snapshot = _load_all(conn, cur, etags)
+        else:
+            snapshot = _load_city(conn, cur, scope, etags)
+        cur.close()
+        return snapshot
+    except (psycopg2.OperationalError, psycopg2.InterfaceError, db.PoolExhausted) as e:
+        print(f'[SNAPSHOT] Database unavailable, serving last good snapshot for {scope}: {e}')
+        known = _memory.get(scope)
+        if known:
+            return _snapshot(known['body'], known['generation'], known['updated_at'], is_stale=True)
+        raise SnapshotUnavailable(str(e))
+    finally:
+        if conn:
+            conn.close()
@@ -0,0 +1,189 @@
+'''
+Автодополнение городов, районов и станций метро.
+
+Словарь держится в памяти инстанса как отсортированный массив ключей (бинарный поиск
+по префиксу). Ключи строятся от начала каждого слова названия, поэтому "культ"
+находит "Парк культуры". Вес подсказки - число опубликованных объектов с этим названием.
+
+Словарь обновляется инкрементально по listings.catalog_txid, как дельта каталога:
+перечитываются только объекты, изменившиеся с прошлого обновления, и tombstones.
+'''
+import time
+from bisect import bisect_left
+
+import catalog
+import delta
+
+SCHEMA = catalog.SCHEMA
+
+KINDS = ('city', 'district', 'metro')
+REFRESH_SECONDS = 30
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 30
+MAX_PREFIX_LENGTH = 50
+
+_SOURCE = f"""
+    SELECT l.id, l.city, l.district, ({catalog.PUBLIC_WHERE}) AS is_public,
+           COALESCE(array_agg(m.station_name) FILTER (WHERE m.station_name IS NOT NULL), '{{}}') AS stations
+    FROM {SCHEMA}.listings l
+    LEFT JOIN {SCHEMA}.metro_stations m ON m.listing_id = l.id
+"""
+
+_state = {
+    'version': None,
+    'refreshed_at': 0.0,
+    # listing_id -> {(kind, name, city)}
+    'contributions': {},
+    # (kind, name, city) -> число объектов; у городов city = ''
+    'counts': {},
+    # отсортированные (ключ, kind, name, city)
+    'keys': [],
+}
+
+
+def normalize(text: str) -> str:
+    return ' '.join((text or '').lower().replace('ё', 'е').split())
+
+
+def parse_request(params: dict) -> dict:
+    prefix = normalize(params.get('suggest'))[:MAX_PREFIX_LENGTH]
+    if not prefix:
+        raise ValueError('Параметр suggest не должен быть пустым')
+
+    kind = (params.get('kind') or '').strip() or None
+    if kind and kind not in KINDS:
+        raise ValueError(f"kind должен быть одним из: {', '.join(KINDS)}")
+
+    limit = catalog.parse_page_size({'limit': params.get('limit') or str(DEFAULT_LIMIT)})
+    city = (params.get('city') or '').strip()
+    return {
+        'prefix': prefix,
+        'kind': kind,
+        'city': city if city and city != 'Все города' else None,
+        'limit': min(limit, MAX_LIMIT)
+    }
+
+
+def _entries(row) -> set:
+    if not row['is_public']:
+        return set()
+    entries = set()
+    city = (row['city'] or '').strip()
+    if city:
+        entries.add(('city', city, ''))
+    if (row['district'] or '').strip():
+        entries.add(('district', row['district'].strip(), city))
+    for station in row['stations'] or []:
+        if station and station.strip():
+            entries.add(('metro', station.strip(), city))
+    return entries
+
+
+def _apply(listing_id: int, entries: set) -> bool:
+    '''Заменить вклад объекта в счётчики; True, если изменился набор названий'''
+    counts = _state['counts']
+    old = _state['contributions'].pop(listing_id, set())
+    if entries:
+        _state['contributions'][listing_id] = entries
+
+    vocabulary_changed = False
+    for entry in old - entries:
+        counts[entry] -= 1
+        if counts[entry] <= 0:
+            del counts[entry]
+            vocabulary_changed = True
+    for entry in entries - old:
+        if entry not in counts:
+            vocabulary_changed = True
+        counts[entry] = counts.get(entry, 0) + 1
+    return vocabulary_changed
+
+
+def _rebuild_keys():
+    keys = []
+    for kind, name, city in _state['counts']:
+        normalized = normalize(name)
+        for i in range(len(normalized)):
+            if i == 0 or normalized[i - 1] in ' -(':
+                keys.append((normalized[i:], kind, name, city))
+    keys.sort()
+    _state['keys'] = keys
+
+
+def _current_version(cur) -> int:
+    cur.execute("SELECT txid_snapshot_xmin(txid_current_snapshot()) AS version")
+    return cur.fetchone()['version']
+
+
+def _load_all(cur):
+    version = _current_version(cur)
+    cur.execute(f"{_SOURCE} WHERE {catalog.PUBLIC_WHERE} GROUP BY l.id")
+    _state['contributions'] = {}
+    _state['counts'] = {}
+    for row in cur.fetchall():
+        _apply(row['id'], _entries(row))
+    _rebuild_keys()
+    _state['version'] = version
+
+
+def _load_changes(cur):
+    version = _current_version(cur)
+    since = _state['version']
+
+    cur.execute(f"{_SOURCE} WHERE l.catalog_txid >= %s GROUP BY l.id LIMIT %s", (since, delta.MAX_DELTA_SIZE + 1))
+    rows = cur.fetchall()
+    if len(rows) > delta.MAX_DELTA_SIZE:
+        _load_all(cur)
+        return
+
+    changed = False
+    for row in rows:
+        changed |= _apply(row['id'], _entries(row))
+
+    cur.execute(f"SELECT listing_id FROM {SCHEMA}.listing_tombstones WHERE catalog_txid >= %s", (since,))
+    for row in cur.fetchall():
+        changed |= _apply(row['listing_id'], set())
+
+    if changed:
+        _rebuild_keys()
+    _state['version'] = version
+
+
+def is_loaded() -> bool:
+    return _state['version'] is not None
+
+
+def refresh(cur, force: bool = False):
+    '''Обновить словарь не чаще раза в REFRESH_SECONDS'''
+    now = time.monotonic()
+    if not force and _state['version'] is not None and now - _state['refreshed_at'] < REFRESH_SECONDS:
+        return
+    if _state['version'] is None:
+        _load_all(cur)
+    else:
+        _load_changes(cur)
+    _state['refreshed_at'] = now
+
+
+def suggest(prefix: str, kind: str = None, city: str = None, limit: int = DEFAULT_LIMIT) -> list:
+    '''Подсказки по префиксу -> [{kind, name, city, count}] по убыванию числа объектов'''
+    keys = _state['keys']
+    counts = _state['counts']
+    found = {}
+    i = bisect_left(keys, (prefix,))
+    while i < len(keys) and keys[i][0].startswith(prefix):
+        _, entry_kind, name, entry_city = keys[i]
+        i += 1
+        if kind and entry_kind != kind:
+            continue
+        if city and entry_kind != 'city' and entry_city != city:
+            continue
+        entry = (entry_kind, name, entry_city)
+        if entry not in found:
+            found[entry] = counts[entry]
+
+    ranked = sorted(found.items(), key=lambda item: (-item[1], KINDS.index(item[0][0]), item[0][1]))
+    return [
+        {'kind': entry_kind, 'name': name, 'city': entry_city or None, 'count': count}
+        for (entry_kind, name, entry_city), count in ranked[:limit]
+    ]
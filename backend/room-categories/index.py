@@ -1,24 +1,19 @@
 import json
 import os
-import psycopg2
+import db
+import listing_write
 from psycopg2.extras import RealDictCursor
 from datetime import datetime
 
-def verify_owner_token(token: str):
-    '''Проверка токена владельца'''
+def verify_owner_token(cur, token: str):
+    '''Проверка токена владельца (на соединении самого запроса)'''
     if not token:
         print('[DEBUG] No token provided')
         return None
     
     try:
-        dsn = os.environ.get('DATABASE_URL')
         print(f'[DEBUG] token length: {len(token)}')
-        conn = psycopg2.connect(dsn)
-        conn.autocommit = True
-        cur = conn.cursor()
-        
         # Используем параметризованный запрос как в owner-auth
-        print(f'[DEBUG] Executing query with parameterized %s')
         cur.execute(
             "SELECT id, email, full_name, phone FROM owners WHERE token = %s",
             (token,)
@@ -26,16 +21,14 @@ def verify_owner_token(token: str):
         row = cur.fetchone()
         print(f'[DEBUG] Query result: row = {row}')
         
-        cur.close()
-        conn.close()
-        
         if row:
-            return {'id': row[0], 'email': row[1], 'full_name': row[2], 'phone': row[3]}
+            return {'id': row['id'], 'email': row['email'], 'full_name': row['full_name'], 'phone': row['phone']}
         return None
     except Exception as e:
         print(f'[ERROR] verify_owner_token failed: {type(e).__name__}: {str(e)}')
         import traceback
         traceback.print_exc()
+        cur.connection.rollback()
         return None
 
 def handler(event: dict, context) -> dict:
@@ -55,9 +48,13 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     
+    conn = None
     try:
+        conn = db.connect()
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        
         token = event.get('headers', {}).get('X-Authorization', '').replace('Bearer ', '')
-        owner = verify_owner_token(token)
+        owner = verify_owner_token(cur, token)
         
         if not owner:
             return {
@@ -67,10 +64,6 @@ def handler(event: dict, context) -> dict:
                 'isBase64Encoded': False
             }
         
-        dsn = os.environ.get('DATABASE_URL')
-        conn = psycopg2.connect(dsn)
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
         if method == 'GET':
             listing_id = event.get('queryStringParameters', {}).get('listing_id')
             print(f"[DEBUG] GET room categories for listing_id={listing_id}, owner_id={owner['id']}")
@@ -142,28 +135,25 @@ def handler(event: dict, context) -> dict:
                     'isBase64Encoded': False
                 }
             
-            # Сохраняем в таблицу rooms (как админ-панель)
-            cur.execute(
-                f"DELETE FROM t_p39732784_hourly_rentals_platf.rooms WHERE listing_id = {listing_id}"
+            # Сохраняем в таблицу rooms (как админ-панель): меняются только изменённые категории,
+            # id и экспертные оценки номеров сохраняются
+            listing_write.save_rooms(
+                cur, listing_id,
+                [
+                    {
+                        'id': category.get('id'),
+                        'type': str(category.get('name', '')),
+                        'price': float(category.get('price_per_hour', 0)),
+                        'square_meters': float(category.get('square_meters', 0)),
+                        'description': str(category.get('description', '')),
+                        'features': category.get('features', []),
+                        'images': category.get('image_urls', []),
+                    }
+                    for category in categories
+                ],
+                columns=('type', 'price', 'square_meters', 'description', 'features', 'images')
             )
             
-            for category in categories:
-                # Simple Query Protocol - экранируем данные
-                name = str(category.get('name', '')).replace("'", "''")
-                price = float(category.get('price_per_hour', 0))
-                sqm = float(category.get('square_meters', 0))
-                description = str(category.get('description', '')).replace("'", "''")
-                features = json.dumps(category.get('features', [])).replace("'", "''")
-                images = json.dumps(category.get('image_urls', [])).replace("'", "''")
-                
-                cur.execute(
-                    f"""
-                    INSERT INTO t_p39732784_hourly_rentals_platf.rooms 
-                    (listing_id, type, price, square_meters, description, features, images, min_hours, payment_methods, cancellation_policy)
-                    VALUES ({listing_id}, '{name}', {price}, {sqm}, '{description}', ARRAY{features}::text[], ARRAY{images}::text[], 1, 'Наличные, банковская карта при заселении', 'Бесплатная отмена за 1 час до заселения')
-                    """
-                )
-            
             conn.commit()
             cur.close()
             conn.close()
@@ -192,4 +182,8 @@ def handler(event: dict, context) -> dict:
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': str(e)}),
             'isBase64Encoded': False
-        }
\ No newline at end of file
+        }
+    finally:
+        # Ранние ответы (например, 401) тоже возвращают соединение в пул
+        if conn:
+            conn.close()
\ No newline at end of file
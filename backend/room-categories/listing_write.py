@@ -0,0 +1,130 @@
+'''
+Запись комнат и станций метро объекта сравнением с тем, что уже есть в БД, вместо DELETE + INSERT.
+
+Входящие строки сопоставляются с существующими строками объекта:
+    - комнаты по id; без id, с чужим или повторным id - новые;
+    - станции метро по id, а без id - по названию станции.
+Изменения применяются пакетами, по одному запросу на вид изменения:
+    - новые строки - многострочный INSERT (execute_values);
+    - сопоставленные - UPDATE ... FROM (VALUES ...), строки без изменений не трогаются
+      (сравнение IS DISTINCT FROM делает Postgres с учётом типов колонок);
+    - строки, которых нет во входящих, - один DELETE.
+Поэтому id комнат и их экспертные оценки сохраняются, а триггеры (раскладка фото, версии
+каталога) срабатывают только для изменённых строк. Порядок комнат - по id, как и раньше при чтении.
+
+cur - RealDictCursor на соединении запроса, commit делает вызывающий код.
+Файл одинаковый в admin-listings, owner-listing-submission и room-categories.
+'''
+from psycopg2.extras import execute_values
+
+SCHEMA = 't_p39732784_hourly_rentals_platf'
+
+# Колонка комнаты -> (тип в VALUES, значение, если поле не пришло)
+ROOM_COLUMNS = {
+    'type': ('varchar', None),
+    'price': ('integer', None),
+    'description': ('text', None),
+    'images': ('text[]', []),
+    'square_meters': ('integer', 0),
+    'features': ('text[]', []),
+    'min_hours': ('integer', 1),
+    'payment_methods': ('text', 'Наличные, банковская карта при заселении'),
+    'cancellation_policy': ('text', 'Бесплатная отмена за 1 час до заселения'),
+}
+
+METRO_COLUMNS = {
+    'station_name': ('varchar', None),
+    'walk_minutes': ('integer', 5),
+}
+
+
+def _values(item: dict, columns: dict, names: tuple) -> tuple:
+    return tuple(item.get(name, columns[name][1]) for name in names)
+
+
+def _write(cur, table: str, listing_id: int, columns: dict, names: tuple,
+           inserts: list, updates: list, deletes: list) -> dict:
+    '''
+    Применить изменения таблицы table -> {inserted, updated, deleted}.
+    inserts - значения всех колонок columns, updates - (id, значения колонок names).
+    '''
+    stats = {'inserted': 0, 'updated': 0, 'deleted': 0}
+
+    if deletes:
+        cur.execute(
+            f"DELETE FROM {SCHEMA}.{table} WHERE listing_id = %s AND id = ANY(%s)",
+            (listing_id, deletes)
+        )
+        stats['deleted'] = cur.rowcount
+
+    if updates:
+        assignments = ', '.join(f'{name} = v.{name}' for name in names)
+        current = ', '.join(f't.{name}' for name in names)
+        incoming = ', '.join(f'v.{name}' for name in names)
+        template = '(%s::integer, ' + ', '.join(f'%s::{columns[name][0]}' for name in names) + ')'
+        execute_values(
+            cur,
+            f"""UPDATE {SCHEMA}.{table} t SET {assignments}
+                FROM (VALUES %s) AS v(id, {', '.join(names)})
+                WHERE t.id = v.id AND ({current}) IS DISTINCT FROM ({incoming})""",
+            updates, template=template, page_size=len(updates)
+        )
+        stats['updated'] = cur.rowcount
+
+    if inserts:
+        template = '(%s, ' + ', '.join(f'%s::{sql_type}' for sql_type, _ in columns.values()) + ')'
+        execute_values(
+            cur,
+            f"INSERT INTO {SCHEMA}.{table} (listing_id, {', '.join(columns)}) VALUES %s",
+            [(listing_id,) + row for row in inserts], template=template, page_size=len(inserts)
+        )
+        stats['inserted'] = len(inserts)
+
+    return stats
+
+
+def save_rooms(cur, listing_id: int, rooms: list, columns: tuple = tuple(ROOM_COLUMNS)) -> dict:
+    '''
+    Привести комнаты объекта к списку rooms.
+    columns - колонки, которыми управляет вызывающий код: остальные у существующих комнат
+    не меняются, у новых получают значения по умолчанию.
+    '''
+    cur.execute(f"SELECT id FROM {SCHEMA}.rooms WHERE listing_id = %s", (listing_id,))
+    existing = {row['id'] for row in cur.fetchall()}
+
+    names = tuple(columns)
+    inserts, updates, kept = [], [], set()
+    for room in rooms:
+        room_id = room.get('id')
+        if room_id in existing and room_id not in kept:
+            kept.add(room_id)
+            updates.append((room_id,) + _values(room, ROOM_COLUMNS, names))
+        else:
+            inserts.append(_values(room, ROOM_COLUMNS, tuple(ROOM_COLUMNS)))
+
+    return _write(cur, 'rooms', listing_id, ROOM_COLUMNS, names, inserts, updates, sorted(existing - kept))
+
+
+def save_metro_stations(cur, listing_id: int, stations: list) -> dict:
+    '''Привести станции метро объекта к списку stations'''
+    cur.execute(f"SELECT id, station_name FROM {SCHEMA}.metro_stations WHERE listing_id = %s", (listing_id,))
+    existing = {row['id']: row['station_name'] for row in cur.fetchall()}
+    by_name = {}
+    for station_id, name in existing.items():
+        by_name.setdefault(name, []).append(station_id)
+
+    names = tuple(METRO_COLUMNS)
+    inserts, updates, kept = [], [], set()
+    for station in stations:
+        station_id = station.get('id')
+        if station_id not in existing or station_id in kept:
+            candidates = [sid for sid in by_name.get(station.get('station_name'), []) if sid not in kept]
+            station_id = candidates[0] if candidates else None
+        if station_id is None:
+            inserts.append(_values(station, METRO_COLUMNS, names))
+            continue
+        kept.add(station_id)
+        updates.append((station_id,) + _values(station, METRO_COLUMNS, names))
+
+    return _write(cur, 'metro_stations', listing_id, METRO_COLUMNS, names,
+                  inserts, updates, sorted(set(existing) - kept))
@@ -1,6 +1,6 @@
 import json
 import os
-import psycopg2
+import db
 from psycopg2.extras import RealDictCursor
 
 
@@ -29,7 +29,7 @@ def handler(event: dict, context) -> dict:
         
         if action == 'stats':
             try:
-                conn = psycopg2.connect(os.environ['DATABASE_URL'])
+                conn = db.connect()
                 cur = conn.cursor(cursor_factory=RealDictCursor)
                 
                 # Фильтры
@@ -185,7 +185,7 @@ def handler(event: dict, context) -> dict:
     
     try:
         
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        conn = db.connect()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         # Ищем активное назначение виртуального номера на объект
@@ -206,25 +206,22 @@ def handler(event: dict, context) -> dict:
         
         result = cur.fetchone()
         
+        # Номер действителен - записываем звонок в историю на том же соединении
+        if result and result['is_valid']:
+            cur.execute("""
+                INSERT INTO call_tracking 
+                (virtual_number, listing_id, client_phone, shown_at, called_at, expires_at)
+                VALUES (%s, %s, %s, NOW(), NOW(), %s)
+                ON CONFLICT DO NOTHING
+            """, (virtual_number, result['listing_id'], client_phone, result['expires_at']))
+            conn.commit()
+        
         cur.close()
         conn.close()
         
         if result:
             # Проверяем, действителен ли номер (не истёк ли срок 30 минут)
             if result['is_valid']:
-                # Номер действителен - записываем звонок в историю
-                conn = psycopg2.connect(os.environ['DATABASE_URL'])
-                cur = conn.cursor()
-                cur.execute("""
-                    INSERT INTO call_tracking 
-                    (virtual_number, listing_id, client_phone, shown_at, called_at, expires_at)
-                    VALUES (%s, %s, %s, NOW(), NOW(), %s)
-                    ON CONFLICT DO NOTHING
-                """, (virtual_number, result['listing_id'], client_phone, result['expires_at']))
-                conn.commit()
-                cur.close()
-                conn.close()
-                
                 # Формат ответа для МТС Exolve JSON-RPC
                 print(f"[ROUTE] Forwarding {virtual_number} -> {result['owner_phone']} (listing {result['listing_id']})")
                 
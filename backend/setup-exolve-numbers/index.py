@@ -1,6 +1,6 @@
 import json
 import os
-import psycopg2
+import db
 from psycopg2.extras import RealDictCursor
 import urllib.request
 
@@ -41,7 +41,7 @@ def handler(event: dict, context) -> dict:
     webhook_url = 'https://functions.poehali.dev/118f6961-69ab-4912-bbec-0481012af402'
     
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        conn = db.connect()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         cur.execute("SELECT phone FROM virtual_numbers ORDER BY id")
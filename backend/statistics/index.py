@@ -1,6 +1,6 @@
 import json
 import os
-import psycopg2
+import db
 from datetime import datetime, timedelta
 
 def handler(event: dict, context) -> dict:
@@ -19,7 +19,7 @@ def handler(event: dict, context) -> dict:
             'body': ''
         }
     
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn = db.connect()
     cur = conn.cursor()
     
     try:
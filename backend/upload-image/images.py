@@ -0,0 +1,418 @@
+'''
+Обработка загруженных фотографий: варианты фиксированной ширины в WebP и JPEG.
+
+Модуль одинаковый в upload-image и admin-upload. Из оригинала собираются варианты
+thumb / card / full (без увеличения маленьких фото), EXIF и прочие метаданные
+камеры не переносятся, ориентация применяется к пикселям. Оригинал в хранилище
+не попадает: full - это он же, но очищенный и ограниченный по ширине.
+
+Загрузка идёт мимо функции: presign выдаёт короткоживущую ссылку PUT (или ссылки
+на части multipart-загрузки для больших файлов) на ключ uploads/<uuid>, браузер кладёт
+файл в хранилище сам, confirm забирает его оттуда, нарезает варианты и удаляет.
+Файл больше MAX_UPLOAD_BYTES отклоняется по head_object ещё до чтения, остальные
+скачиваются по частям во временный файл, а не в память функции. JPEG декодируется
+сразу в уменьшенном масштабе (draft), поэтому память функции определяется размером
+варианта full, а не размером и разрешением исходника.
+
+Фото адресуются хешем содержимого (SHA-256 исходных байтов): варианты лежат под
+listings/<sha256>/, а повторная загрузка тех же байтов находит готовую запись images
+через lookup и не пишет в хранилище. Дубликат узнаётся только по хешу, который функция
+посчитала сама по загруженным байтам: хешу от клиента верить нельзя.
+
+presign_batch / confirm_batch обрабатывают до MAX_BATCH_SIZE файлов за вызов
+в ограниченном пуле потоков (BATCH_WORKERS) и возвращают результат по каждому файлу.
+Потоки пакета не ходят в БД (в пуле соединений функции их меньше, чем потоков):
+готовые фото для confirm_batch ищутся одним запросом find_many до запуска потоков по хешам,
+которые прислал клиент, и засчитываются, только если совпал хеш, посчитанный функцией.
+
+Хранилище S3-совместимое, настройки (переменные окружения функции):
+    S3_ENDPOINT_URL  - адрес хранилища (https://bucket.poehali.dev); пустая строка -
+                       стандартный адрес AWS, так функцию можно проверить под moto
+    S3_BUCKET        - бакет (files)
+    CDN_BASE_URL     - префикс публичных ссылок (CDN проекта); для MinIO - адрес бакета
+'''
+import hashlib
+import io
+import json
+import math
+import os
+import re
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Callable, Optional, Union
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+SCHEMA = 't_p39732784_hourly_rentals_platf'
+
+# Вариант -> максимальная ширина в пикселях
+VARIANTS = {'thumb': 320, 'card': 640, 'full': 1600}
+
+# Формат -> (расширение, Content-Type, параметры сохранения Pillow)
+FORMATS = {
+    'webp': ('webp', 'image/webp', {'format': 'WEBP', 'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', 'image/jpeg', {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Ссылка, которую получает клиент и которая пишется в image_url / rooms.images
+PRIMARY = ('full', 'jpeg')
+
+MAX_UPLOAD_BYTES = 15 * 1024 * 1024
+
+# Прямая загрузка: временные ключи, срок жизни ссылок, части multipart (минимум S3 - 5 МБ)
+STAGING_PREFIX = 'uploads'
+STAGING_KEY_RE = re.compile(r'^uploads/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+PRESIGN_EXPIRES = 300
+PART_SIZE = 5 * 1024 * 1024
+MULTIPART_THRESHOLD = 2 * PART_SIZE
+ALLOWED_CONTENT_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'image/gif')
+
+# Скачивание загрузки одним потоком блоками по 256 КБ: память не растёт с размером файла
+DOWNLOAD_CONFIG = TransferConfig(use_threads=False, io_chunksize=256 * 1024)
+
+HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+
+# Сколько часов фото без ссылок ещё можно отдавать как дубликат; меньше срока cron-image-gc
+REUSE_RELEASED_HOURS = 24
+
+# Поиск уже сохранённого фото по хешу содержимого: sha256 -> запись images (как store()) или None
+Lookup = Optional[Callable[[str], Optional[dict]]]
+
+# Пакетная загрузка: файлов за вызов и параллельных обработок (каждая держит в памяти одно фото)
+MAX_BATCH_SIZE = 30
+BATCH_WORKERS = 4
+
+BUCKET = os.environ.get('S3_BUCKET', 'files')
+ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL', 'https://bucket.poehali.dev') or None
+
+_client = {}
+
+
+class InvalidImage(ValueError):
+    '''Файл не удалось прочитать как изображение'''
+
+
+def storage_client():
+    '''boto3-клиент, общий для тёплых вызовов инстанса'''
+    if 's3' not in _client:
+        _client['s3'] = boto3.client(
+            's3',
+            endpoint_url=ENDPOINT_URL,
+            config=Config(signature_version='s3v4'),
+            aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+            aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
+        )
+    return _client['s3']
+
+
+def public_url(key: str) -> str:
+    base = os.environ.get('CDN_BASE_URL') or f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket"
+    return f"{base.rstrip('/')}/{key}"
+
+
+# Исходник: байты (base64 из запроса) или открытый двоичный файл (загрузка из хранилища)
+Source = Union[bytes, BinaryIO]
+
+# Размер блока при хешировании файла
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def _open(source: Source) -> Image.Image:
+    if isinstance(source, (bytes, bytearray)):
+        if not source:
+            raise InvalidImage('Изображение обязательно')
+        if len(source) > MAX_UPLOAD_BYTES:
+            raise InvalidImage(f'Изображение больше {MAX_UPLOAD_BYTES // (1024 * 1024)} МБ')
+        source = io.BytesIO(source)
+    else:
+        source.seek(0)
+    try:
+        image = Image.open(source)
+        # Декодер JPEG уменьшает картинку в 2-8 раз прямо при чтении, не опускаясь ниже ширины full
+        rotated = image.getexif().get(0x0112, 1) in (5, 6, 7, 8)
+        image.draft('RGB', (1, VARIANTS['full']) if rotated else (VARIANTS['full'], 1))
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise InvalidImage('Файл не является изображением')
+
+    # Ориентация из EXIF применяется к пикселям, сами EXIF дальше не сохраняются
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def process(source: Source) -> dict:
+    '''
+    Варианты изображения -> {width, height, variants: {variant: {format: (bytes, width, height)}}}
+    width/height - размеры оригинала после поворота
+    '''
+    image = _open(source)
+    width, height = image.size
+    variants = {}
+    for name, max_width in VARIANTS.items():
+        if width > max_width:
+            resized = image.resize((max_width, max(1, round(height * max_width / width))), Image.LANCZOS)
+        else:
+            resized = image
+        encoded = {}
+        for fmt, (_, _, options) in FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, **options)
+            encoded[fmt] = (buffer.getvalue(), resized.width, resized.height)
+        variants[name] = encoded
+    return {'width': width, 'height': height, 'variants': variants}
+
+
+def content_hash(source: Source) -> str:
+    if isinstance(source, (bytes, bytearray)):
+        return hashlib.sha256(source).hexdigest()
+    digest = hashlib.sha256()
+    source.seek(0)
+    for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store(processed: dict, digest: str, prefix: str = 'listings') -> dict:
+    '''
+    Записать варианты в хранилище под общим ключом prefix/<digest>/<variant>.<ext>
+    -> {url, width, height, size_bytes, content_type, content_hash, variants: {variant: {format: url, width, height}}}
+    url, width и height - основного варианта PRIMARY
+    '''
+    s3 = storage_client()
+    base_key = f'{prefix}/{digest}'
+    variants = {}
+    for name, encoded in processed['variants'].items():
+        entry = {}
+        for fmt, (body, width, height) in encoded.items():
+            extension, content_type, _ = FORMATS[fmt]
+            key = f'{base_key}/{name}.{extension}'
+            s3.put_object(
+                Bucket=BUCKET, Key=key, Body=body, ContentType=content_type,
+                CacheControl='public, max-age=31536000, immutable'
+            )
+            entry[fmt] = public_url(key)
+            entry['width'], entry['height'] = width, height
+        variants[name] = entry
+
+    primary_variant, primary_format = PRIMARY
+    return {
+        'url': variants[primary_variant][primary_format],
+        'width': variants[primary_variant]['width'],
+        'height': variants[primary_variant]['height'],
+        'size_bytes': len(processed['variants'][primary_variant][primary_format][0]),
+        'content_type': FORMATS[primary_format][1],
+        'storage_key': base_key,
+        'content_hash': digest,
+        'variants': variants,
+    }
+
+
+def ingest(source: Source, lookup: Lookup = None) -> dict:
+    '''Фото по исходным байтам: готовая запись с тем же хешем или новые варианты в хранилище'''
+    digest = content_hash(source)
+    existing = lookup(digest) if lookup else None
+    if existing:
+        return existing
+    return store(process(source), digest)
+
+
+def describe(stored: dict) -> dict:
+    '''Поля фото для ответа клиенту'''
+    return {key: stored[key] for key in ('url', 'width', 'height', 'variants')}
+
+
+def record(cur, stored: dict):
+    '''
+    Запомнить фото в images: триггер listing_photos возьмёт оттуда размеры и варианты.
+    Повторная загрузка фото без ссылок продлевает ему срок до сборки мусора (cron-image-gc)
+    '''
+    cur.execute(
+        f"""INSERT INTO {SCHEMA}.images (url, storage_key, content_hash, width, height, size_bytes, content_type, variants)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s::jsonb)
+            ON CONFLICT (url) DO UPDATE SET released_at = CURRENT_TIMESTAMP
+            WHERE images.ref_count = 0""",
+        (
+            stored['url'], stored['storage_key'], stored.get('content_hash'), stored['width'], stored['height'],
+            stored['size_bytes'], stored['content_type'], json.dumps(stored['variants'])
+        )
+    )
+
+
+def find(cur, digest: str) -> Optional[dict]:
+    '''
+    Запись images с таким хешем содержимого (курсор RealDictCursor).
+    Фото, давно оставшееся без ссылок, не отдаётся: сборщик мусора может удалить его
+    раньше, чем на ссылку сошлётся объект, - такое фото загружается заново
+    '''
+    cur.execute(
+        f"""SELECT url, storage_key, content_hash, width, height, size_bytes, content_type, variants
+            FROM {SCHEMA}.images
+            WHERE content_hash = %s
+              AND (ref_count > 0 OR released_at > NOW() - make_interval(hours => %s))""",
+        (digest, REUSE_RELEASED_HOURS)
+    )
+    row = cur.fetchone()
+    return dict(row) if row else None
+
+
+def find_many(cur, digests) -> dict:
+    '''Записи images по списку хешей одним запросом (условия как в find) -> {sha256: запись}'''
+    digests = sorted({digest for digest in digests if isinstance(digest, str) and HASH_RE.match(digest)})
+    if not digests:
+        return {}
+    cur.execute(
+        f"""SELECT url, storage_key, content_hash, width, height, size_bytes, content_type, variants
+            FROM {SCHEMA}.images
+            WHERE content_hash = ANY(%s)
+              AND (ref_count > 0 OR released_at > NOW() - make_interval(hours => %s))""",
+        (digests, REUSE_RELEASED_HOURS)
+    )
+    return {row['content_hash']: dict(row) for row in cur.fetchall()}
+
+
+def presign(content_type: str, size) -> dict:
+    '''
+    Ссылки для загрузки файла прямо в хранилище:
+    {key, method: PUT, url, headers} или {key, upload_id, part_size, parts: [{part_number, url}]}
+    '''
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        raise InvalidImage(f"Поддерживаются только {', '.join(ALLOWED_CONTENT_TYPES)}")
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise InvalidImage('Не указан размер файла')
+    if size <= 0 or size > MAX_UPLOAD_BYTES:
+        raise InvalidImage(f'Изображение больше {MAX_UPLOAD_BYTES // (1024 * 1024)} МБ')
+
+    s3 = storage_client()
+    key = f'{STAGING_PREFIX}/{uuid.uuid4()}'
+    if size <= MULTIPART_THRESHOLD:
+        url = s3.generate_presigned_url(
+            'put_object',
+            Params={'Bucket': BUCKET, 'Key': key, 'ContentType': content_type},
+            ExpiresIn=PRESIGN_EXPIRES
+        )
+        return {
+            'key': key, 'method': 'PUT', 'url': url,
+            'headers': {'Content-Type': content_type}, 'expires_in': PRESIGN_EXPIRES
+        }
+
+    upload_id = s3.create_multipart_upload(Bucket=BUCKET, Key=key, ContentType=content_type)['UploadId']
+    parts = [
+        {
+            'part_number': number,
+            'url': s3.generate_presigned_url(
+                'upload_part',
+                Params={'Bucket': BUCKET, 'Key': key, 'UploadId': upload_id, 'PartNumber': number},
+                ExpiresIn=PRESIGN_EXPIRES
+            )
+        }
+        for number in range(1, math.ceil(size / PART_SIZE) + 1)
+    ]
+    return {'key': key, 'upload_id': upload_id, 'part_size': PART_SIZE, 'parts': parts, 'expires_in': PRESIGN_EXPIRES}
+
+
+def _fetch_upload(key: str, upload_id: str = None, parts: list = None) -> BinaryIO:
+    '''Загруженный файл во временном файле; размер проверяется до чтения'''
+    s3 = storage_client()
+    if upload_id:
+        try:
+            completed = sorted(
+                ({'PartNumber': int(part['part_number']), 'ETag': str(part['etag'])} for part in parts or []),
+                key=lambda part: part['PartNumber']
+            )
+        except (TypeError, KeyError, ValueError):
+            raise InvalidImage('Некорректный список частей загрузки')
+        if not completed:
+            raise InvalidImage('Некорректный список частей загрузки')
+        try:
+            s3.complete_multipart_upload(
+                Bucket=BUCKET, Key=key, UploadId=upload_id, MultipartUpload={'Parts': completed}
+            )
+        except ClientError as e:
+            s3.abort_multipart_upload(Bucket=BUCKET, Key=key, UploadId=upload_id)
+            raise InvalidImage(f'Загрузка не завершена: {e.response["Error"].get("Code")}')
+
+    try:
+        head = s3.head_object(Bucket=BUCKET, Key=key)
+    except ClientError:
+        raise InvalidImage('Файл не загружен или ссылка устарела')
+    if head['ContentLength'] > MAX_UPLOAD_BYTES:
+        s3.delete_object(Bucket=BUCKET, Key=key)
+        raise InvalidImage(f'Изображение больше {MAX_UPLOAD_BYTES // (1024 * 1024)} МБ')
+    if head['ContentLength'] == 0:
+        raise InvalidImage('Изображение обязательно')
+
+    upload = tempfile.TemporaryFile()
+    try:
+        s3.download_fileobj(BUCKET, key, upload, Config=DOWNLOAD_CONFIG)
+    except ClientError:
+        upload.close()
+        raise InvalidImage('Файл не загружен или ссылка устарела')
+    # Объект могли перезаписать по той же ссылке после head_object
+    if upload.tell() > MAX_UPLOAD_BYTES:
+        upload.close()
+        raise InvalidImage(f'Изображение больше {MAX_UPLOAD_BYTES // (1024 * 1024)} МБ')
+    upload.seek(0)
+    return upload
+
+
+def confirm(key: str, upload_id: str = None, parts: list = None, lookup: Lookup = None) -> dict:
+    '''Забрать загруженный по presign файл, сохранить его (см. ingest) и удалить временный объект'''
+    if not isinstance(key, str) or not STAGING_KEY_RE.match(key):
+        raise InvalidImage('Некорректный ключ загрузки')
+    try:
+        with _fetch_upload(key, upload_id, parts) as upload:
+            return ingest(upload, lookup)
+    finally:
+        storage_client().delete_object(Bucket=BUCKET, Key=key)
+
+
+def _run_batch(items, task) -> list:
+    '''task(item) для каждого элемента в пуле потоков -> [{index, ok, ...результат | error}] в исходном порядке'''
+    if not isinstance(items, list) or not items:
+        raise InvalidImage('Список файлов пуст')
+    if len(items) > MAX_BATCH_SIZE:
+        raise InvalidImage(f'Не больше {MAX_BATCH_SIZE} файлов за один запрос')
+
+    def run(index: int, item) -> dict:
+        try:
+            if not isinstance(item, dict):
+                raise InvalidImage('Некорректное описание файла')
+            return {'index': index, 'ok': True, **task(item)}
+        except InvalidImage as e:
+            return {'index': index, 'ok': False, 'error': str(e)}
+        except Exception as e:
+            print(f'[IMAGES] Batch item {index} failed: {e}')
+            return {'index': index, 'ok': False, 'error': 'Не удалось сохранить фото'}
+
+    # Клиент boto3 потокобезопасен, но создаётся один раз до запуска потоков
+    storage_client()
+    with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(items))) as pool:
+        return list(pool.map(run, range(len(items)), items))
+
+
+def presign_batch(files) -> list:
+    '''presign для каждого {content_type, size}'''
+    return _run_batch(files, lambda item: presign(item.get('content_type'), item.get('size')))
+
+
+def confirm_batch(uploads, known: dict = None) -> list:
+    '''
+    confirm для каждого {key, upload_id?, parts?, sha256?}; у успешных элементов - поля store().
+    known - готовые фото пакета {sha256: запись} (find_many по sha256 из запроса); в потоках БД не нужна
+    '''
+    lookup = (known or {}).get
+    return _run_batch(
+        uploads, lambda item: confirm(item.get('key'), item.get('upload_id'), item.get('parts'), lookup)
+    )
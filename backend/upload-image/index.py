@@ -1,12 +1,65 @@
 import json
 import base64
-import uuid
-import os
-import boto3
 from typing import Dict, Any
 
+from psycopg2.extras import RealDictCursor
+
+import db
+import images
+
+# Прямая загрузка выдаёт ссылки на запись в хранилище - только владельцу с токеном
+DIRECT_ACTIONS = ('presign', 'presign_batch', 'confirm', 'confirm_batch')
+
+def verify_owner_token(token: str):
+    '''Проверка токена владельца (owners.token); без токена или БД - None'''
+    if not token:
+        return None
+    try:
+        with db.connection() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            cur.execute(f"SELECT id FROM {images.SCHEMA}.owners WHERE token = %s", (token,))
+            return cur.fetchone()
+    except Exception as e:
+        print(f'[UPLOAD] Owner token check failed: {e}')
+        return None
+
+def find_existing(digest: str):
+    '''Уже сохранённое фото с тем же содержимым; без БД - None, фото просто сохранится заново'''
+    try:
+        with db.connection() as conn:
+            return images.find(conn.cursor(cursor_factory=RealDictCursor), digest)
+    except Exception as e:
+        print(f'[UPLOAD] Duplicate lookup failed for {digest}: {e}')
+        return None
+
+def find_known(uploads) -> dict:
+    '''Готовые фото пакета по хешам из запроса - одним запросом до запуска потоков confirm_batch'''
+    if not isinstance(uploads, list):
+        return {}
+    try:
+        with db.connection() as conn:
+            return images.find_many(
+                conn.cursor(cursor_factory=RealDictCursor),
+                [item.get('sha256') for item in uploads if isinstance(item, dict)]
+            )
+    except Exception as e:
+        print(f'[UPLOAD] Batch duplicate lookup failed: {e}')
+        return {}
+
+def save_metadata(stored_items: list):
+    '''Размеры и варианты фото в images; без БД фото всё равно доступно по ссылке'''
+    if not stored_items:
+        return
+    try:
+        with db.connection() as conn:
+            cur = conn.cursor()
+            for stored in stored_items:
+                images.record(cur, stored)
+    except Exception as e:
+        print(f'[UPLOAD] Image metadata not saved for {len(stored_items)} photo(s): {e}')
+
 def handler(event: Dict[str, Any], context) -> Dict[str, Any]:
-    '''Загружает изображение в S3 хранилище и возвращает публичный URL'''
+    '''Загружает изображение в S3 хранилище (варианты thumb/card/full в WebP и JPEG) и возвращает публичный URL'''
     
     method = event.get('httpMethod', 'POST')
     
@@ -33,53 +86,77 @@ def handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     
     try:
         body = json.loads(event.get('body', '{}'))
-        image_base64 = body.get('image')
-        filename = body.get('filename', 'image.jpg')
+        action = body.get('action')
         
-        if not image_base64:
+        if action in DIRECT_ACTIONS:
+            token = (event.get('headers') or {}).get('X-Authorization', '').replace('Bearer ', '')
+            if not verify_owner_token(token):
+                return {
+                    'statusCode': 401,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Требуется авторизация владельца'}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+        
+        try:
+            if action == 'presign':
+                # Шаг 1: ссылка для загрузки файла напрямую в хранилище
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps(images.presign(body.get('content_type'), body.get('size'))),
+                    'isBase64Encoded': False
+                }
+            
+            if action == 'presign_batch':
+                # Пакет: ссылки для всех файлов одним вызовом
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'items': images.presign_batch(body.get('files'))}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            if action == 'confirm_batch':
+                # Пакет: варианты всех загруженных файлов, параллельно; ошибка одного файла не мешает остальным
+                results = images.confirm_batch(body.get('uploads'), find_known(body.get('uploads')))
+                save_metadata([item for item in results if item['ok']])
+                items = [
+                    {'index': item['index'], 'ok': True, **images.describe(item)} if item['ok'] else item
+                    for item in results
+                ]
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'items': items}, ensure_ascii=False),
+                    'isBase64Encoded': False
+                }
+            
+            if action == 'confirm':
+                # Шаг 2: файл уже в хранилище - нарезаем варианты
+                stored = images.confirm(body.get('key'), body.get('upload_id'), body.get('parts'), find_existing)
+            else:
+                # Старые клиенты: изображение base64 в теле запроса
+                image_base64 = body.get('image')
+                if not image_base64:
+                    raise images.InvalidImage('Image data is required')
+                if ',' in image_base64:
+                    image_base64 = image_base64.split(',')[1]
+                stored = images.ingest(base64.b64decode(image_base64), find_existing)
+        except images.InvalidImage as e:
             return {
                 'statusCode': 400,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Image data is required'}),
+                'body': json.dumps({'error': str(e)}, ensure_ascii=False),
                 'isBase64Encoded': False
             }
         
-        if ',' in image_base64:
-            image_base64 = image_base64.split(',')[1]
-        
-        image_data = base64.b64decode(image_base64)
-        
-        file_extension = filename.split('.')[-1] if '.' in filename else 'jpg'
-        unique_filename = f"listings/{uuid.uuid4()}.{file_extension}"
-        
-        content_type_map = {
-            'jpg': 'image/jpeg',
-            'jpeg': 'image/jpeg',
-            'png': 'image/png',
-            'gif': 'image/gif',
-            'webp': 'image/webp'
-        }
-        content_type = content_type_map.get(file_extension.lower(), 'image/jpeg')
-        
-        s3 = boto3.client('s3',
-            endpoint_url='https://bucket.poehali.dev',
-            aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
-            aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
-        )
-        
-        s3.put_object(
-            Bucket='files',
-            Key=unique_filename,
-            Body=image_data,
-            ContentType=content_type
-        )
-        
-        cdn_url = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{unique_filename}"
+        save_metadata([stored])
         
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'url': cdn_url}),
+            'body': json.dumps(images.describe(stored)),
             'isBase64Encoded': False
         }
         
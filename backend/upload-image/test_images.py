@@ -0,0 +1,106 @@
+'''
+Нарезка вариантов images.process на настоящих файлах: python -m pytest backend/upload-image
+Хранилище и БД не нужны - проверяются только байты вариантов.
+'''
+import io
+import tempfile
+
+import pytest
+from PIL import Image
+
+import images
+
+# Теги EXIF: ориентация, производитель камеры, ссылка на GPS
+ORIENTATION = 0x0112
+MAKE = 0x010F
+GPS_IFD = 0x8825
+
+
+def make_jpeg(width: int, height: int, orientation: int = 1) -> bytes:
+    image = Image.new('RGB', (width, height), (200, 30, 30))
+    # Левая половина другого цвета - по ней видно, применился ли поворот
+    image.paste((30, 30, 200), (0, 0, width // 2, height))
+    exif = Image.Exif()
+    exif[ORIENTATION] = orientation
+    exif[MAKE] = 'TestCamera'
+    exif[GPS_IFD] = {1: 'N', 2: (55.0, 45.0, 0.0)}
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=90, exif=exif)
+    return buffer.getvalue()
+
+
+def open_variant(body: bytes) -> Image.Image:
+    image = Image.open(io.BytesIO(body))
+    image.load()
+    return image
+
+
+def test_variants_sizes_and_formats():
+    processed = images.process(make_jpeg(4000, 3000))
+
+    # Декодер уменьшает исходник при чтении (draft), но не ниже ширины full
+    assert processed['width'] >= images.VARIANTS['full']
+    assert processed['width'] * 3 == processed['height'] * 4
+    assert set(processed['variants']) == {'thumb', 'card', 'full'}
+    for name, max_width in images.VARIANTS.items():
+        encoded = processed['variants'][name]
+        assert set(encoded) == {'webp', 'jpeg'}
+        for fmt, (body, width, height) in encoded.items():
+            assert (width, height) == (max_width, max_width * 3 // 4)
+            image = open_variant(body)
+            assert image.format == images.FORMATS[fmt][2]['format']
+            assert image.size == (width, height)
+            assert image.mode == 'RGB'
+
+
+def test_exif_is_stripped_and_orientation_applied():
+    # Ориентация 6: камера повёрнута, картинку нужно повернуть на 90° по часовой
+    processed = images.process(make_jpeg(1200, 800, orientation=6))
+
+    assert (processed['width'], processed['height']) == (800, 1200)
+    for name, encoded in processed['variants'].items():
+        for fmt, (body, width, height) in encoded.items():
+            image = open_variant(body)
+            assert width < height
+            assert not image.getexif(), f'{name}.{fmt} сохранил EXIF'
+            assert 'exif' not in image.info
+            # После поворота синяя (бывшая левая) половина оказывается сверху
+            red, green, blue = image.convert('RGB').getpixel((width // 2, height // 4))
+            assert blue > red
+
+
+def test_small_image_is_not_upscaled():
+    processed = images.process(make_jpeg(300, 200))
+
+    for encoded in processed['variants'].values():
+        for body, width, height in encoded.values():
+            assert (width, height) == (300, 200)
+
+
+def test_transparent_png_is_flattened_on_white():
+    image = Image.new('RGBA', (400, 400), (0, 0, 0, 0))
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+
+    body, width, height = images.process(buffer.getvalue())['variants']['thumb']['jpeg']
+    result = open_variant(body)
+    assert result.mode == 'RGB'
+    assert all(channel > 245 for channel in result.getpixel((width // 2, height // 2)))
+
+
+def test_file_source_matches_bytes():
+    data = make_jpeg(2000, 1000)
+    with tempfile.TemporaryFile() as upload:
+        upload.write(data)
+        upload.seek(0)
+        assert images.content_hash(upload) == images.content_hash(data)
+        from_file = images.process(upload)
+
+    from_bytes = images.process(data)
+    assert from_file['variants']['card']['jpeg'][1:] == from_bytes['variants']['card']['jpeg'][1:]
+
+
+@pytest.mark.parametrize('data', [b'', b'not an image'])
+def test_invalid_image(data):
+    with pytest.raises(images.InvalidImage):
+        images.process(data)
@@ -0,0 +1,10 @@
+-- Индекс для постраничной выдачи публичного каталога (keyset по city, auction, id)
+-- Выражение COALESCE совпадает с порядком сортировки в public-listings
+CREATE INDEX IF NOT EXISTS idx_listings_public_catalog_order
+ON t_p39732784_hourly_rentals_platf.listings (city, COALESCE(auction, 2147483647), id)
+WHERE is_archived = false;
+
+-- Индекс для фильтрации по типу и цене внутри города
+CREATE INDEX IF NOT EXISTS idx_listings_public_city_type_price
+ON t_p39732784_hourly_rentals_platf.listings (city, type, price)
+WHERE is_archived = false;
@@ -0,0 +1,135 @@
+-- Готовые JSON-снимки публичного каталога по городам
+-- generation увеличивается триггерами при любой записи в listings / rooms / metro_stations,
+-- built_generation - поколение, из которого собран body. Снимок свежий, если они равны.
+CREATE TABLE IF NOT EXISTS t_p39732784_hourly_rentals_platf.catalog_snapshots (
+    city VARCHAR(100) PRIMARY KEY,
+    generation BIGINT NOT NULL DEFAULT 1,
+    built_generation BIGINT NOT NULL DEFAULT 0,
+    body TEXT,
+    listings_count INTEGER NOT NULL DEFAULT 0,
+    built_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE t_p39732784_hourly_rentals_platf.catalog_snapshots IS 'Сериализованные снимки публичного каталога (public-listings) по городам';
+COMMENT ON COLUMN t_p39732784_hourly_rentals_platf.catalog_snapshots.generation IS 'Поколение данных города, растёт при каждой записи';
+COMMENT ON COLUMN t_p39732784_hourly_rentals_platf.catalog_snapshots.built_generation IS 'Поколение, из которого собран body';
+
+-- Заводим строки для всех существующих городов, снимки соберутся при первом запросе
+INSERT INTO t_p39732784_hourly_rentals_platf.catalog_snapshots (city)
+SELECT DISTINCT city FROM t_p39732784_hourly_rentals_platf.listings WHERE city IS NOT NULL
+ON CONFLICT (city) DO NOTHING;
+
+-- Пометить снимок города устаревшим
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.bump_catalog_city(p_city VARCHAR)
+RETURNS void AS $$
+BEGIN
+    IF p_city IS NULL THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO t_p39732784_hourly_rentals_platf.catalog_snapshots (city)
+    VALUES (p_city)
+    ON CONFLICT (city) DO UPDATE
+    SET generation = t_p39732784_hourly_rentals_platf.catalog_snapshots.generation + 1,
+        updated_at = CURRENT_TIMESTAMP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Запись в listings: затрагивает старый и новый город объекта
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.listings_catalog_changed()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW IS NOT DISTINCT FROM OLD THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM t_p39732784_hourly_rentals_platf.bump_catalog_city(OLD.city);
+    END IF;
+
+    IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.city IS DISTINCT FROM OLD.city) THEN
+        PERFORM t_p39732784_hourly_rentals_platf.bump_catalog_city(NEW.city);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Запись в rooms / metro_stations: город берём из объекта. Триггеры уровня оператора:
+-- сохранение 40 комнат поднимает поколение города один раз, а не 40
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.listing_child_catalog_changed()
+RETURNS trigger AS $$
+DECLARE
+    v_ids INTEGER[];
+    v_city VARCHAR;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT listing_id) INTO v_ids FROM new_rows WHERE listing_id IS NOT NULL;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(DISTINCT listing_id) INTO v_ids FROM old_rows WHERE listing_id IS NOT NULL;
+    ELSE
+        SELECT array_agg(DISTINCT listing_id) INTO v_ids
+        FROM (SELECT listing_id FROM new_rows UNION SELECT listing_id FROM old_rows) changed
+        WHERE listing_id IS NOT NULL;
+    END IF;
+
+    IF v_ids IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    -- Города в одном порядке: встречные записи не взаимоблокируются на catalog_snapshots
+    FOR v_city IN
+        SELECT DISTINCT city FROM t_p39732784_hourly_rentals_platf.listings
+        WHERE id = ANY(v_ids) AND city IS NOT NULL
+        ORDER BY city
+    LOOP
+        PERFORM t_p39732784_hourly_rentals_platf.bump_catalog_city(v_city);
+    END LOOP;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_listings_catalog_changed ON t_p39732784_hourly_rentals_platf.listings;
+CREATE TRIGGER trg_listings_catalog_changed
+AFTER INSERT OR UPDATE OR DELETE ON t_p39732784_hourly_rentals_platf.listings
+FOR EACH ROW EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listings_catalog_changed();
+
+DROP TRIGGER IF EXISTS trg_rooms_catalog_changed ON t_p39732784_hourly_rentals_platf.rooms;
+DROP TRIGGER IF EXISTS trg_rooms_catalog_changed_insert ON t_p39732784_hourly_rentals_platf.rooms;
+CREATE TRIGGER trg_rooms_catalog_changed_insert
+AFTER INSERT ON t_p39732784_hourly_rentals_platf.rooms
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listing_child_catalog_changed();
+
+DROP TRIGGER IF EXISTS trg_rooms_catalog_changed_update ON t_p39732784_hourly_rentals_platf.rooms;
+CREATE TRIGGER trg_rooms_catalog_changed_update
+AFTER UPDATE ON t_p39732784_hourly_rentals_platf.rooms
+REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listing_child_catalog_changed();
+
+DROP TRIGGER IF EXISTS trg_rooms_catalog_changed_delete ON t_p39732784_hourly_rentals_platf.rooms;
+CREATE TRIGGER trg_rooms_catalog_changed_delete
+AFTER DELETE ON t_p39732784_hourly_rentals_platf.rooms
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listing_child_catalog_changed();
+
+DROP TRIGGER IF EXISTS trg_metro_stations_catalog_changed ON t_p39732784_hourly_rentals_platf.metro_stations;
+DROP TRIGGER IF EXISTS trg_metro_stations_catalog_changed_insert ON t_p39732784_hourly_rentals_platf.metro_stations;
+CREATE TRIGGER trg_metro_stations_catalog_changed_insert
+AFTER INSERT ON t_p39732784_hourly_rentals_platf.metro_stations
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listing_child_catalog_changed();
+
+DROP TRIGGER IF EXISTS trg_metro_stations_catalog_changed_update ON t_p39732784_hourly_rentals_platf.metro_stations;
+CREATE TRIGGER trg_metro_stations_catalog_changed_update
+AFTER UPDATE ON t_p39732784_hourly_rentals_platf.metro_stations
+REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listing_child_catalog_changed();
+
+DROP TRIGGER IF EXISTS trg_metro_stations_catalog_changed_delete ON t_p39732784_hourly_rentals_platf.metro_stations;
+CREATE TRIGGER trg_metro_stations_catalog_changed_delete
+AFTER DELETE ON t_p39732784_hourly_rentals_platf.metro_stations
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listing_child_catalog_changed();
@@ -0,0 +1,131 @@
+-- Отслеживание изменений объектов для дельта-синхронизации каталога (public-listings ?since=)
+-- catalog_txid - id транзакции последнего изменения объекта или его комнат / метро,
+-- catalog_changed_at - время этого изменения (для since в виде даты, с часовым поясом:
+-- since от клиента с любым смещением сравнивается без учёта TimeZone сессии)
+ALTER TABLE t_p39732784_hourly_rentals_platf.listings
+ADD COLUMN IF NOT EXISTS catalog_txid BIGINT NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS catalog_changed_at TIMESTAMPTZ;
+
+-- Для существующих объектов время изменения берём из updated_at
+UPDATE t_p39732784_hourly_rentals_platf.listings
+SET catalog_changed_at = COALESCE(updated_at, created_at, CURRENT_TIMESTAMP)
+WHERE catalog_changed_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_listings_catalog_txid ON t_p39732784_hourly_rentals_platf.listings (catalog_txid);
+CREATE INDEX IF NOT EXISTS idx_listings_catalog_changed_at ON t_p39732784_hourly_rentals_platf.listings (catalog_changed_at);
+
+-- Удалённые навсегда объекты: клиенты должны убрать их из локальной копии
+CREATE TABLE IF NOT EXISTS t_p39732784_hourly_rentals_platf.listing_tombstones (
+    listing_id INTEGER PRIMARY KEY,
+    city VARCHAR(100),
+    catalog_txid BIGINT NOT NULL,
+    deleted_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_listing_tombstones_txid ON t_p39732784_hourly_rentals_platf.listing_tombstones (catalog_txid);
+CREATE INDEX IF NOT EXISTS idx_listing_tombstones_deleted_at ON t_p39732784_hourly_rentals_platf.listing_tombstones (deleted_at);
+
+COMMENT ON TABLE t_p39732784_hourly_rentals_platf.listing_tombstones IS 'Удалённые объекты для дельта-синхронизации каталога';
+
+-- Любое реальное изменение строки объекта помечается текущей транзакцией
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.listings_mark_changed()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW IS NOT DISTINCT FROM OLD THEN
+        RETURN NEW;
+    END IF;
+
+    NEW.catalog_txid := txid_current();
+    NEW.catalog_changed_at := CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_listings_mark_changed ON t_p39732784_hourly_rentals_platf.listings;
+CREATE TRIGGER trg_listings_mark_changed
+BEFORE INSERT OR UPDATE ON t_p39732784_hourly_rentals_platf.listings
+FOR EACH ROW EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listings_mark_changed();
+
+-- Удаление объекта оставляет tombstone
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.listings_write_tombstone()
+RETURNS trigger AS $$
+BEGIN
+    INSERT INTO t_p39732784_hourly_rentals_platf.listing_tombstones (listing_id, city, catalog_txid, deleted_at)
+    VALUES (OLD.id, OLD.city, txid_current(), CURRENT_TIMESTAMP)
+    ON CONFLICT (listing_id) DO UPDATE
+    SET city = EXCLUDED.city, catalog_txid = EXCLUDED.catalog_txid, deleted_at = EXCLUDED.deleted_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_listings_write_tombstone ON t_p39732784_hourly_rentals_platf.listings;
+CREATE TRIGGER trg_listings_write_tombstone
+AFTER DELETE ON t_p39732784_hourly_rentals_platf.listings
+FOR EACH ROW EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listings_write_tombstone();
+
+-- Изменение комнат / метро помечает объект; повторные записи в той же транзакции объект не трогают.
+-- Триггеры уровня оператора: каждый затронутый объект помечается один раз за оператор
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.listing_child_mark_changed()
+RETURNS trigger AS $$
+DECLARE
+    v_ids INTEGER[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT listing_id) INTO v_ids FROM new_rows WHERE listing_id IS NOT NULL;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(DISTINCT listing_id) INTO v_ids FROM old_rows WHERE listing_id IS NOT NULL;
+    ELSE
+        SELECT array_agg(DISTINCT listing_id) INTO v_ids
+        FROM (SELECT listing_id FROM new_rows UNION SELECT listing_id FROM old_rows) changed
+        WHERE listing_id IS NOT NULL;
+    END IF;
+
+    IF v_ids IS NOT NULL THEN
+        UPDATE t_p39732784_hourly_rentals_platf.listings
+        SET catalog_txid = txid_current()
+        WHERE id = ANY(v_ids) AND catalog_txid <> txid_current();
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_rooms_mark_changed ON t_p39732784_hourly_rentals_platf.rooms;
+
+DROP TRIGGER IF EXISTS trg_rooms_mark_changed_insert ON t_p39732784_hourly_rentals_platf.rooms;
+CREATE TRIGGER trg_rooms_mark_changed_insert
+AFTER INSERT ON t_p39732784_hourly_rentals_platf.rooms
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listing_child_mark_changed();
+
+DROP TRIGGER IF EXISTS trg_rooms_mark_changed_update ON t_p39732784_hourly_rentals_platf.rooms;
+CREATE TRIGGER trg_rooms_mark_changed_update
+AFTER UPDATE ON t_p39732784_hourly_rentals_platf.rooms
+REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listing_child_mark_changed();
+
+DROP TRIGGER IF EXISTS trg_rooms_mark_changed_delete ON t_p39732784_hourly_rentals_platf.rooms;
+CREATE TRIGGER trg_rooms_mark_changed_delete
+AFTER DELETE ON t_p39732784_hourly_rentals_platf.rooms
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listing_child_mark_changed();
+
+DROP TRIGGER IF EXISTS trg_metro_stations_mark_changed ON t_p39732784_hourly_rentals_platf.metro_stations;
+
+DROP TRIGGER IF EXISTS trg_metro_stations_mark_changed_insert ON t_p39732784_hourly_rentals_platf.metro_stations;
+CREATE TRIGGER trg_metro_stations_mark_changed_insert
+AFTER INSERT ON t_p39732784_hourly_rentals_platf.metro_stations
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listing_child_mark_changed();
+
+DROP TRIGGER IF EXISTS trg_metro_stations_mark_changed_update ON t_p39732784_hourly_rentals_platf.metro_stations;
+CREATE TRIGGER trg_metro_stations_mark_changed_update
+AFTER UPDATE ON t_p39732784_hourly_rentals_platf.metro_stations
+REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listing_child_mark_changed();
+
+DROP TRIGGER IF EXISTS trg_metro_stations_mark_changed_delete ON t_p39732784_hourly_rentals_platf.metro_stations;
+CREATE TRIGGER trg_metro_stations_mark_changed_delete
+AFTER DELETE ON t_p39732784_hourly_rentals_platf.metro_stations
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listing_child_mark_changed();
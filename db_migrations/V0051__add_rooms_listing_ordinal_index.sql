@@ -0,0 +1,7 @@
+-- Порядковый номер комнаты внутри объекта (room_index) определяется по id,
+-- составной индекс позволяет найти N-ю комнату без чтения строк с images
+CREATE INDEX IF NOT EXISTS idx_rooms_listing_id_id ON t_p39732784_hourly_rentals_platf.rooms (listing_id, id);
+
+-- В снимках каталога у комнат появился id - пересобираем все снимки
+UPDATE t_p39732784_hourly_rentals_platf.catalog_snapshots
+SET generation = generation + 1, updated_at = CURRENT_TIMESTAMP;
@@ -0,0 +1,7 @@
+-- Пространственный индекс для карты (public-listings ?bbox= / ?radius_km=)
+-- Встроенный тип point + GiST, расширения не нужны; индекс только по опубликованным объектам с координатами
+CREATE INDEX IF NOT EXISTS idx_listings_public_geo
+ON t_p39732784_hourly_rentals_platf.listings USING gist (point(lng::float8, lat::float8))
+WHERE is_archived = false
+  AND (moderation_status IS NULL OR moderation_status = 'approved')
+  AND lat IS NOT NULL AND lng IS NOT NULL;
@@ -0,0 +1,99 @@
+-- Серверный поиск объектов (public-listings ?search=)
+-- search_text - название, короткое название, город, район, метро и станции метро одной строкой,
+-- поддерживается триггерами; по нему строятся полнотекстовый и триграммный индексы
+ALTER TABLE t_p39732784_hourly_rentals_platf.listings
+ADD COLUMN IF NOT EXISTS search_text TEXT;
+
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.listings_build_search_text()
+RETURNS trigger AS $$
+BEGIN
+    NEW.search_text := concat_ws(' ',
+        NEW.title, NEW.short_title, NEW.city, NEW.district, NEW.metro,
+        (SELECT string_agg(station_name, ' ' ORDER BY station_name)
+         FROM t_p39732784_hourly_rentals_platf.metro_stations
+         WHERE listing_id = NEW.id)
+    );
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Имя триггера сортируется раньше trg_listings_mark_changed: тот видит уже собранную строку
+-- и не помечает объект изменённым, если search_text не поменялся
+DROP TRIGGER IF EXISTS trg_listings_build_search_text ON t_p39732784_hourly_rentals_platf.listings;
+CREATE TRIGGER trg_listings_build_search_text
+BEFORE INSERT OR UPDATE OF title, short_title, city, district, metro, search_text ON t_p39732784_hourly_rentals_platf.listings
+FOR EACH ROW EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listings_build_search_text();
+
+-- Станции метро хранятся отдельно: при их изменении пересобираем search_text объекта.
+-- Триггеры уровня оператора: объект пересобирается один раз за оператор
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.metro_stations_refresh_search()
+RETURNS trigger AS $$
+DECLARE
+    v_ids INTEGER[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT listing_id) INTO v_ids FROM new_rows WHERE listing_id IS NOT NULL;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(DISTINCT listing_id) INTO v_ids FROM old_rows WHERE listing_id IS NOT NULL;
+    ELSE
+        SELECT array_agg(DISTINCT listing_id) INTO v_ids
+        FROM (
+            SELECT n.listing_id FROM new_rows n JOIN old_rows o ON o.id = n.id
+            WHERE (n.listing_id, n.station_name) IS DISTINCT FROM (o.listing_id, o.station_name)
+            UNION SELECT o.listing_id FROM new_rows n JOIN old_rows o ON o.id = n.id
+            WHERE (n.listing_id, n.station_name) IS DISTINCT FROM (o.listing_id, o.station_name)
+        ) changed
+        WHERE listing_id IS NOT NULL;
+    END IF;
+
+    IF v_ids IS NOT NULL THEN
+        UPDATE t_p39732784_hourly_rentals_platf.listings SET search_text = NULL WHERE id = ANY(v_ids);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_metro_stations_refresh_search ON t_p39732784_hourly_rentals_platf.metro_stations;
+
+DROP TRIGGER IF EXISTS trg_metro_stations_refresh_search_insert ON t_p39732784_hourly_rentals_platf.metro_stations;
+CREATE TRIGGER trg_metro_stations_refresh_search_insert
+AFTER INSERT ON t_p39732784_hourly_rentals_platf.metro_stations
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.metro_stations_refresh_search();
+
+DROP TRIGGER IF EXISTS trg_metro_stations_refresh_search_update ON t_p39732784_hourly_rentals_platf.metro_stations;
+CREATE TRIGGER trg_metro_stations_refresh_search_update
+AFTER UPDATE ON t_p39732784_hourly_rentals_platf.metro_stations
+REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.metro_stations_refresh_search();
+
+DROP TRIGGER IF EXISTS trg_metro_stations_refresh_search_delete ON t_p39732784_hourly_rentals_platf.metro_stations;
+CREATE TRIGGER trg_metro_stations_refresh_search_delete
+AFTER DELETE ON t_p39732784_hourly_rentals_platf.metro_stations
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.metro_stations_refresh_search();
+
+-- Заполняем для существующих объектов (триггер соберёт строку)
+UPDATE t_p39732784_hourly_rentals_platf.listings SET search_text = NULL;
+
+CREATE INDEX IF NOT EXISTS idx_listings_search_fts
+ON t_p39732784_hourly_rentals_platf.listings USING gin (to_tsvector('russian', COALESCE(search_text, '')));
+
+-- Триграммы для поиска с опечатками. Если расширение недоступно,
+-- public-listings ищет по индексу в памяти, построенному из снимка каталога
+DO $$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+EXCEPTION WHEN insufficient_privilege OR undefined_file THEN
+    RAISE NOTICE 'pg_trgm недоступно, поиск с опечатками будет работать по индексу в памяти';
+END;
+$$;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        EXECUTE 'CREATE INDEX IF NOT EXISTS idx_listings_search_trgm
+                 ON t_p39732784_hourly_rentals_platf.listings USING gin (lower(search_text) gin_trgm_ops)';
+    END IF;
+END;
+$$;
@@ -0,0 +1,171 @@
+-- Словарь удобств и удобства объекта в битовой маске (public-listings ?amenities=)
+-- Каждое удобство получает номер: номера 0..62 - биты amenity_mask, остальные хранятся в массиве
+-- amenity_extra (GIN). Номера выдаются по порядку появления, поэтому биты достаются удобствам,
+-- которые уже есть в базе на момент миграции, а словарь не ограничен 63 названиями.
+-- Удобства объекта = удобства объекта + удобства всех его комнат.
+-- Поддерживаются триггерами, поэтому admin-listings, owner-listing-submission,
+-- room-categories и любые другие записи в listings / rooms обновляют их автоматически
+CREATE TABLE IF NOT EXISTS t_p39732784_hourly_rentals_platf.amenities (
+    bit INTEGER PRIMARY KEY CHECK (bit >= 0),
+    key VARCHAR(100) NOT NULL UNIQUE,
+    label VARCHAR(100) NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE t_p39732784_hourly_rentals_platf.amenities IS 'Словарь удобств: key - нормализованное название (Wi-Fi и WiFi совпадают), bit - номер удобства: 0..62 - бит в listings.amenity_mask, дальше - элемент listings.amenity_extra';
+
+ALTER TABLE t_p39732784_hourly_rentals_platf.listings
+ADD COLUMN IF NOT EXISTS amenity_mask BIGINT NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS amenity_extra INTEGER[] NOT NULL DEFAULT '{}';
+
+-- Нормализация названия: регистр, ё, пробелы и разделители
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.amenity_key(p_name TEXT)
+RETURNS TEXT AS $$
+    SELECT regexp_replace(translate(lower(btrim(p_name)), 'ё', 'е'), '[\s\-_./]+', '', 'g');
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Номера удобств массива; новые названия добавляются в словарь
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.amenity_numbers(p_features TEXT[])
+RETURNS INTEGER[] AS $$
+DECLARE
+    v_name TEXT;
+    v_key TEXT;
+    v_bit INTEGER;
+    v_numbers INTEGER[] := '{}';
+BEGIN
+    IF p_features IS NULL THEN
+        RETURN v_numbers;
+    END IF;
+
+    FOREACH v_name IN ARRAY p_features LOOP
+        v_key := t_p39732784_hourly_rentals_platf.amenity_key(v_name);
+        CONTINUE WHEN v_key IS NULL OR v_key = '';
+
+        SELECT bit INTO v_bit FROM t_p39732784_hourly_rentals_platf.amenities WHERE key = v_key;
+        IF NOT FOUND THEN
+            -- Новое удобство: выдаём следующий номер под блокировкой, чтобы параллельные записи не заняли один и тот же
+            PERFORM pg_advisory_xact_lock(hashtext('amenities_dictionary'));
+            SELECT bit INTO v_bit FROM t_p39732784_hourly_rentals_platf.amenities WHERE key = v_key;
+            IF NOT FOUND THEN
+                SELECT COALESCE(MAX(bit) + 1, 0) INTO v_bit FROM t_p39732784_hourly_rentals_platf.amenities;
+                INSERT INTO t_p39732784_hourly_rentals_platf.amenities (bit, key, label)
+                VALUES (v_bit, v_key, btrim(v_name));
+            END IF;
+        END IF;
+
+        v_numbers := v_numbers || v_bit;
+    END LOOP;
+
+    RETURN v_numbers;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Маска и номера сверх маски для объекта с удобствами p_features и его комнат
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.listing_amenities(
+    p_listing_id INTEGER, p_features TEXT[],
+    OUT amenity_mask BIGINT, OUT amenity_extra INTEGER[]
+) AS $$
+    SELECT COALESCE(bit_or(1::BIGINT << n) FILTER (WHERE n <= 62), 0),
+           COALESCE(array_agg(DISTINCT n ORDER BY n) FILTER (WHERE n > 62), '{}')
+    FROM unnest(
+        t_p39732784_hourly_rentals_platf.amenity_numbers(p_features)
+        || COALESCE((
+            SELECT array_agg(rn)
+            FROM t_p39732784_hourly_rentals_platf.rooms r,
+                 unnest(t_p39732784_hourly_rentals_platf.amenity_numbers(r.features)) AS rn
+            WHERE r.listing_id = p_listing_id
+        ), '{}')
+    ) AS n;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.listings_build_amenity_mask()
+RETURNS trigger AS $$
+BEGIN
+    SELECT a.amenity_mask, a.amenity_extra INTO NEW.amenity_mask, NEW.amenity_extra
+    FROM t_p39732784_hourly_rentals_platf.listing_amenities(NEW.id, NEW.features) a;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Имя сортируется раньше trg_listings_mark_changed: тот сравнивает строку уже с новой маской
+DROP TRIGGER IF EXISTS trg_listings_amenity_mask ON t_p39732784_hourly_rentals_platf.listings;
+CREATE TRIGGER trg_listings_amenity_mask
+BEFORE INSERT OR UPDATE OF features, amenity_mask, amenity_extra ON t_p39732784_hourly_rentals_platf.listings
+FOR EACH ROW EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listings_build_amenity_mask();
+
+-- Пересчёт удобств объектов; пишутся только строки, где что-то изменилось
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.refresh_listing_amenities(p_listing_ids INTEGER[])
+RETURNS void AS $$
+BEGIN
+    UPDATE t_p39732784_hourly_rentals_platf.listings l
+    SET amenity_mask = a.amenity_mask,
+        amenity_extra = a.amenity_extra
+    FROM t_p39732784_hourly_rentals_platf.listings s
+    CROSS JOIN LATERAL t_p39732784_hourly_rentals_platf.listing_amenities(s.id, s.features) a
+    WHERE s.id = ANY(p_listing_ids)
+      AND l.id = s.id
+      AND (l.amenity_mask, l.amenity_extra) IS DISTINCT FROM (a.amenity_mask, a.amenity_extra);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Комнаты: триггеры уровня оператора, каждый затронутый объект пересчитывается один раз
+-- за оператор (сохранение 40 комнат - один пересчёт объекта, а не 40)
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.rooms_refresh_amenity_mask()
+RETURNS trigger AS $$
+DECLARE
+    v_ids INTEGER[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT listing_id) INTO v_ids FROM new_rows WHERE listing_id IS NOT NULL;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(DISTINCT listing_id) INTO v_ids FROM old_rows WHERE listing_id IS NOT NULL;
+    ELSE
+        SELECT array_agg(DISTINCT listing_id) INTO v_ids
+        FROM (
+            SELECT n.listing_id FROM new_rows n JOIN old_rows o ON o.id = n.id
+            WHERE (n.listing_id, n.features) IS DISTINCT FROM (o.listing_id, o.features)
+            UNION SELECT o.listing_id FROM new_rows n JOIN old_rows o ON o.id = n.id
+            WHERE n.listing_id IS DISTINCT FROM o.listing_id
+        ) changed
+        WHERE listing_id IS NOT NULL;
+    END IF;
+
+    IF v_ids IS NOT NULL THEN
+        PERFORM t_p39732784_hourly_rentals_platf.refresh_listing_amenities(v_ids);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_rooms_refresh_amenity_mask ON t_p39732784_hourly_rentals_platf.rooms;
+
+DROP TRIGGER IF EXISTS trg_rooms_amenity_mask_insert ON t_p39732784_hourly_rentals_platf.rooms;
+CREATE TRIGGER trg_rooms_amenity_mask_insert
+AFTER INSERT ON t_p39732784_hourly_rentals_platf.rooms
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.rooms_refresh_amenity_mask();
+
+DROP TRIGGER IF EXISTS trg_rooms_amenity_mask_update ON t_p39732784_hourly_rentals_platf.rooms;
+CREATE TRIGGER trg_rooms_amenity_mask_update
+AFTER UPDATE ON t_p39732784_hourly_rentals_platf.rooms
+REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.rooms_refresh_amenity_mask();
+
+DROP TRIGGER IF EXISTS trg_rooms_amenity_mask_delete ON t_p39732784_hourly_rentals_platf.rooms;
+CREATE TRIGGER trg_rooms_amenity_mask_delete
+AFTER DELETE ON t_p39732784_hourly_rentals_platf.rooms
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.rooms_refresh_amenity_mask();
+
+-- Заполняем словарь и маски для существующих объектов
+UPDATE t_p39732784_hourly_rentals_platf.listings SET amenity_mask = 0;
+
+-- Условие (amenity_mask & m) = m проверяется по узкому индексу вместо разбора массивов features
+CREATE INDEX IF NOT EXISTS idx_listings_public_amenities
+ON t_p39732784_hourly_rentals_platf.listings (city, amenity_mask)
+WHERE is_archived = false AND (moderation_status IS NULL OR moderation_status = 'approved');
+
+-- Удобства сверх маски: amenity_extra @> ARRAY[...]
+CREATE INDEX IF NOT EXISTS idx_listings_public_amenity_extra
+ON t_p39732784_hourly_rentals_platf.listings USING GIN (amenity_extra)
+WHERE is_archived = false AND (moderation_status IS NULL OR moderation_status = 'approved');
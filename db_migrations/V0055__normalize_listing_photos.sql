@@ -0,0 +1,157 @@
+-- Нормализованное хранение фотографий в listing_photos (таблица из V0001 до сих пор не использовалась)
+-- Фото объекта (room_id IS NULL) и фото комнат, порядок position, главное фото - is_main.
+-- listings.image_url (JSON-массив или один URL) и rooms.images остаются для записи:
+-- триггеры раскладывают их в listing_photos, метаданные фото с тем же URL сохраняются
+ALTER TABLE t_p39732784_hourly_rentals_platf.listing_photos
+ADD COLUMN IF NOT EXISTS room_id INTEGER REFERENCES t_p39732784_hourly_rentals_platf.rooms(id) ON DELETE CASCADE,
+ADD COLUMN IF NOT EXISTS position SMALLINT NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS width INTEGER,
+ADD COLUMN IF NOT EXISTS height INTEGER,
+ADD COLUMN IF NOT EXISTS size_bytes INTEGER,
+ADD COLUMN IF NOT EXISTS content_type VARCHAR(50),
+ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+-- Удаление объекта удаляет и его фото
+ALTER TABLE t_p39732784_hourly_rentals_platf.listing_photos
+DROP CONSTRAINT IF EXISTS listing_photos_listing_id_fkey;
+ALTER TABLE t_p39732784_hourly_rentals_platf.listing_photos
+ADD CONSTRAINT listing_photos_listing_id_fkey
+FOREIGN KEY (listing_id) REFERENCES t_p39732784_hourly_rentals_platf.listings(id) ON DELETE CASCADE;
+
+-- Строки, не привязанные к объекту, раскладке не подлежат
+DELETE FROM t_p39732784_hourly_rentals_platf.listing_photos WHERE listing_id IS NULL;
+ALTER TABLE t_p39732784_hourly_rentals_platf.listing_photos ALTER COLUMN listing_id SET NOT NULL;
+
+-- Один URL - одна строка в пределах объекта / комнаты
+CREATE UNIQUE INDEX IF NOT EXISTS idx_listing_photos_owner_url
+ON t_p39732784_hourly_rentals_platf.listing_photos (listing_id, (COALESCE(room_id, 0)), photo_url);
+
+-- Главное фото объекта для списков: одно чтение индекса на объект
+CREATE UNIQUE INDEX IF NOT EXISTS idx_listing_photos_main
+ON t_p39732784_hourly_rentals_platf.listing_photos (listing_id)
+INCLUDE (photo_url)
+WHERE is_main AND room_id IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_listing_photos_room
+ON t_p39732784_hourly_rentals_platf.listing_photos (room_id, position)
+WHERE room_id IS NOT NULL;
+
+-- Разбор listings.image_url: JSON-массив URL или один URL
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.listing_image_urls(p_image_url TEXT)
+RETURNS TEXT[] AS $$
+BEGIN
+    IF p_image_url IS NULL OR btrim(p_image_url) = '' THEN
+        RETURN '{}';
+    END IF;
+    IF LEFT(p_image_url, 1) = '[' THEN
+        RETURN COALESCE(
+            (SELECT array_agg(value ORDER BY ord)
+             FROM json_array_elements_text(p_image_url::json) WITH ORDINALITY AS e(value, ord)
+             WHERE btrim(value) <> ''),
+            '{}'
+        );
+    END IF;
+    RETURN ARRAY[p_image_url];
+EXCEPTION WHEN invalid_text_representation THEN
+    RETURN '{}';
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- Привести фото объекта (p_room_id IS NULL) или комнаты к списку URL
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.sync_listing_photos(
+    p_listing_id INTEGER, p_room_id INTEGER, p_urls TEXT[]
+)
+RETURNS void AS $$
+DECLARE
+    v_main TEXT;
+BEGIN
+    SELECT url INTO v_main
+    FROM unnest(COALESCE(p_urls, '{}')) WITH ORDINALITY AS t(url, ord)
+    WHERE btrim(url) <> ''
+    ORDER BY ord
+    LIMIT 1;
+
+    DELETE FROM t_p39732784_hourly_rentals_platf.listing_photos p
+    WHERE p.listing_id = p_listing_id
+      AND p.room_id IS NOT DISTINCT FROM p_room_id
+      AND NOT (p.photo_url = ANY(COALESCE(p_urls, '{}')));
+
+    -- Прежнее главное фото снимается до вставки: иначе при смене главного фото
+    -- idx_listing_photos_main видит два is_main сразу (строки вставляются в порядке url)
+    UPDATE t_p39732784_hourly_rentals_platf.listing_photos p
+    SET is_main = false, updated_at = CURRENT_TIMESTAMP
+    WHERE p.listing_id = p_listing_id
+      AND p.room_id IS NOT DISTINCT FROM p_room_id
+      AND p.is_main
+      AND p.photo_url IS DISTINCT FROM v_main;
+
+    INSERT INTO t_p39732784_hourly_rentals_platf.listing_photos (listing_id, room_id, photo_url, position, is_main)
+    SELECT p_listing_id, p_room_id, u.url, u.ord - 1, u.url = v_main
+    FROM (
+        SELECT DISTINCT ON (url) url, ord
+        FROM unnest(COALESCE(p_urls, '{}')) WITH ORDINALITY AS t(url, ord)
+        WHERE btrim(url) <> ''
+        ORDER BY url, ord
+    ) u
+    ON CONFLICT (listing_id, (COALESCE(room_id, 0)), photo_url) DO UPDATE
+    SET position = EXCLUDED.position,
+        is_main = EXCLUDED.is_main,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE listing_photos.position IS DISTINCT FROM EXCLUDED.position
+       OR listing_photos.is_main IS DISTINCT FROM EXCLUDED.is_main;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.listings_sync_photos()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.image_url IS NOT DISTINCT FROM OLD.image_url THEN
+        RETURN NULL;
+    END IF;
+    PERFORM t_p39732784_hourly_rentals_platf.sync_listing_photos(
+        NEW.id, NULL, t_p39732784_hourly_rentals_platf.listing_image_urls(NEW.image_url)
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_listings_sync_photos ON t_p39732784_hourly_rentals_platf.listings;
+CREATE TRIGGER trg_listings_sync_photos
+AFTER INSERT OR UPDATE OF image_url ON t_p39732784_hourly_rentals_platf.listings
+FOR EACH ROW EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listings_sync_photos();
+
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.rooms_sync_photos()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.images IS NOT DISTINCT FROM OLD.images
+       AND NEW.listing_id IS NOT DISTINCT FROM OLD.listing_id THEN
+        RETURN NULL;
+    END IF;
+
+    -- Комнату перенесли в другой объект: её фото переезжают вместе с ней
+    IF TG_OP = 'UPDATE' AND NEW.listing_id IS DISTINCT FROM OLD.listing_id THEN
+        DELETE FROM t_p39732784_hourly_rentals_platf.listing_photos WHERE room_id = NEW.id;
+    END IF;
+
+    PERFORM t_p39732784_hourly_rentals_platf.sync_listing_photos(NEW.listing_id, NEW.id, NEW.images);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_rooms_sync_photos ON t_p39732784_hourly_rentals_platf.rooms;
+CREATE TRIGGER trg_rooms_sync_photos
+AFTER INSERT OR UPDATE OF images, listing_id ON t_p39732784_hourly_rentals_platf.rooms
+FOR EACH ROW EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.rooms_sync_photos();
+
+-- Перенос существующих фото
+SELECT t_p39732784_hourly_rentals_platf.sync_listing_photos(
+    l.id, NULL, t_p39732784_hourly_rentals_platf.listing_image_urls(l.image_url)
+)
+FROM t_p39732784_hourly_rentals_platf.listings l;
+
+SELECT t_p39732784_hourly_rentals_platf.sync_listing_photos(r.listing_id, r.id, r.images)
+FROM t_p39732784_hourly_rentals_platf.rooms r
+WHERE r.listing_id IS NOT NULL;
+
+-- Главное фото в каталоге теперь берётся из listing_photos - снимки пересобираются
+UPDATE t_p39732784_hourly_rentals_platf.catalog_snapshots SET generation = generation + 1;
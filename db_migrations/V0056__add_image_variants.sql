@@ -0,0 +1,85 @@
+-- Загруженные фото и их варианты (upload-image, admin-upload)
+-- url - основной вариант (full JPEG), который пишется в listings.image_url / rooms.images;
+-- variants - {thumb|card|full: {webp, jpeg, width, height}}
+CREATE TABLE IF NOT EXISTS t_p39732784_hourly_rentals_platf.images (
+    id SERIAL PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    storage_key TEXT NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    size_bytes INTEGER,
+    content_type VARCHAR(50),
+    variants JSONB NOT NULL DEFAULT '{}',
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON TABLE t_p39732784_hourly_rentals_platf.images IS 'Загруженные фото: размеры и ссылки на варианты thumb/card/full в WebP и JPEG';
+
+ALTER TABLE t_p39732784_hourly_rentals_platf.listing_photos
+ADD COLUMN IF NOT EXISTS variants JSONB;
+
+-- Раскладка фото подхватывает размеры и варианты из images по URL
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.sync_listing_photos(
+    p_listing_id INTEGER, p_room_id INTEGER, p_urls TEXT[]
+)
+RETURNS void AS $$
+DECLARE
+    v_main TEXT;
+BEGIN
+    SELECT url INTO v_main
+    FROM unnest(COALESCE(p_urls, '{}')) WITH ORDINALITY AS t(url, ord)
+    WHERE btrim(url) <> ''
+    ORDER BY ord
+    LIMIT 1;
+
+    DELETE FROM t_p39732784_hourly_rentals_platf.listing_photos p
+    WHERE p.listing_id = p_listing_id
+      AND p.room_id IS NOT DISTINCT FROM p_room_id
+      AND NOT (p.photo_url = ANY(COALESCE(p_urls, '{}')));
+
+    -- Прежнее главное фото снимается до вставки: иначе при смене главного фото
+    -- idx_listing_photos_main видит два is_main сразу (строки вставляются в порядке url)
+    UPDATE t_p39732784_hourly_rentals_platf.listing_photos p
+    SET is_main = false, updated_at = CURRENT_TIMESTAMP
+    WHERE p.listing_id = p_listing_id
+      AND p.room_id IS NOT DISTINCT FROM p_room_id
+      AND p.is_main
+      AND p.photo_url IS DISTINCT FROM v_main;
+
+    INSERT INTO t_p39732784_hourly_rentals_platf.listing_photos (
+        listing_id, room_id, photo_url, position, is_main,
+        width, height, size_bytes, content_type, variants
+    )
+    SELECT p_listing_id, p_room_id, u.url, u.ord - 1, u.url = v_main,
+           i.width, i.height, i.size_bytes, i.content_type, i.variants
+    FROM (
+        SELECT DISTINCT ON (url) url, ord
+        FROM unnest(COALESCE(p_urls, '{}')) WITH ORDINALITY AS t(url, ord)
+        WHERE btrim(url) <> ''
+        ORDER BY url, ord
+    ) u
+    LEFT JOIN t_p39732784_hourly_rentals_platf.images i ON i.url = u.url
+    ON CONFLICT (listing_id, (COALESCE(room_id, 0)), photo_url) DO UPDATE
+    SET position = EXCLUDED.position,
+        is_main = EXCLUDED.is_main,
+        width = COALESCE(listing_photos.width, EXCLUDED.width),
+        height = COALESCE(listing_photos.height, EXCLUDED.height),
+        size_bytes = COALESCE(listing_photos.size_bytes, EXCLUDED.size_bytes),
+        content_type = COALESCE(listing_photos.content_type, EXCLUDED.content_type),
+        variants = COALESCE(listing_photos.variants, EXCLUDED.variants),
+        updated_at = CURRENT_TIMESTAMP
+    WHERE listing_photos.position IS DISTINCT FROM EXCLUDED.position
+       OR listing_photos.is_main IS DISTINCT FROM EXCLUDED.is_main
+       OR (listing_photos.variants IS NULL AND EXCLUDED.variants IS NOT NULL);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Карточки каталога читают главное фото вместе с вариантами из индекса
+DROP INDEX IF EXISTS t_p39732784_hourly_rentals_platf.idx_listing_photos_main;
+CREATE UNIQUE INDEX idx_listing_photos_main
+ON t_p39732784_hourly_rentals_platf.listing_photos (listing_id)
+INCLUDE (photo_url, variants)
+WHERE is_main AND room_id IS NULL;
+
+-- В каталоге теперь вариант card - снимки пересобираются
+UPDATE t_p39732784_hourly_rentals_platf.catalog_snapshots SET generation = generation + 1;
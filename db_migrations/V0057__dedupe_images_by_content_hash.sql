@@ -0,0 +1,113 @@
+-- Дедупликация загрузок по хешу содержимого и счётчик ссылок на фото
+-- upload-image / admin-upload ищут фото по content_hash (SHA-256 исходных байтов) и при совпадении
+-- возвращают готовую ссылку без записи в хранилище.
+-- ref_count - сколько раз фото используется: фото объектов и комнат (listing_photos) и логотипы;
+-- released_at - когда ссылок не осталось, от этой даты отсчитывается срок до удаления из хранилища
+ALTER TABLE t_p39732784_hourly_rentals_platf.images
+ADD COLUMN IF NOT EXISTS content_hash CHAR(64),
+ADD COLUMN IF NOT EXISTS ref_count INTEGER NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS released_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_images_content_hash
+ON t_p39732784_hourly_rentals_platf.images (content_hash)
+WHERE content_hash IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_images_released
+ON t_p39732784_hourly_rentals_platf.images (released_at)
+WHERE ref_count = 0;
+
+COMMENT ON COLUMN t_p39732784_hourly_rentals_platf.images.ref_count IS 'Число ссылок из listing_photos и listings.logo_url';
+COMMENT ON COLUMN t_p39732784_hourly_rentals_platf.images.released_at IS 'Когда ref_count стал 0 (NULL, пока фото используется)';
+
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.image_add_ref(p_url TEXT, p_delta INTEGER)
+RETURNS void AS $$
+BEGIN
+    IF p_url IS NULL OR p_delta = 0 THEN
+        RETURN;
+    END IF;
+    UPDATE t_p39732784_hourly_rentals_platf.images
+    SET ref_count = GREATEST(ref_count + p_delta, 0),
+        released_at = CASE
+            WHEN ref_count + p_delta <= 0 THEN COALESCE(released_at, CURRENT_TIMESTAMP)
+            ELSE NULL
+        END
+    WHERE url = p_url;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.listing_photos_count_refs()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.photo_url IS NOT DISTINCT FROM OLD.photo_url THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM t_p39732784_hourly_rentals_platf.image_add_ref(OLD.photo_url, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM t_p39732784_hourly_rentals_platf.image_add_ref(NEW.photo_url, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_listing_photos_count_refs ON t_p39732784_hourly_rentals_platf.listing_photos;
+CREATE TRIGGER trg_listing_photos_count_refs
+AFTER INSERT OR UPDATE OF photo_url OR DELETE ON t_p39732784_hourly_rentals_platf.listing_photos
+FOR EACH ROW EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listing_photos_count_refs();
+
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.listings_count_logo_refs()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.logo_url IS NOT DISTINCT FROM OLD.logo_url THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM t_p39732784_hourly_rentals_platf.image_add_ref(OLD.logo_url, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM t_p39732784_hourly_rentals_platf.image_add_ref(NEW.logo_url, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_listings_count_logo_refs ON t_p39732784_hourly_rentals_platf.listings;
+CREATE TRIGGER trg_listings_count_logo_refs
+AFTER INSERT OR UPDATE OF logo_url OR DELETE ON t_p39732784_hourly_rentals_platf.listings
+FOR EACH ROW EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listings_count_logo_refs();
+
+-- Фото, загруженное раньше, чем на него сослались: ссылки уже могут быть в listing_photos
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.images_init_refs()
+RETURNS trigger AS $$
+BEGIN
+    NEW.ref_count := (SELECT count(*) FROM t_p39732784_hourly_rentals_platf.listing_photos WHERE photo_url = NEW.url)
+        + (SELECT count(*) FROM t_p39732784_hourly_rentals_platf.listings WHERE logo_url = NEW.url);
+    NEW.released_at := CASE WHEN NEW.ref_count = 0 THEN CURRENT_TIMESTAMP END;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_images_init_refs ON t_p39732784_hourly_rentals_platf.images;
+CREATE TRIGGER trg_images_init_refs
+BEFORE INSERT ON t_p39732784_hourly_rentals_platf.images
+FOR EACH ROW EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.images_init_refs();
+
+CREATE INDEX IF NOT EXISTS idx_listing_photos_url
+ON t_p39732784_hourly_rentals_platf.listing_photos (photo_url);
+
+CREATE INDEX IF NOT EXISTS idx_listings_logo_url
+ON t_p39732784_hourly_rentals_platf.listings (logo_url)
+WHERE logo_url IS NOT NULL;
+
+-- Счётчики для уже загруженных фото
+UPDATE t_p39732784_hourly_rentals_platf.images i
+SET ref_count = refs.n,
+    released_at = CASE WHEN refs.n = 0 THEN CURRENT_TIMESTAMP END
+FROM (
+    SELECT i2.id,
+           (SELECT count(*) FROM t_p39732784_hourly_rentals_platf.listing_photos p WHERE p.photo_url = i2.url)
+           + (SELECT count(*) FROM t_p39732784_hourly_rentals_platf.listings l WHERE l.logo_url = i2.url) AS n
+    FROM t_p39732784_hourly_rentals_platf.images i2
+) refs
+WHERE refs.id = i.id;
@@ -0,0 +1,18 @@
+-- Постраничные списки админки по ключу сортировки (admin-listings, pagination.py)
+-- Каждая вкладка читает страницу по составному индексу с id для однозначного порядка:
+--   active     - auction_rank ASC, id ASC (ключ и индекс idx_listings_admin_active_rank - в V0059)
+--   archived   - created_at DESC, id DESC
+--   moderation - updated_at DESC, id DESC
+-- Сравнение строк (ключ, id) < (...) не работает с NULL, поэтому даты становятся NOT NULL
+UPDATE t_p39732784_hourly_rentals_platf.listings SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL;
+UPDATE t_p39732784_hourly_rentals_platf.listings SET updated_at = created_at WHERE updated_at IS NULL;
+
+ALTER TABLE t_p39732784_hourly_rentals_platf.listings
+ALTER COLUMN created_at SET NOT NULL,
+ALTER COLUMN updated_at SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_listings_admin_archived
+ON t_p39732784_hourly_rentals_platf.listings (is_archived, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_listings_admin_moderation
+ON t_p39732784_hourly_rentals_platf.listings (moderation_status, updated_at DESC, id DESC);
@@ -0,0 +1,173 @@
+-- Порядок объектов в городе по ключу auction_rank с промежутками вместо плотных номеров auction
+-- Перемещение объекта (admin-listings update_position) пишет одну строку: новый ключ - середина
+-- между соседями на новом месте. Соседи больше не сдвигаются UPDATE ... auction ± 1 по всему
+-- диапазону города, поэтому одновременные перестановки в большом городе не блокируют друг друга.
+-- auction остаётся номером позиции для показа (#N, ТОП-3): номера соседей пересчитывает
+-- rebalance_auction_city (cron-auction-rebalance), он же разрежает ключи, когда промежутки кончаются.
+ALTER TABLE t_p39732784_hourly_rentals_platf.listings
+ADD COLUMN IF NOT EXISTS auction_rank BIGINT;
+
+COMMENT ON COLUMN t_p39732784_hourly_rentals_platf.listings.auction_rank IS 'Ключ порядка объекта в городе (с промежутками); каталог и админка сортируют по нему';
+
+-- Ключи для существующих объектов: прежний порядок COALESCE(auction, 2147483647), id
+UPDATE t_p39732784_hourly_rentals_platf.listings l
+SET auction_rank = r.n * 65536
+FROM (
+    SELECT id, row_number() OVER (PARTITION BY city ORDER BY COALESCE(auction, 2147483647), id) AS n
+    FROM t_p39732784_hourly_rentals_platf.listings
+) r
+WHERE r.id = l.id;
+
+-- Разредить ключи города: шаг 65536 в текущем порядке; p_exclude_id не трогается
+-- (строка, для которой сейчас выполняется BEFORE-триггер)
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.auction_respace(p_city TEXT, p_exclude_id INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    v_changed INTEGER;
+BEGIN
+    UPDATE t_p39732784_hourly_rentals_platf.listings l
+    SET auction_rank = r.n * 65536
+    FROM (
+        SELECT id, row_number() OVER (ORDER BY auction_rank, id) AS n
+        FROM t_p39732784_hourly_rentals_platf.listings
+        WHERE city = p_city AND id <> p_exclude_id
+    ) r
+    WHERE r.id = l.id AND l.auction_rank IS DISTINCT FROM r.n * 65536;
+    GET DIAGNOSTICS v_changed = ROW_COUNT;
+    RETURN v_changed;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Ключ для позиции p_position (1 - первая) среди активных объектов города без p_exclude_id:
+-- середина между (p-1)-м и p-м объектом. NULL - между соседями не осталось места.
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.auction_rank_for(
+    p_city TEXT, p_position INTEGER, p_exclude_id INTEGER
+)
+RETURNS BIGINT AS $$
+DECLARE
+    v_position INTEGER := GREATEST(COALESCE(p_position, 2147483647), 1);
+    v_prev BIGINT;
+    v_next BIGINT;
+BEGIN
+    SELECT auction_rank INTO v_next
+    FROM t_p39732784_hourly_rentals_platf.listings
+    WHERE city = p_city AND is_archived = false AND id <> p_exclude_id
+    ORDER BY auction_rank, id
+    OFFSET v_position - 1 LIMIT 1;
+
+    IF v_next IS NULL THEN
+        -- Позиция за концом города: после последнего объекта (и архивных тоже)
+        SELECT MAX(auction_rank) INTO v_prev
+        FROM t_p39732784_hourly_rentals_platf.listings
+        WHERE city = p_city AND id <> p_exclude_id;
+        RETURN COALESCE(v_prev, 0) + 65536;
+    END IF;
+
+    IF v_position = 1 THEN
+        RETURN v_next - 65536;
+    END IF;
+
+    SELECT auction_rank INTO v_prev
+    FROM t_p39732784_hourly_rentals_platf.listings
+    WHERE city = p_city AND is_archived = false AND id <> p_exclude_id
+    ORDER BY auction_rank, id
+    OFFSET v_position - 2 LIMIT 1;
+
+    IF v_next - v_prev < 2 THEN
+        RETURN NULL;
+    END IF;
+    RETURN v_prev + (v_next - v_prev) / 2;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Запись auction напрямую (форма объекта, покупка продвижения, новый объект) ставит объект
+-- на позицию auction в своём городе. Не срабатывает, если ключ задан явно или идёт пересчёт
+-- (hourly_rentals.ranking = on).
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.listings_assign_auction_rank()
+RETURNS trigger AS $$
+BEGIN
+    IF current_setting('hourly_rentals.ranking', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
+    IF TG_OP = 'INSERT' AND NEW.auction_rank IS NOT NULL THEN
+        RETURN NEW;
+    END IF;
+    IF TG_OP = 'UPDATE' AND (
+        NEW.auction_rank IS DISTINCT FROM OLD.auction_rank
+        OR (NEW.auction IS NOT DISTINCT FROM OLD.auction AND NEW.city IS NOT DISTINCT FROM OLD.city)
+    ) THEN
+        RETURN NEW;
+    END IF;
+
+    NEW.auction_rank := t_p39732784_hourly_rentals_platf.auction_rank_for(NEW.city, NEW.auction, NEW.id);
+    IF NEW.auction_rank IS NULL THEN
+        PERFORM t_p39732784_hourly_rentals_platf.auction_respace(NEW.city, NEW.id);
+        NEW.auction_rank := t_p39732784_hourly_rentals_platf.auction_rank_for(NEW.city, NEW.auction, NEW.id);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_listings_assign_auction_rank ON t_p39732784_hourly_rentals_platf.listings;
+CREATE TRIGGER trg_listings_assign_auction_rank
+BEFORE INSERT OR UPDATE OF auction, city ON t_p39732784_hourly_rentals_platf.listings
+FOR EACH ROW EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listings_assign_auction_rank();
+
+ALTER TABLE t_p39732784_hourly_rentals_platf.listings
+ALTER COLUMN auction_rank SET NOT NULL;
+
+-- Фоновое выравнивание города: номера auction активных объектов с позицией (auction < 999)
+-- становятся их местом в порядке auction_rank; ключи разрежаются, если промежуток
+-- между соседями меньше 64. Возвращает число изменённых строк.
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.rebalance_auction_city(p_city TEXT)
+RETURNS INTEGER AS $$
+DECLARE
+    v_changed INTEGER := 0;
+    v_renumbered INTEGER;
+    v_min_gap BIGINT;
+BEGIN
+    -- Два выравнивания одного города одновременно не идут
+    IF NOT pg_try_advisory_xact_lock(hashtext('auction_rank:' || p_city)) THEN
+        RETURN 0;
+    END IF;
+    PERFORM set_config('hourly_rentals.ranking', 'on', true);
+
+    SELECT MIN(gap) INTO v_min_gap
+    FROM (
+        SELECT auction_rank - LAG(auction_rank) OVER (ORDER BY auction_rank, id) AS gap
+        FROM t_p39732784_hourly_rentals_platf.listings
+        WHERE city = p_city
+    ) g;
+    IF v_min_gap < 64 THEN
+        v_changed := t_p39732784_hourly_rentals_platf.auction_respace(p_city, 0);
+    END IF;
+
+    UPDATE t_p39732784_hourly_rentals_platf.listings l
+    SET auction = LEAST(r.n, 999)
+    FROM (
+        SELECT id, row_number() OVER (ORDER BY auction_rank, id) AS n
+        FROM t_p39732784_hourly_rentals_platf.listings
+        WHERE city = p_city AND is_archived = false
+    ) r
+    WHERE r.id = l.id AND l.auction < 999 AND l.auction <> LEAST(r.n, 999);
+    GET DIAGNOSTICS v_renumbered = ROW_COUNT;
+
+    PERFORM set_config('hourly_rentals.ranking', 'off', true);
+    RETURN v_changed + v_renumbered;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Порядок каталога (city, auction_rank, id) и активной вкладки админки (auction_rank, id)
+CREATE INDEX IF NOT EXISTS idx_listings_city_auction_rank
+ON t_p39732784_hourly_rentals_platf.listings (city, auction_rank, id)
+WHERE is_archived = false;
+
+CREATE INDEX IF NOT EXISTS idx_listings_admin_active_rank
+ON t_p39732784_hourly_rentals_platf.listings (auction_rank, id)
+WHERE is_archived = false;
+
+DROP INDEX IF EXISTS t_p39732784_hourly_rentals_platf.idx_listings_public_catalog_order;
+DROP INDEX IF EXISTS t_p39732784_hourly_rentals_platf.idx_listings_admin_active;
+
+-- Снимки каталога пересобираются в порядке auction_rank
+UPDATE t_p39732784_hourly_rentals_platf.catalog_snapshots SET generation = generation + 1;
@@ -0,0 +1,158 @@
+-- Сводные поля объекта, которые раньше считались по rooms при каждом чтении списка:
+-- число номеров, минимальная и максимальная цена номера, число фото и главное фото.
+-- Поддерживаются триггерами уровня оператора на rooms и listing_photos (по одному пересчёту
+-- на объект за оператор, в том числе для пакетной записи listing_write.py), поэтому
+-- карточки в списках строятся без чтения комнат.
+ALTER TABLE t_p39732784_hourly_rentals_platf.listings
+ADD COLUMN IF NOT EXISTS rooms_count INTEGER NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS min_room_price INTEGER,
+ADD COLUMN IF NOT EXISTS max_room_price INTEGER,
+ADD COLUMN IF NOT EXISTS photos_count INTEGER NOT NULL DEFAULT 0,
+ADD COLUMN IF NOT EXISTS primary_photo_url TEXT;
+
+COMMENT ON COLUMN t_p39732784_hourly_rentals_platf.listings.rooms_count IS 'Число номеров (триггер по rooms)';
+COMMENT ON COLUMN t_p39732784_hourly_rentals_platf.listings.min_room_price IS 'Минимальная цена номера (триггер по rooms)';
+COMMENT ON COLUMN t_p39732784_hourly_rentals_platf.listings.max_room_price IS 'Максимальная цена номера (триггер по rooms)';
+COMMENT ON COLUMN t_p39732784_hourly_rentals_platf.listings.photos_count IS 'Число фото объекта и его номеров (триггер по listing_photos)';
+COMMENT ON COLUMN t_p39732784_hourly_rentals_platf.listings.primary_photo_url IS 'Главное фото объекта, без него - первое фото первого номера (триггер по listing_photos)';
+
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.refresh_listing_room_aggregates(p_listing_ids INTEGER[])
+RETURNS void AS $$
+BEGIN
+    UPDATE t_p39732784_hourly_rentals_platf.listings l
+    SET rooms_count = a.rooms_count,
+        min_room_price = a.min_room_price,
+        max_room_price = a.max_room_price
+    FROM (
+        SELECT ids.id,
+               count(r.id)::integer AS rooms_count,
+               min(r.price) AS min_room_price,
+               max(r.price) AS max_room_price
+        FROM unnest(p_listing_ids) AS ids(id)
+        LEFT JOIN t_p39732784_hourly_rentals_platf.rooms r ON r.listing_id = ids.id
+        GROUP BY ids.id
+    ) a
+    WHERE l.id = a.id
+      AND (l.rooms_count, l.min_room_price, l.max_room_price)
+          IS DISTINCT FROM (a.rooms_count, a.min_room_price, a.max_room_price);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.refresh_listing_photo_aggregates(p_listing_ids INTEGER[])
+RETURNS void AS $$
+BEGIN
+    UPDATE t_p39732784_hourly_rentals_platf.listings l
+    SET photos_count = a.photos_count,
+        primary_photo_url = a.primary_photo_url
+    FROM (
+        SELECT ids.id,
+               (SELECT count(*)::integer FROM t_p39732784_hourly_rentals_platf.listing_photos p
+                WHERE p.listing_id = ids.id) AS photos_count,
+               (SELECT p.photo_url FROM t_p39732784_hourly_rentals_platf.listing_photos p
+                WHERE p.listing_id = ids.id
+                ORDER BY p.room_id IS NOT NULL, p.room_id, p.position, p.id
+                LIMIT 1) AS primary_photo_url
+        FROM unnest(p_listing_ids) AS ids(id)
+    ) a
+    WHERE l.id = a.id
+      AND (l.photos_count, l.primary_photo_url) IS DISTINCT FROM (a.photos_count, a.primary_photo_url);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Триггеры уровня оператора: затронутые объекты берутся из переходных таблиц
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.rooms_refresh_aggregates()
+RETURNS trigger AS $$
+DECLARE
+    v_ids INTEGER[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT listing_id) INTO v_ids FROM new_rows WHERE listing_id IS NOT NULL;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(DISTINCT listing_id) INTO v_ids FROM old_rows WHERE listing_id IS NOT NULL;
+    ELSE
+        SELECT array_agg(DISTINCT listing_id) INTO v_ids
+        FROM (
+            SELECT n.listing_id FROM new_rows n JOIN old_rows o ON o.id = n.id
+            WHERE (n.listing_id, n.price) IS DISTINCT FROM (o.listing_id, o.price)
+            UNION SELECT o.listing_id FROM new_rows n JOIN old_rows o ON o.id = n.id
+            WHERE n.listing_id IS DISTINCT FROM o.listing_id
+        ) changed
+        WHERE listing_id IS NOT NULL;
+    END IF;
+
+    IF v_ids IS NOT NULL THEN
+        PERFORM t_p39732784_hourly_rentals_platf.refresh_listing_room_aggregates(v_ids);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_rooms_aggregates_insert ON t_p39732784_hourly_rentals_platf.rooms;
+CREATE TRIGGER trg_rooms_aggregates_insert
+AFTER INSERT ON t_p39732784_hourly_rentals_platf.rooms
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.rooms_refresh_aggregates();
+
+DROP TRIGGER IF EXISTS trg_rooms_aggregates_update ON t_p39732784_hourly_rentals_platf.rooms;
+CREATE TRIGGER trg_rooms_aggregates_update
+AFTER UPDATE ON t_p39732784_hourly_rentals_platf.rooms
+REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.rooms_refresh_aggregates();
+
+DROP TRIGGER IF EXISTS trg_rooms_aggregates_delete ON t_p39732784_hourly_rentals_platf.rooms;
+CREATE TRIGGER trg_rooms_aggregates_delete
+AFTER DELETE ON t_p39732784_hourly_rentals_platf.rooms
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.rooms_refresh_aggregates();
+
+CREATE OR REPLACE FUNCTION t_p39732784_hourly_rentals_platf.listing_photos_refresh_aggregates()
+RETURNS trigger AS $$
+DECLARE
+    v_ids INTEGER[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT listing_id) INTO v_ids FROM new_rows;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(DISTINCT listing_id) INTO v_ids FROM old_rows;
+    ELSE
+        SELECT array_agg(DISTINCT listing_id) INTO v_ids
+        FROM (
+            SELECT n.listing_id FROM new_rows n JOIN old_rows o ON o.id = n.id
+            WHERE (n.listing_id, n.room_id, n.photo_url, n.position)
+                  IS DISTINCT FROM (o.listing_id, o.room_id, o.photo_url, o.position)
+            UNION SELECT o.listing_id FROM new_rows n JOIN old_rows o ON o.id = n.id
+            WHERE n.listing_id IS DISTINCT FROM o.listing_id
+        ) changed;
+    END IF;
+
+    IF v_ids IS NOT NULL THEN
+        PERFORM t_p39732784_hourly_rentals_platf.refresh_listing_photo_aggregates(v_ids);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_listing_photos_aggregates_insert ON t_p39732784_hourly_rentals_platf.listing_photos;
+CREATE TRIGGER trg_listing_photos_aggregates_insert
+AFTER INSERT ON t_p39732784_hourly_rentals_platf.listing_photos
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listing_photos_refresh_aggregates();
+
+DROP TRIGGER IF EXISTS trg_listing_photos_aggregates_update ON t_p39732784_hourly_rentals_platf.listing_photos;
+CREATE TRIGGER trg_listing_photos_aggregates_update
+AFTER UPDATE ON t_p39732784_hourly_rentals_platf.listing_photos
+REFERENCING NEW TABLE AS new_rows OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listing_photos_refresh_aggregates();
+
+DROP TRIGGER IF EXISTS trg_listing_photos_aggregates_delete ON t_p39732784_hourly_rentals_platf.listing_photos;
+CREATE TRIGGER trg_listing_photos_aggregates_delete
+AFTER DELETE ON t_p39732784_hourly_rentals_platf.listing_photos
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION t_p39732784_hourly_rentals_platf.listing_photos_refresh_aggregates();
+
+-- Сводные поля для существующих объектов
+SELECT t_p39732784_hourly_rentals_platf.refresh_listing_room_aggregates(array_agg(id))
+FROM t_p39732784_hourly_rentals_platf.listings;
+
+SELECT t_p39732784_hourly_rentals_platf.refresh_listing_photo_aggregates(array_agg(id))
+FROM t_p39732784_hourly_rentals_platf.listings;
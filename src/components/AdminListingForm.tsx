@@ -597,32 +597,11 @@ export default function AdminListingForm({ listing, token, onClose }: AdminListi
 
     setUploadingPhoto(true);
     try {
-      const reader = new FileReader();
-      const uploadPromise = new Promise<string>((resolve, reject) => {
-        reader.onload = async (event) => {
-          try {
-            const base64 = event.target?.result?.toString().split(',')[1];
-            if (!base64) {
-              reject('Ошибка чтения файла');
-              return;
-            }
-
-            const result = await api.uploadPhoto(token, base64, file.type);
-            
-            if (result.url) {
-              resolve(result.url);
-            } else {
-              reject('Не удалось получить URL фото');
-            }
-          } catch (err) {
-            reject(err);
-          }
-        };
-        reader.onerror = () => reject('Ошибка чтения файла');
-      });
-      
-      reader.readAsDataURL(file);
-      const url = await uploadPromise;
+      const result = await api.uploadPhoto(token, file);
+      if (!result.url) {
+        throw new Error('Не удалось получить URL фото');
+      }
+      const url = result.url;
       
       if (isRoomPhoto && roomIndex !== undefined) {
         const updatedRooms = [...formData.rooms];
@@ -654,32 +633,11 @@ export default function AdminListingForm({ listing, token, onClose }: AdminListi
 
     setUploadingLogo(true);
     try {
-      const reader = new FileReader();
-      const uploadPromise = new Promise<string>((resolve, reject) => {
-        reader.onload = async (event) => {
-          try {
-            const base64 = event.target?.result?.toString().split(',')[1];
-            if (!base64) {
-              reject('Ошибка чтения файла');
-              return;
-            }
-
-            const result = await api.uploadPhoto(token, base64, file.type);
-            
-            if (result.url) {
-              resolve(result.url);
-            } else {
-              reject('Не удалось получить URL логотипа');
-            }
-          } catch (err) {
-            reject(err);
-          }
-        };
-        reader.onerror = () => reject('Ошибка чтения файла');
-      });
-      
-      reader.readAsDataURL(file);
-      const url = await uploadPromise;
+      const result = await api.uploadPhoto(token, file);
+      if (!result.url) {
+        throw new Error('Не удалось получить URL логотипа');
+      }
+      const url = result.url;
       
       setFormData({ ...formData, logo_url: url });
       toast({
@@ -698,7 +656,7 @@ export default function AdminListingForm({ listing, token, onClose }: AdminListi
     }
   };
 
-  const compressImage = (file: File, maxWidth = 800, quality = 0.6): Promise<string> => {
+  const compressImage = (file: File, maxWidth = 1600, quality = 0.85): Promise<Blob> => {
     return new Promise((resolve, reject) => {
       const reader = new FileReader();
       reader.onload = (e) => {
@@ -729,11 +687,10 @@ export default function AdminListingForm({ listing, token, onClose }: AdminListi
                   return;
                 }
                 
-                // Проверяем размер (макс 2MB для base64)
-                const estimatedBase64Size = (blob.size * 4) / 3;
-                console.log(`Compressed size: ${blob.size} bytes (base64: ~${Math.round(estimatedBase64Size / 1024)}KB), quality: ${currentQuality}`);
+                // Проверяем размер (макс 2MB на фото)
+                console.log(`Compressed size: ${blob.size} bytes, quality: ${currentQuality}`);
                 
-                if (estimatedBase64Size > 2 * 1024 * 1024 && currentQuality > 0.3) {
+                if (blob.size > 2 * 1024 * 1024 && currentQuality > 0.3) {
                   // Слишком большой, уменьшаем качество
                   currentQuality -= 0.1;
                   console.log(`Too large, retrying with quality ${currentQuality}`);
@@ -741,18 +698,7 @@ export default function AdminListingForm({ listing, token, onClose }: AdminListi
                   return;
                 }
                 
-                const reader2 = new FileReader();
-                reader2.onload = () => {
-                  const base64 = reader2.result?.toString().split(',')[1];
-                  if (base64) {
-                    console.log(`Final base64 size: ${Math.round(base64.length / 1024)}KB`);
-                    resolve(base64);
-                  } else {
-                    reject('Ошибка чтения');
-                  }
-                };
-                reader2.onerror = reject;
-                reader2.readAsDataURL(blob);
+                resolve(blob);
               },
               'image/jpeg',
               currentQuality
@@ -795,38 +741,38 @@ export default function AdminListingForm({ listing, token, onClose }: AdminListi
     const uploadedUrls: string[] = [];
 
     try {
-      for (const file of files) {
-        console.log('Processing file:', file.name, file.type, file.size);
-        
-        // Сжимаем изображение
-        console.log('Compressing image...');
-        const base64 = await compressImage(file);
-        console.log('Compressed base64 length:', base64.length);
-
-        try {
-          console.log('Calling api.uploadPhoto...');
-          const uploadResult = await api.uploadPhoto(token, base64, 'image/jpeg');
-          console.log('Upload result:', uploadResult);
-          
-          if (uploadResult.url) {
-            console.log('Photo uploaded successfully:', uploadResult.url);
-            uploadedUrls.push(uploadResult.url);
-          } else {
-            console.error('No URL in upload result:', uploadResult);
-            throw new Error('Не удалось загрузить');
-          }
-        } catch (err) {
-          console.error('Upload API error:', err);
-          throw err;
+      // Сжимаем все фото, затем загружаем одним пакетом: хранилище принимает файлы параллельно
+      console.log('Compressing images...');
+      const compressed = await Promise.all(files.map((file) => compressImage(file)));
+
+      console.log('Calling api.uploadPhotos...');
+      const results = await api.uploadPhotos(token, compressed);
+      console.log('Upload results:', results);
+
+      const failed: string[] = [];
+      results.forEach((result, i) => {
+        if (result.ok) {
+          uploadedUrls.push(result.url);
+        } else {
+          failed.push(`${files[i].name}: ${result.error}`);
         }
+      });
+      if (failed.length > 0) {
+        toast({
+          title: 'Не все фото загружены',
+          description: failed.join('; '),
+          variant: 'destructive',
+        });
       }
 
       console.log('All photos uploaded:', uploadedUrls);
       setNewRoom({ ...newRoom, images: [...currentImages, ...uploadedUrls] });
-      toast({
-        title: 'Успешно',
-        description: `Загружено ${uploadedUrls.length} фото`,
-      });
+      if (uploadedUrls.length > 0) {
+        toast({
+          title: 'Успешно',
+          description: `Загружено ${uploadedUrls.length} фото`,
+        });
+      }
     } catch (error: any) {
       console.error('=== UPLOAD ROOM PHOTOS ERROR ===');
       console.error('Error:', error);
@@ -889,30 +835,23 @@ export default function AdminListingForm({ listing, token, onClose }: AdminListi
   const replaceRoomPhoto = async (index: number, file: File) => {
     setUploadingRoomPhotos(true);
     try {
-      const reader = new FileReader();
-      reader.onload = async (event) => {
-        const base64 = event.target?.result?.toString().split(',')[1];
-        if (!base64) return;
-
-        const result = await api.uploadPhoto(token, base64, file.type);
+      const result = await api.uploadPhoto(token, file);
+      
+      if (result.url) {
+        const currentImages = Array.isArray(newRoom.images) ? newRoom.images : [];
+        const updatedImages = [...currentImages];
+        updatedImages[index] = result.url;
         
-        if (result.url) {
-          const currentImages = Array.isArray(newRoom.images) ? newRoom.images : [];
-          const updatedImages = [...currentImages];
-          updatedImages[index] = result.url;
-          
-          setNewRoom({
-            ...newRoom,
-            images: updatedImages,
-          });
+        setNewRoom({
+          ...newRoom,
+          images: updatedImages,
+        });
 
-          toast({
-            title: 'Фото заменено',
-            description: 'Новое фото успешно загружено',
-          });
-        }
-      };
-      reader.readAsDataURL(file);
+        toast({
+          title: 'Фото заменено',
+          description: 'Новое фото успешно загружено',
+        });
+      }
     } catch (error: any) {
       toast({
         title: 'Ошибка',
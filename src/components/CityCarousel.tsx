@@ -29,6 +29,7 @@ type Listing = {
 interface CityCarouselProps {
   city: string;
   cityListings: Listing[];
+  totalCount?: number;
   onCardClick: (listing: Listing) => void;
   onPhoneClick: (phone: string, e: React.MouseEvent, listingId?: number) => void;
   getPositionInCity: (listing: Listing) => number;
@@ -37,12 +38,14 @@ interface CityCarouselProps {
 export default function CityCarousel({ 
   city, 
   cityListings, 
+  totalCount,
   onCardClick, 
   onPhoneClick,
   getPositionInCity 
 }: CityCarouselProps) {
   const scrollRef = useRef<HTMLDivElement>(null);
   const topListings = cityListings.slice(0, 5);
+  const total = totalCount ?? cityListings.length;
 
   const scroll = (direction: 'left' | 'right') => {
     if (scrollRef.current) {
@@ -99,14 +102,14 @@ export default function CityCarousel({
         </Button>
       </div>
 
-      {cityListings.length > 5 && (
+      {total > 5 && (
         <div className="text-center mt-4">
           <Button 
             variant="outline" 
             onClick={() => window.scrollTo({ top: 0, behavior: 'smooth' })}
             className="text-purple-600 hover:text-purple-700"
           >
-            Показать все {cityListings.length} объектов в {city}
+            Показать все {total} объектов в {city}
             <Icon name="ChevronUp" size={16} className="ml-2" />
           </Button>
         </div>
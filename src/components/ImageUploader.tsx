@@ -2,6 +2,7 @@ import { useState } from 'react';
 import { Button } from '@/components/ui/button';
 import Icon from '@/components/ui/icon';
 import { useToast } from '@/hooks/use-toast';
+import { api } from '@/lib/api';
 
 interface ImageUploaderProps {
   onUpload: (url: string) => void;
@@ -23,8 +24,7 @@ export default function ImageUploader({ onUpload, multiple = false }: ImageUploa
     setUploadProgress(0);
     setTotalFiles(totalCount);
 
-    const uploadPromises: Promise<void>[] = [];
-    let completed = 0;
+    const validFiles: File[] = [];
 
     for (let i = 0; i < files.length; i++) {
       const file = files[i];
@@ -47,71 +47,42 @@ export default function ImageUploader({ onUpload, multiple = false }: ImageUploa
         continue;
       }
 
-      const uploadPromise = new Promise<void>((resolve, reject) => {
-        const reader = new FileReader();
-        reader.onload = async (event) => {
-          try {
-            const base64 = event.target?.result as string;
-            console.log('[ImageUploader] Starting upload for:', file.name);
-            
-            const response = await fetch('https://functions.poehali.dev/32a4bee5-4d04-4b73-a903-52cec9a5cef6', {
-              method: 'POST',
-              headers: {
-                'Content-Type': 'application/json',
-              },
-              body: JSON.stringify({
-                image: base64,
-                filename: file.name,
-              }),
-            }).catch(err => {
-              console.error('[ImageUploader] Fetch failed:', err);
-              throw new Error('Не удалось подключиться к серверу. Проверьте интернет-соединение.');
-            });
-
-            console.log('[ImageUploader] Response status:', response.status);
-
-            if (!response.ok) {
-              const errorText = await response.text();
-              console.error('[ImageUploader] Error response:', errorText);
-              let errorMessage = 'Ошибка загрузки';
-              try {
-                const errorData = JSON.parse(errorText);
-                errorMessage = errorData.error || errorMessage;
-              } catch {
-                errorMessage = errorText || errorMessage;
-              }
-              throw new Error(errorMessage);
-            }
+      validFiles.push(file);
+    }
 
-            const data = await response.json();
-            console.log('[ImageUploader] Upload success:', data);
-            onUpload(data.url);
+    try {
+      if (validFiles.length > 0) {
+        // Все файлы одним пакетом: ссылки на загрузку и нарезка вариантов за два вызова функции
+        console.log('[ImageUploader] Starting upload for:', validFiles.map((file) => file.name));
+        const results = await api.uploadImages(localStorage.getItem('ownerToken') || '', validFiles);
+        let completed = 0;
+        results.forEach((result, i) => {
+          if (result.ok) {
+            onUpload(result.url);
             completed++;
-            setUploadProgress(Math.round((completed / totalCount) * 100));
-            toast({
-              title: 'Успешно',
-              description: 'Фото загружено',
-            });
-            resolve();
-          } catch (error: any) {
-            console.error('Upload error:', error);
+          } else {
             toast({
               title: 'Ошибка загрузки',
-              description: error.message || 'Не удалось загрузить фото',
+              description: `${validFiles[i].name}: ${result.error}`,
               variant: 'destructive',
             });
-            reject(error);
           }
-        };
-        reader.onerror = () => reject(new Error('Ошибка чтения файла'));
-        reader.readAsDataURL(file);
+        });
+        setUploadProgress(Math.round((completed / totalCount) * 100));
+        if (completed > 0) {
+          toast({
+            title: 'Успешно',
+            description: completed === 1 ? 'Фото загружено' : `Загружено ${completed} фото`,
+          });
+        }
+      }
+    } catch (error: any) {
+      console.error('Upload error:', error);
+      toast({
+        title: 'Ошибка загрузки',
+        description: error.message || 'Не удалось загрузить фото',
+        variant: 'destructive',
       });
-
-      uploadPromises.push(uploadPromise);
-    }
-
-    try {
-      await Promise.allSettled(uploadPromises);
     } finally {
       setIsUploading(false);
       setUploadProgress(0);
@@ -12,6 +12,7 @@ type Listing = {
   price: number;
   auction: number;
   image_url: string;
+  image_webp?: string | null;
   logo_url?: string;
   metro: string;
   metroWalk: number;
@@ -70,11 +71,15 @@ export default function ListingCard({
     >
       <div className="relative">
         {getFirstImage(listing.image_url) ? (
-          <img 
-            src={getFirstImage(listing.image_url)!} 
-            alt={listing.title} 
-            className="w-full h-48 object-cover group-hover:scale-105 transition-transform duration-300" 
-          />
+          <picture className="block">
+            {listing.image_webp && <source srcSet={listing.image_webp} type="image/webp" />}
+            <img 
+              src={getFirstImage(listing.image_url)!} 
+              alt={listing.title} 
+              loading="lazy"
+              className="w-full h-48 object-cover group-hover:scale-105 transition-transform duration-300" 
+            />
+          </picture>
         ) : (
           <div className="w-full h-48 bg-gradient-to-br from-purple-200 to-pink-200 flex items-center justify-center text-6xl">
             🏨
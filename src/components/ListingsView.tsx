@@ -43,32 +43,44 @@ type Listing = {
 
 interface ListingsViewProps {
   filteredListings: Listing[];
+  mapListings?: Listing[];
   selectedCity: string;
+  showCarousels?: boolean;
   showMap: boolean;
   selectedListing: number | null;
   onListingSelect: (id: number | null) => void;
   onToggleMap: () => void;
   onCardClick: (listing: Listing) => void;
   isLoading?: boolean;
+  totalCount?: number;
+  cityTotals?: Record<string, number>;
+  hasMore?: boolean;
+  isLoadingMore?: boolean;
+  onLoadMore?: () => void;
 }
 
 export default function ListingsView({
   filteredListings,
+  mapListings,
   selectedCity,
+  showCarousels,
   showMap,
   selectedListing,
   onListingSelect,
   onToggleMap,
   onCardClick,
   isLoading = false,
+  totalCount,
+  cityTotals = {},
+  hasMore = false,
+  isLoadingMore = false,
+  onLoadMore,
 }: ListingsViewProps) {
   const [sortBy, setSortBy] = useState<string>('auction');
   const [phoneModalOpen, setPhoneModalOpen] = useState(false);
   const [selectedPhone, setSelectedPhone] = useState('');
   const [selectedListingId, setSelectedListingId] = useState<number | null>(null);
   const [isLoadingPhone, setIsLoadingPhone] = useState(false);
-  const [currentPage, setCurrentPage] = useState(1);
-  const ITEMS_PER_PAGE = 30;
 
   const sortedListings = [...filteredListings].sort((a, b) => {
     switch (sortBy) {
@@ -144,18 +156,12 @@ export default function ListingsView({
     }
   };
 
-  const showCityCarousels = selectedCity === 'Все города';
-
-  const totalPages = Math.ceil(sortedListings.length / ITEMS_PER_PAGE);
-  const paginatedListings = sortedListings.slice(
-    (currentPage - 1) * ITEMS_PER_PAGE,
-    currentPage * ITEMS_PER_PAGE
-  );
+  const showCityCarousels = showCarousels ?? selectedCity === 'Все города';
 
   if (showMap) {
     return (
       <MapView
-        listings={filteredListings}
+        listings={mapListings ?? filteredListings}
         selectedListing={selectedListing}
         onListingSelect={onListingSelect}
         onToggleMap={onToggleMap}
@@ -188,7 +194,7 @@ export default function ListingsView({
         <div className="flex items-center gap-3">
           <Badge variant="outline" className="text-lg px-4 py-2">
             <Icon name="Building2" size={18} className="mr-2" />
-            {sortedListings.length} объектов
+            {totalCount ?? sortedListings.length} объектов
           </Badge>
         </div>
 
@@ -222,6 +228,7 @@ export default function ListingsView({
               key={city} 
               city={city} 
               cityListings={cityListings}
+              totalCount={cityTotals[city]}
               onCardClick={onCardClick}
               onPhoneClick={handlePhoneClick}
               getPositionInCity={getPositionInCity}
@@ -231,7 +238,7 @@ export default function ListingsView({
       ) : (
         <>
           <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
-            {paginatedListings.map((listing) => (
+            {sortedListings.map((listing) => (
               <ListingCard
                 key={listing.id}
                 listing={listing}
@@ -242,37 +249,15 @@ export default function ListingsView({
             ))}
           </div>
 
-          {totalPages > 1 && (
-            <div className="flex justify-center gap-2 mt-8">
-              <Button
-                variant="outline"
-                onClick={() => setCurrentPage(p => Math.max(1, p - 1))}
-                disabled={currentPage === 1}
-              >
-                <Icon name="ChevronLeft" size={18} />
-                Назад
-              </Button>
-              
-              <div className="flex items-center gap-2">
-                {Array.from({ length: totalPages }, (_, i) => i + 1).map(page => (
-                  <Button
-                    key={page}
-                    variant={currentPage === page ? "default" : "outline"}
-                    onClick={() => setCurrentPage(page)}
-                    className="w-10"
-                  >
-                    {page}
-                  </Button>
-                ))}
-              </div>
-
+          {hasMore && onLoadMore && (
+            <div className="flex justify-center mt-8">
               <Button
                 variant="outline"
-                onClick={() => setCurrentPage(p => Math.min(totalPages, p + 1))}
-                disabled={currentPage === totalPages}
+                onClick={onLoadMore}
+                disabled={isLoadingMore}
               >
-                Вперёд
-                <Icon name="ChevronRight" size={18} />
+                {isLoadingMore ? 'Загрузка...' : 'Показать ещё'}
+                <Icon name="ChevronDown" size={18} />
               </Button>
             </div>
           )}
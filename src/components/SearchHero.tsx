@@ -1,7 +1,17 @@
+import { useState, useEffect } from 'react';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
 import { Badge } from '@/components/ui/badge';
 import Icon from '@/components/ui/icon';
+import { api } from '@/lib/api';
+
+type Suggestion = { kind: 'city' | 'district' | 'metro'; name: string; city: string | null; count: number };
+
+const SUGGESTION_LABELS: Record<Suggestion['kind'], string> = {
+  city: 'Город',
+  district: 'Район',
+  metro: 'Метро',
+};
 
 interface SearchHeroProps {
   searchCity: string;
@@ -46,6 +56,30 @@ export default function SearchHero({
     { name: 'PlayStation', icon: 'Gamepad2' },
   ];
 
+  const [suggestions, setSuggestions] = useState<Suggestion[]>([]);
+
+  // Подсказки городов, районов и метро с сервера после паузы в наборе
+  useEffect(() => {
+    const prefix = searchCity.trim();
+    if (prefix.length < 2) {
+      setSuggestions([]);
+      return;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const data = await api.getSuggestions(prefix, undefined, selectedCity);
+        if (!cancelled) setSuggestions(data.suggestions || []);
+      } catch (error) {
+        console.error('Failed to load suggestions:', error);
+      }
+    }, 250);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchCity, selectedCity]);
+
   const toggleFeature = (feature: string) => {
     setSelectedFeatures(prev => 
       prev.includes(feature) 
@@ -99,7 +133,18 @@ export default function SearchHero({
                   className="pl-10 h-10 sm:h-12 text-base sm:text-lg border-purple-200"
                   value={searchCity}
                   onChange={(e) => setSearchCity(e.target.value)}
+                  list="search-suggestions"
+                  autoComplete="off"
                 />
+                <datalist id="search-suggestions">
+                  {suggestions.map((item) => (
+                    <option
+                      key={`${item.kind}-${item.name}-${item.city ?? ''}`}
+                      value={item.name}
+                      label={`${SUGGESTION_LABELS[item.kind]}${item.city ? `, ${item.city}` : ''} · ${item.count}`}
+                    />
+                  ))}
+                </datalist>
               </div>
             </div>
 
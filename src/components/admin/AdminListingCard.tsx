@@ -36,8 +36,8 @@ const AdminListingCard = memo(function AdminListingCard({
   return (
     <Card className={listing.is_archived ? 'opacity-60' : ''}>
       <div className="relative">
-        {listing.image_url ? (
-          <img src={listing.image_url} alt={listing.title} className="h-48 w-full object-cover" />
+        {listing.primary_photo_url || listing.image_url ? (
+          <img src={listing.primary_photo_url || listing.image_url} alt={listing.title} className="h-48 w-full object-cover" />
         ) : (
           <div className="h-48 bg-gradient-to-br from-purple-200 to-pink-200 flex items-center justify-center text-6xl">
             🏨
@@ -108,7 +108,7 @@ const AdminListingCard = memo(function AdminListingCard({
           </div>
           <div className="flex items-center justify-between">
             <span className="text-sm text-muted-foreground">Номеров:</span>
-            <span className="font-semibold">{listing.rooms?.length || 0}</span>
+            <span className="font-semibold">{listing.rooms_count ?? listing.rooms?.length ?? 0}</span>
           </div>
           <div className="flex items-center justify-between pt-2 border-t">
             <span className="text-sm text-muted-foreground">Подписка:</span>
@@ -2,6 +2,7 @@ const API_URLS = {
   adminAuth: 'https://functions.poehali.dev/f446518c-113b-41ed-8bdc-17ef6babda08',
   adminListings: 'https://functions.poehali.dev/5dea57de-4652-4870-b39f-6b34e594bc21',
   adminUpload: 'https://functions.poehali.dev/22c1da70-b8a6-4b5e-81b8-330b559a8943',
+  uploadImage: 'https://functions.poehali.dev/32a4bee5-4d04-4b73-a903-52cec9a5cef6',
   adminOwners: 'https://functions.poehali.dev/25475092-b74f-493d-a43c-082847302085',
   adminEmployees: 'https://functions.poehali.dev/ca59381a-030d-421c-8c98-057bb7ae12e4',
   employeeBonuses: 'https://functions.poehali.dev/e7b4566b-8aa8-4db2-a866-4ba2231208a3',
@@ -20,6 +21,145 @@ const API_URLS = {
   getVirtualNumber: 'https://functions.poehali.dev/4a500ec2-2f33-49d9-87d0-3779d8d52ae5',
 };
 
+export type UploadedPhoto = {
+  url: string;
+  width: number;
+  height: number;
+  variants: Record<string, { webp: string; jpeg: string; width: number; height: number }>;
+};
+
+export type UploadResult = ({ ok: true } & UploadedPhoto) | { ok: false; error: string };
+
+const callUpload = async (endpoint: string, headers: Record<string, string>, payload: Record<string, unknown>) => {
+  const response = await fetch(endpoint, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', ...headers },
+    body: JSON.stringify(payload),
+  });
+  const data = await response.json().catch(() => ({ error: 'Network error' }));
+  if (!response.ok) {
+    throw new Error(data.error || `HTTP ${response.status}`);
+  }
+  return data;
+};
+
+// SHA-256 содержимого: подсказка для confirm_batch, функция находит готовые фото пакета одним запросом
+// и засчитывает совпадение, только если её собственный хеш загруженных байтов такой же
+const sha256Hex = async (file: Blob): Promise<string | undefined> => {
+  if (!globalThis.crypto?.subtle) {
+    return undefined;
+  }
+  const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest)).map((byte) => byte.toString(16).padStart(2, '0')).join('');
+};
+
+// Отправка файла по ссылкам presign (PUT или части multipart) -> параметры для confirm
+const putToStorage = async (presigned: any, file: Blob) => {
+  if (presigned.upload_id) {
+    const parts = await Promise.all(
+      presigned.parts.map(async (part: { part_number: number; url: string }) => {
+        const start = (part.part_number - 1) * presigned.part_size;
+        const response = await fetch(part.url, { method: 'PUT', body: file.slice(start, start + presigned.part_size) });
+        if (!response.ok) {
+          throw new Error(`Не удалось загрузить часть ${part.part_number}`);
+        }
+        return { part_number: part.part_number, etag: response.headers.get('ETag') };
+      })
+    );
+    return { key: presigned.key, upload_id: presigned.upload_id, parts };
+  }
+
+  const response = await fetch(presigned.url, { method: 'PUT', headers: presigned.headers, body: file });
+  if (!response.ok) {
+    throw new Error(`Не удалось загрузить файл: HTTP ${response.status}`);
+  }
+  return { key: presigned.key };
+};
+
+// Загрузка файла напрямую в хранилище: presign -> PUT (или части multipart) -> confirm
+const uploadDirect = async (endpoint: string, headers: Record<string, string>, file: Blob): Promise<UploadedPhoto> => {
+  const presigned = await callUpload(endpoint, headers, {
+    action: 'presign', content_type: file.type || 'image/jpeg', size: file.size,
+  });
+  const uploaded = await putToStorage(presigned, file);
+  return callUpload(endpoint, headers, { action: 'confirm', ...uploaded });
+};
+
+// Один пакет: presign_batch -> параллельные PUT -> confirm_batch
+const uploadChunk = async (endpoint: string, headers: Record<string, string>, files: Blob[]): Promise<UploadResult[]> => {
+  const results: UploadResult[] = files.map(() => ({ ok: false, error: 'Не удалось загрузить фото' }));
+  const presigned = await callUpload(endpoint, headers, {
+    action: 'presign_batch',
+    files: files.map((file) => ({ content_type: file.type || 'image/jpeg', size: file.size })),
+  });
+
+  const uploads: { index: number; upload: Record<string, unknown> }[] = [];
+  await Promise.all(
+    presigned.items.map(async (item: any) => {
+      if (!item.ok) {
+        results[item.index] = { ok: false, error: item.error };
+        return;
+      }
+      try {
+        const [upload, sha256] = await Promise.all([putToStorage(item, files[item.index]), sha256Hex(files[item.index])]);
+        uploads.push({ index: item.index, upload: { ...upload, sha256 } });
+      } catch (error: any) {
+        results[item.index] = { ok: false, error: error?.message || 'Не удалось загрузить фото' };
+      }
+    })
+  );
+  if (uploads.length === 0) {
+    return results;
+  }
+
+  const confirmed = await callUpload(endpoint, headers, {
+    action: 'confirm_batch',
+    uploads: uploads.map((entry) => entry.upload),
+  });
+  confirmed.items.forEach((item: any) => {
+    const { index, ...rest } = item;
+    results[uploads[index].index] = rest;
+  });
+  return results;
+};
+
+// Не больше файлов за вызов, чем принимает функция (images.MAX_BATCH_SIZE)
+const UPLOAD_BATCH_SIZE = 30;
+
+// Пакетная загрузка: одна пара presign_batch / confirm_batch на пакет, результат по каждому файлу
+const uploadDirectBatch = async (endpoint: string, headers: Record<string, string>, files: Blob[]): Promise<UploadResult[]> => {
+  const results: UploadResult[] = [];
+  for (let start = 0; start < files.length; start += UPLOAD_BATCH_SIZE) {
+    results.push(...await uploadChunk(endpoint, headers, files.slice(start, start + UPLOAD_BATCH_SIZE)));
+  }
+  return results;
+};
+
+// Фильтры публичного каталога (catalog.parse_filters в public-listings)
+export type CatalogFilters = {
+  city?: string;
+  type?: string;
+  parking?: boolean;
+  maxHours?: number | null;
+  priceMin?: number;
+  priceMax?: number;
+  q?: string;
+  amenities?: string[];
+};
+
+const catalogParams = (filters: CatalogFilters = {}) => {
+  const params = new URLSearchParams();
+  if (filters.city) params.set('city', filters.city);
+  if (filters.type) params.set('type', filters.type);
+  if (filters.parking) params.set('parking', 'true');
+  if (filters.amenities?.length) params.set('amenities', filters.amenities.join(','));
+  if (filters.maxHours != null) params.set('max_hours', String(filters.maxHours));
+  if (filters.priceMin != null) params.set('price_min', String(filters.priceMin));
+  if (filters.priceMax != null) params.set('price_max', String(filters.priceMax));
+  if (filters.q) params.set('q', filters.q);
+  return params;
+};
+
 export const api = {
   // Авторизация
   login: async (login: string, password: string) => {
@@ -234,46 +374,83 @@ export const api = {
     return response.json();
   },
 
-  // Загрузка фото
-  uploadPhoto: async (token: string, imageBase64: string, contentType: string) => {
-    console.log('[API] Uploading photo...');
-    console.log('[API] URL:', API_URLS.adminUpload);
-    console.log('[API] Content-Type:', contentType);
-    console.log('[API] Base64 length:', imageBase64.length);
-    
-    const response = await fetch(API_URLS.adminUpload, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-        'Authorization': `Bearer ${token}`,
-      },
-      body: JSON.stringify({ image: imageBase64, contentType }),
-    });
-    
-    console.log('[API] Response status:', response.status);
-    console.log('[API] Response headers:', Object.fromEntries(response.headers.entries()));
-    
+  // Загрузка фото (админка)
+  uploadPhoto: (token: string, file: Blob) =>
+    uploadDirect(API_URLS.adminUpload, { 'Authorization': `Bearer ${token}` }, file),
+
+  // Пакетная загрузка фото (админка)
+  uploadPhotos: (token: string, files: Blob[]) =>
+    uploadDirectBatch(API_URLS.adminUpload, { 'Authorization': `Bearer ${token}` }, files),
+
+  // Загрузка фото владельцем (токен из owner-auth)
+  uploadImage: (token: string, file: Blob) =>
+    uploadDirect(API_URLS.uploadImage, { 'X-Authorization': `Bearer ${token}` }, file),
+
+  uploadImages: (token: string, files: Blob[]) =>
+    uploadDirectBatch(API_URLS.uploadImage, { 'X-Authorization': `Bearer ${token}` }, files),
+
+  // Получение деталей номера с фотографиями
+  getRoomDetails: async (listingId: number, roomIndex: number) => {
+    const response = await fetch(`${API_URLS.publicListings}?listing_id=${listingId}&room_index=${roomIndex}`);
+    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+    return response.json();
+  },
+
+  getPublicListing: async (id: number) => {
+    const response = await fetch(`${API_URLS.publicListings}?id=${id}`);
+    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+    return response.json();
+  },
+
+  // Маркеры карты (id, title, lat, lng, price, type) в области bbox = [west, south, east, north]
+  getMapMarkers: async (bbox: [number, number, number, number], filters: CatalogFilters = {}) => {
+    const params = catalogParams(filters);
+    params.set('bbox', bbox.join(','));
+    const response = await fetch(`${API_URLS.publicListings}?${params}`);
+    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+    return response.json();
+  },
+
+  // Поиск объектов на сервере (с учётом опечаток), постранично
+  searchListings: async (query: string, filters: CatalogFilters = {}, cursor?: string | null) => {
+    const params = catalogParams(filters);
+    params.set('search', query);
+    params.set('limit', '30');
+    if (cursor) params.set('cursor', cursor);
+    const response = await fetch(`${API_URLS.publicListings}?${params}`);
     if (!response.ok) {
       const errorData = await response.json().catch(() => ({ error: 'Network error' }));
-      console.error('[API] Upload failed:', errorData);
       throw new Error(errorData.error || `HTTP ${response.status}`);
     }
-    
-    const result = await response.json();
-    console.log('[API] Upload result:', result);
-    return result;
+    return response.json();
   },
 
-  // Получение деталей номера с фотографиями
-  getRoomDetails: async (listingId: number, roomIndex: number) => {
-    const response = await fetch(`${API_URLS.publicListings}?listing_id=${listingId}&room_index=${roomIndex}`);
+  // Подсказки городов, районов и станций метро по началу названия
+  getSuggestions: async (prefix: string, kind?: 'city' | 'district' | 'metro', city?: string) => {
+    const params = new URLSearchParams({ suggest: prefix });
+    if (kind) params.set('kind', kind);
+    if (city) params.set('city', city);
+    const response = await fetch(`${API_URLS.publicListings}?${params}`);
     if (!response.ok) throw new Error(`HTTP ${response.status}`);
     return response.json();
   },
 
-  // Публичное получение объектов
-  getPublicListings: async () => {
-    const response = await fetch(API_URLS.publicListings);
+  // Счётчики для фильтров и карусели городов (без самих объектов)
+  getCatalogFacets: async (filters: CatalogFilters = {}) => {
+    const params = catalogParams(filters);
+    params.set('facets', '1');
+    const response = await fetch(`${API_URLS.publicListings}?${params}`);
+    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+    return response.json();
+  },
+
+  // Публичный каталог с серверными фильтрами и постраничной выдачей
+  getPublicListingsPage: async (filters: CatalogFilters & { limit?: number; cursor?: string | null } = {}) => {
+    const params = catalogParams(filters);
+    params.set('limit', String(filters.limit ?? 30));
+    if (filters.cursor) params.set('cursor', filters.cursor);
+
+    const response = await fetch(`${API_URLS.publicListings}?${params}`);
     if (!response.ok) {
       const errorData = await response.json().catch(() => ({ error: 'Network error' }));
       throw new Error(errorData.error || `HTTP ${response.status}`);
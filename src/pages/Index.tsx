@@ -1,4 +1,4 @@
-import { useState, useEffect, useRef } from 'react';
+import { useState, useEffect, useRef, useMemo } from 'react';
 import SearchHero from '@/components/SearchHero';
 import ListingsView from '@/components/ListingsView';
 import HotelModal from '@/components/HotelModal';
@@ -6,13 +6,20 @@ import Header from '@/components/home/Header';
 import AboutSection from '@/components/home/AboutSection';
 import PartnersSection from '@/components/home/PartnersSection';
 import SupportSection from '@/components/home/SupportSection';
-import { api } from '@/lib/api';
+import { api, type CatalogFilters } from '@/lib/api';
 import { Button } from '@/components/ui/button';
 import Icon from '@/components/ui/icon';
 
+const ALL_CITIES = 'Все города';
+const MIN_SEARCH_LENGTH = 2;
+// Карусель города показывает 5 объектов, шестой - признак, что есть ещё
+const CAROUSEL_SIZE = 6;
+// Вся карта: маркеры приходят с сервера по фильтрам, без загрузки каталога
+const WORLD_BBOX: [number, number, number, number] = [-180, -90, 180, 90];
+
 export default function Index() {
   const [searchCity, setSearchCity] = useState('');
-  const [selectedCity, setSelectedCity] = useState('Все города');
+  const [selectedCity, setSelectedCity] = useState(ALL_CITIES);
   const [selectedType, setSelectedType] = useState('all');
   const [hasParking, setHasParking] = useState(false);
   const [minHours, setMinHours] = useState<number | null>(null);
@@ -21,18 +28,51 @@ export default function Index() {
   const [selectedListing, setSelectedListing] = useState<number | null>(null);
   const [dialogOpen, setDialogOpen] = useState(false);
   const [selectedHotel, setSelectedHotel] = useState<any>(null);
-  const [allListings, setAllListings] = useState<any[]>([]);
+  const [listings, setListings] = useState<any[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [hasMore, setHasMore] = useState(false);
   const [isLoading, setIsLoading] = useState(true);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
+  const [cityTotals, setCityTotals] = useState<Record<string, number>>({});
+  const [totalCount, setTotalCount] = useState<number | undefined>(undefined);
+  const [mapListings, setMapListings] = useState<any[] | null>(null);
+  const [searchQuery, setSearchQuery] = useState('');
   const [selectedFeatures, setSelectedFeatures] = useState<string[]>([]);
   const [detectedCity, setDetectedCity] = useState<string | null>(null);
   
   const resultsRef = useRef<HTMLDivElement>(null);
+  // Номер последнего запроса: ответы на устаревшие фильтры отбрасываются
+  const requestRef = useRef(0);
+
+  const filters = useMemo<CatalogFilters>(() => ({
+    city: selectedCity === ALL_CITIES ? undefined : selectedCity,
+    type: selectedType === 'all' ? undefined : selectedType,
+    parking: hasParking,
+    maxHours: minHours,
+    amenities: selectedFeatures,
+  }), [selectedCity, selectedType, hasParking, minHours, selectedFeatures]);
+
+  const isSearch = searchQuery.length >= MIN_SEARCH_LENGTH;
+  const showCarousels = selectedCity === ALL_CITIES && !isSearch;
 
   useEffect(() => {
-    loadListings();
     detectUserCity();
   }, []);
 
+  // Поиск уходит на сервер после паузы в наборе
+  useEffect(() => {
+    const timer = setTimeout(() => setSearchQuery(searchCity.trim()), 300);
+    return () => clearTimeout(timer);
+  }, [searchCity]);
+
+  useEffect(() => {
+    loadListings();
+  }, [filters, searchQuery]);
+
+  useEffect(() => {
+    if (showMap) loadMapListings();
+  }, [showMap, filters, searchQuery]);
+
   const detectUserCity = async () => {
     try {
       const cityData = await api.detectCity();
@@ -46,48 +86,82 @@ export default function Index() {
     }
   };
 
+  const fetchPage = (cursor: string | null) => isSearch
+    ? api.searchListings(searchQuery, filters, cursor)
+    : api.getPublicListingsPage({ ...filters, cursor });
+
   const loadListings = async () => {
+    const requestId = ++requestRef.current;
+    setIsLoading(true);
     try {
-      const data = await api.getPublicListings();
-      console.log('=== PUBLIC LISTINGS LOADED ===');
-      console.log('Data type:', typeof data);
-      console.log('Is array:', Array.isArray(data));
-      console.log('Data length:', Array.isArray(data) ? data.length : 'N/A');
-      
-      if (data && data.error) {
-        throw new Error(data.error);
-      }
-      
-      if (!Array.isArray(data)) {
-        console.error('API returned non-array:', data);
-        setAllListings([]);
-        return;
+      const facets = await api.getCatalogFacets(filters);
+      const totals: Record<string, number> = {};
+      (facets.city || []).forEach((item: { value: string; count: number }) => {
+        totals[item.value] = item.count;
+      });
+
+      let page: { listings: any[]; next_cursor: string | null; has_more: boolean };
+      if (showCarousels) {
+        // Все города: первые объекты каждого города, порядок городов - как в каталоге
+        const cities = Object.keys(totals).sort((a, b) => a.localeCompare(b));
+        const pages = await Promise.all(
+          cities.map(city => api.getPublicListingsPage({ ...filters, city, limit: CAROUSEL_SIZE }))
+        );
+        page = { listings: pages.flatMap(p => p.listings), next_cursor: null, has_more: false };
+      } else {
+        page = await fetchPage(null);
       }
-      
-      setAllListings(data);
+
+      if (requestId !== requestRef.current) return;
+      setCityTotals(totals);
+      setTotalCount(isSearch ? undefined : facets.total);
+      setListings(page.listings);
+      setNextCursor(page.next_cursor);
+      setHasMore(page.has_more);
     } catch (error: any) {
       console.error('Failed to load listings:', error);
-      setAllListings([]);
+      if (requestId !== requestRef.current) return;
+      setListings([]);
+      setNextCursor(null);
+      setHasMore(false);
     } finally {
-      setIsLoading(false);
+      if (requestId === requestRef.current) setIsLoading(false);
+    }
+  };
+
+  const loadMore = async () => {
+    if (!nextCursor || isLoadingMore) return;
+    const requestId = requestRef.current;
+    setIsLoadingMore(true);
+    try {
+      const page = await fetchPage(nextCursor);
+      if (requestId !== requestRef.current) return;
+      setListings(prev => [...prev, ...page.listings]);
+      setNextCursor(page.next_cursor);
+      setHasMore(page.has_more);
+    } catch (error: any) {
+      console.error('Failed to load more listings:', error);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
+  const loadMapListings = async () => {
+    // Поиск по тексту маркеры не фильтруют - на карте найденные объекты
+    if (isSearch) {
+      setMapListings(null);
+      return;
+    }
+    try {
+      const data = await api.getMapMarkers(WORLD_BBOX, filters);
+      setMapListings(data.listings);
+    } catch (error) {
+      console.error('Failed to load map markers:', error);
+      setMapListings(null);
     }
   };
 
-  const uniqueCities = ['Все города', ...new Set(Array.isArray(allListings) ? allListings.map(l => l.city) : [])];
-
-  const filteredListings = (Array.isArray(allListings) ? allListings : [])
-    .filter(l => !l.is_archived)
-    .filter(l => selectedCity === 'Все города' || l.city === selectedCity)
-    .filter(l => selectedType === 'all' || l.type === selectedType)
-    .filter(l => !hasParking || l.hasParking)
-    .filter(l => minHours === null || l.minHours <= minHours)
-    .filter(l => l.title.toLowerCase().includes(searchCity.toLowerCase()) || l.city.toLowerCase().includes(searchCity.toLowerCase()))
-    .filter(l => {
-      if (selectedFeatures.length === 0) return true;
-      return l.rooms && l.rooms.some((room: any) => 
-        selectedFeatures.every((feature) => room.features && room.features.includes(feature))
-      );
-    });
+  const uniqueCities = [ALL_CITIES, ...Object.keys(cityTotals)];
 
   const handleCardClick = (listing: any) => {
     window.location.href = `/listing/${listing.id}`;
@@ -145,14 +219,21 @@ export default function Index() {
 
           <main className="container mx-auto px-4 py-8" ref={resultsRef}>
             <ListingsView
-              filteredListings={filteredListings}
+              filteredListings={listings}
+              mapListings={mapListings ?? listings}
               selectedCity={selectedCity}
+              showCarousels={showCarousels}
               showMap={showMap}
               selectedListing={selectedListing}
               onListingSelect={setSelectedListing}
               onToggleMap={() => setShowMap(!showMap)}
               onCardClick={handleCardClick}
               isLoading={isLoading}
+              totalCount={totalCount}
+              cityTotals={cityTotals}
+              hasMore={hasMore}
+              isLoadingMore={isLoadingMore}
+              onLoadMore={loadMore}
             />
           </main>
         </>
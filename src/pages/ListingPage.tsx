@@ -19,24 +19,8 @@ export default function ListingPage() {
   useEffect(() => {
     const loadListing = async () => {
       try {
-        const listings = await api.getPublicListings();
-        const foundListing = listings.find((l: any) => l.id === parseInt(listingId || '0'));
-        
-        // Загружаем детали всех номеров с фотографиями
-        if (foundListing && foundListing.rooms) {
-          const roomsWithImages = await Promise.all(
-            foundListing.rooms.map(async (_: any, index: number) => {
-              try {
-                return await api.getRoomDetails(foundListing.id, index);
-              } catch (error) {
-                console.error(`Failed to load room ${index}:`, error);
-                return foundListing.rooms[index]; // Fallback к данным без фото
-              }
-            })
-          );
-          foundListing.rooms = roomsWithImages;
-        }
-        
+        // Карточка объекта сразу с комнатами, фотографиями и метро
+        const foundListing = await api.getPublicListing(parseInt(listingId || '0'));
         setListing(foundListing);
       } catch (error) {
         console.error('Failed to load listing:', error);
@@ -37,11 +37,11 @@ export default function RoomDetails() {
   useEffect(() => {
     const loadListing = async () => {
       try {
-        const listings = await api.getPublicListings();
-        const foundListing = listings.find((l: any) => l.id === parseInt(listingId || '0'));
-        
-        // Загружаем полные детали номера с фотографиями
-        const roomDetails = await api.getRoomDetails(parseInt(listingId || '0'), parseInt(roomIndex || '0'));
+        // Карточка объекта и полные детали номера с фотографиями - без загрузки всего каталога
+        const [foundListing, roomDetails] = await Promise.all([
+          api.getPublicListing(parseInt(listingId || '0')),
+          api.getRoomDetails(parseInt(listingId || '0'), parseInt(roomIndex || '0')),
+        ]);
         
         console.log('Room details with images:', roomDetails);
         console.log('Room images:', roomDetails?.images);